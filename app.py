@@ -1,14 +1,29 @@
+import os
 
 from flask import Flask, render_template
-from werkzeug.security import generate_password_hash
 from flask_login import LoginManager
 from website.socketio_events import socketio, register_socketio_events
-
-
-def create_app():
+from website.commands import register_commands
+from website.search import init_search
+from website.dashboard import init_dashboards
+from website.notifications import init_notifications
+from website.attendance import init_attendance
+from website.timetable import init_timetable
+from website.cache import cache, cached_page
+from website.principal import init_principals, load_principal
+from website.passwords import hasher
+from website.media import init_media
+from website.tasks import init_tasks
+from website.database import database_url, engine_options, init_database
+from website.migrations import upgrade
+from website.metrics import init_metrics
+from website.query_budget import init_query_budgets
+
+
+def create_app(test_config=None):
     app = Flask(__name__, template_folder="website/templates")
 
-    from website.models import db, User
+    from website.models import db
 
     from website.blueprints.auth import auth_bp
     from website.blueprints.admin import admin_bp
@@ -19,12 +34,114 @@ def create_app():
     from website.blueprints.announcements import announcements_bp
     from website.blueprints.events import events_bp
     from website.blueprints.feed import feed_bp
+    from website.blueprints.search import search_bp
+    from website.blueprints.uploads import uploads_bp
 
-    app.config["SECRET_KEY"] = "your-secret-key-change-this"
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///website.db"
+    app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "your-secret-key-change-this")
+
+    # Database: DATABASE_URL, pool sizing via DATABASE_POOL_* (server databases),
+    # pragmas applied at connect for SQLite. Auto-migrate is for dev / one process
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url()
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLITE_JOURNAL_MODE"] = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    app.config["SQLITE_SYNCHRONOUS"] = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    app.config["DATABASE_AUTO_MIGRATE"] = os.environ.get("DATABASE_AUTO_MIGRATE", "1") == "1"
+    app.config["FEED_PAGE_SIZE"] = 20
+    app.config["FEED_MAX_PAGE_SIZE"] = 50
+
+    # Socket.IO: a message queue lets several worker processes share broadcasts
+    app.config["SOCKETIO_MESSAGE_QUEUE"] = os.environ.get("SOCKETIO_MESSAGE_QUEUE")
+    app.config["SOCKETIO_CHANNEL"] = os.environ.get("SOCKETIO_CHANNEL", "flask-socketio")
+    app.config["SOCKETIO_ASYNC_MODE"] = os.environ.get("SOCKETIO_ASYNC_MODE") or None
+    app.config["SOCKETIO_LIKE_BATCH_MS"] = 500
+
+    # Page/query cache: in-process LRU, plus a shared store when CACHE_URL is set
+    app.config["CACHE_URL"] = os.environ.get("CACHE_URL")
+    app.config["CACHE_DEFAULT_TTL"] = 300
+    app.config["CACHE_MAX_ENTRIES"] = 1024
+
+    # Uploads: plain form posts are capped by MAX_CONTENT_LENGTH; bigger files
+    # go through the resumable /uploads API in UPLOAD_CHUNK_SIZE pieces
+    app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_CONTENT_LENGTH", 32 * 1024 * 1024))
+    app.config["MAX_UPLOAD_SIZE"] = int(os.environ.get("MAX_UPLOAD_SIZE", 512 * 1024 * 1024))
+    app.config["UPLOAD_CHUNK_SIZE"] = 8 * 1024 * 1024
+
+    # current_user is a cached Principal; changes to the user drop it at once
+    app.config["SESSION_USER_CACHE_TTL"] = 60
+    app.config["SESSION_USER_CACHE_SIZE"] = 4096
+
+    # Password hashing: werkzeug method string; logins upgrade older hashes.
+    # Verification runs in a pool that refuses work past PASSWORD_HASH_QUEUE
+    app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("PASSWORD_HASH_WORKERS", 0)) or None
+    app.config["PASSWORD_HASH_QUEUE"] = int(os.environ.get("PASSWORD_HASH_QUEUE", 64))
+
+    # Attendance: students below this percentage get shortfall warnings
+    app.config["ATTENDANCE_MIN_PERCENT"] = int(os.environ.get("ATTENDANCE_MIN_PERCENT", 75))
+
+    # Timetable: class reminders this many minutes ahead, pushed from the web
+    # process unless TIMETABLE_REMINDERS=0 (then run `flask timetable-reminders`
+    # once, e.g. when several workers share a message queue)
+    app.config["TIMETABLE_REMINDERS"] = os.environ.get("TIMETABLE_REMINDERS", "1") == "1"
+    app.config["TIMETABLE_REMINDER_MINUTES"] = int(os.environ.get("TIMETABLE_REMINDER_MINUTES", 10))
+    app.config["TIMETABLE_MAX_AGE"] = 300
+
+    # Background jobs (broadcasts, media, recomputes, reminders) run after the
+    # commit on TASK_WORKERS threads per web process; set 0 and run
+    # `flask tasks-worker` instead, or TASK_EAGER=1 to run them inline
+    app.config["TASK_WORKERS"] = int(os.environ.get("TASK_WORKERS", 2))
+    app.config["TASK_EAGER"] = os.environ.get("TASK_EAGER", "0") == "1"
+    app.config["TASK_POLL_SECONDS"] = 2.0
+    app.config["TASK_LEASE_SECONDS"] = 300
+
+    # Events: attendees get a reminder this many minutes before the start
+    app.config["EVENT_REMINDER_MINUTES"] = int(os.environ.get("EVENT_REMINDER_MINUTES", 60))
+    # The events page lists the next EVENTS_WINDOW_DAYS and pages through the past;
+    # .ics feeds cover events from CALENDAR_PAST_DAYS ago on
+    app.config["EVENTS_WINDOW_DAYS"] = 60
+    app.config["EVENTS_MAX_WINDOW_DAYS"] = 366
+    app.config["EVENTS_UPCOMING_MAX"] = 50
+    app.config["EVENTS_PAGE_SIZE"] = 12
+    app.config["EVENTS_MAX_PAGE_SIZE"] = 100
+    app.config["CALENDAR_PAST_DAYS"] = 90
+    app.config["CALENDAR_CACHE_TTL"] = 300
+
+    # /announcements/since returns this many changes per page (?limit up to the max)
+    app.config["ANNOUNCEMENTS_SYNC_PAGE_SIZE"] = 50
+    app.config["ANNOUNCEMENTS_SYNC_MAX_PAGE_SIZE"] = 200
+
+    # Media: resized image variants and PDF previews, built by a background
+    # job after upload (needs the "media" extra)
+    app.config["MEDIA_VARIANTS"] = os.environ.get("MEDIA_VARIANTS", "1") == "1"
+    app.config["MEDIA_QUALITY"] = 80
+    app.config["MEDIA_MAX_PIXELS"] = 50_000_000
+
+    # Downloads: "x-accel" (nginx) or "x-sendfile" hands the byte streaming to the proxy
+    app.config["DOWNLOAD_OFFLOAD"] = os.environ.get("DOWNLOAD_OFFLOAD") or None
+
+    # Instrumentation: /admin/metrics (Prometheus), ?_profile=1 for admins
+    app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") == "1"
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+    app.config["PROFILE_INTERVAL_MS"] = 5
+
+    # Query budgets (views declare @query_budget(n)): "warn" or "raise" when a
+    # view goes over or repeats one statement shape; defaults to "warn" under
+    # debug/testing and is skipped otherwise
+    app.config["QUERY_BUDGET_MODE"] = os.environ.get("QUERY_BUDGET_MODE") or None
+    app.config["QUERY_BUDGET_DEFAULT"] = 20
+    app.config["QUERY_REPEAT_LIMIT"] = 5
+
+    if test_config:
+        app.config.update(test_config)
 
     db.init_app(app)
+    init_database(app)
+    cache.init_app(app)
+    init_principals(app)
+    hasher.init_app(app)
+    init_media(app)
 
     # Setup Flask-Login
     login_manager = LoginManager()
@@ -34,7 +151,7 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return load_principal(user_id)
 
     # Register Blueprints
     app.register_blueprint(auth_bp, url_prefix="/auth")
@@ -46,30 +163,28 @@ def create_app():
     app.register_blueprint(announcements_bp)
     app.register_blueprint(events_bp)
     app.register_blueprint(feed_bp)
-
-    # Create Tables
-    with app.app_context():
-        db.create_all()
-
-        admin_user = User.query.filter_by(username="admin").first()
-        if not admin_user:
-            hashed_password = generate_password_hash("admin123")
-            admin_user = User(
-                name="Admin",
-                username="admin",
-                email="admin@teamnexus.com",
-                password_hash=hashed_password,
-                role="admin",
-            )
-            db.session.add(admin_user)
-            db.session.commit()
-            print("Default Admin User Created : admin : admin123")
+    app.register_blueprint(search_bp)
+    app.register_blueprint(uploads_bp)
+
+    # Bring the schema up to date (a new database also gets the default admin)
+    init_search()
+    init_dashboards()
+    init_notifications()
+    init_attendance()
+    init_timetable(app)
+    if app.config["DATABASE_AUTO_MIGRATE"]:
+        with app.app_context():
+            upgrade()
 
     @app.route("/")
     def index():
-        return render_template("index.html")
+        return cached_page("site", "index", lambda: render_template("index.html"))
 
     register_socketio_events(app)
+    init_tasks(app, socketio)
+    register_commands(app)
+    init_metrics(app, socketio)
+    init_query_budgets(app)
     return app
 
 
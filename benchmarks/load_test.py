@@ -0,0 +1,321 @@
+"""Load test: simulated campus users against the HTTP routes and Socket.IO events.
+
+Seeds a synthetic campus (website.seed) of ``--students`` students, serves it
+from a separate process and runs ``--users`` concurrent simulated users for
+``--duration`` seconds. Each user logs in, then loops over a weighted mix of
+feed, post, like, comment, announcement, event, notes, search and timetable
+requests with exponential think time. ``--sockets`` of them also hold a
+Socket.IO connection, watch posts, and time ``like_post`` / ``new_comment``
+round trips.
+
+Reports requests, errors, throughput and p50/p95/p99/max latency per endpoint.
+Users and the request mix are drawn from ``--seed``, so runs are repeatable.
+
+    python -m benchmarks.load_test --students 5000 --users 100 --duration 60
+    python -m benchmarks.load_test --db campus.db --users 50 --json before.json
+    python -m benchmarks.load_test --url http://staging:5000 --students 5000
+
+``--db`` seeds the file once and reuses it on later runs; ``--url`` targets a
+running server that was seeded with ``flask seed-campus``. Needs the
+``loadtest`` extra (python-socketio client).
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+import socketio as sio
+
+# label, weight, method, path; {post}, {event}, {tag} and {word} are filled per request
+SCENARIO = [
+    ("GET /feed", 20, "GET", "/feed"),
+    ("GET /feed/api/posts", 10, "GET", "/feed/api/posts?tag={tag}"),
+    ("GET /feed/post/<id>", 15, "GET", "/feed/post/{post}"),
+    ("POST /feed/like/<id>", 10, "POST", "/feed/like/{post}"),
+    ("POST /feed/post/<id>", 3, "POST", "/feed/post/{post}"),
+    ("GET /announcements", 10, "GET", "/announcements"),
+    ("GET /announcements/since", 4, "GET", "/announcements/since?cursor=0"),
+    ("GET /events", 8, "GET", "/events"),
+    ("GET /events/<id>", 5, "GET", "/events/{event}"),
+    ("GET /events/api/events", 3, "GET", "/events/api/events"),
+    ("POST /events/<id>/rsvp", 2, "POST", "/events/{event}/rsvp?format=json"),
+    ("GET /notes", 8, "GET", "/notes"),
+    ("GET /search", 5, "GET", "/search?q={word}"),
+    ("GET /student/", 3, "GET", "/student/"),
+    ("GET /student/timetable/next", 3, "GET", "/student/timetable/next"),
+]
+TAGS = ["exams", "placements", "hackathon", "sports", "clubs", "fest"]
+WORDS = ["exam", "placement", "library", "project", "seminar", "hostel", "result", "workshop"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.pushes = 0
+
+    def record(self, label, seconds, ok=True):
+        with self.lock:
+            self.latencies[label].append(seconds)
+            if not ok:
+                self.errors[label] += 1
+
+    def push(self):
+        with self.lock:
+            self.pushes += 1
+
+    def summary(self, elapsed):
+        rows = {}
+        for label in sorted(self.latencies):
+            ms = [value * 1000 for value in self.latencies[label]]
+            rows[label] = {
+                "requests": len(ms),
+                "errors": self.errors[label],
+                "rps": len(ms) / elapsed,
+                "p50": percentile(ms, 50),
+                "p95": percentile(ms, 95),
+                "p99": percentile(ms, 99),
+                "max": max(ms),
+            }
+        return rows
+
+
+# --- Server ---
+
+def seed_database(path, students, password, seed):
+    from app import create_app
+    from website.seed import seed_campus
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}", "QUERY_BUDGET_MODE": "off"})
+    with app.test_request_context():
+        started = time.perf_counter()
+        counts = seed_campus(students=students, password=password, seed=seed)
+    print(f"seeded {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s "
+          f"({', '.join(f'{name} {count:,}' for name, count in counts.items())})")
+
+
+def serve(port, path):
+    from app import create_app
+    from website.socketio_events import socketio
+
+    logging.getLogger("werkzeug").setLevel(logging.CRITICAL)
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+        "SOCKETIO_ASYNC_MODE": "threading",
+        "QUERY_BUDGET_MODE": "off",
+    })
+    socketio.run(app, port=port, allow_unsafe_werkzeug=True, log_output=False)
+
+
+def wait_until_up(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url + "/auth/login", timeout=2).status_code == 200:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not come up")
+
+
+# --- Simulated users ---
+
+def login(url, username, password, recorder):
+    session = requests.Session()
+    started = time.perf_counter()
+    response = session.post(url + "/auth/login", data={"username": username, "password": password},
+                            allow_redirects=False)
+    ok = response.status_code == 302
+    recorder.record("POST /auth/login", time.perf_counter() - started, ok)
+    if not ok:
+        raise RuntimeError(f"login failed for {username} ({response.status_code})")
+    return session
+
+
+def discover(session, url):
+    posts = [post["id"] for post in session.get(url + "/feed/api/posts?per_page=50").json()["posts"]]
+    events = sorted({int(m) for m in re.findall(r"/events/(\d+)", session.get(url + "/events").text)})
+    if not posts or not events:
+        raise RuntimeError("no posts or events found; is the database seeded?")
+    return posts, events
+
+
+def user_loop(url, session, rng, ids, recorder, deadline, think):
+    posts, events = ids
+    weights = [step[1] for step in SCENARIO]
+    while time.time() < deadline:
+        label, _, method, path = rng.choices(SCENARIO, weights)[0]
+        path = path.format(post=rng.choice(posts), event=rng.choice(events),
+                           word=rng.choice(WORDS), tag=rng.choice(TAGS))
+        data = {"content": "Load test comment"} if label == "POST /feed/post/<id>" else None
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url + path, data=data, allow_redirects=False)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        recorder.record(label, time.perf_counter() - started, ok)
+        if think:
+            time.sleep(min(rng.expovariate(1 / think), think * 5))
+
+
+def socket_loop(url, session, rng, ids, recorder, deadline, think):
+    posts, _ = ids
+    pending = {}
+    client = sio.Client(http_session=session)
+
+    def reply(label):
+        def handler(data):
+            started = pending.pop(data.get("probe"), None) if isinstance(data, dict) else None
+            if started is None:
+                recorder.push()
+            else:
+                recorder.record(label, time.perf_counter() - started)
+        return handler
+
+    client.on("broadcast_like_post", reply("socket like_post"))
+    client.on("broadcast_new_comment", reply("socket new_comment"))
+    started = time.perf_counter()
+    client.connect(url, transports=["websocket"])
+    recorder.record("socket connect", time.perf_counter() - started)
+    client.emit("watch_posts", {"feed": True, "post_ids": rng.sample(posts, min(20, len(posts)))})
+    probe = 0
+    try:
+        while time.time() < deadline:
+            probe += 1
+            event = rng.choice(("like_post", "new_comment"))
+            pending[probe] = time.perf_counter()
+            client.emit(event, {"post_id": rng.choice(posts), "probe": probe})
+            time.sleep(min(rng.expovariate(1 / think), think * 5) if think else 0.01)
+        time.sleep(0.5)
+        for _ in list(pending):
+            recorder.record("socket lost", 0, ok=False)
+    finally:
+        client.disconnect()
+
+
+def run(url, students, users, sockets, duration, ramp, think, password, seed):
+    recorder = Recorder()
+    first = login(url, "student00000", password, recorder)
+    ids = discover(first, url)
+    deadline = time.time() + ramp + duration
+    threads = []
+
+    def start(i):
+        user_rng = random.Random(seed * 100003 + i)
+        username = f"student{user_rng.randrange(students):05d}"
+        time.sleep(ramp * i / max(1, users))
+        try:
+            session = login(url, username, password, recorder)
+            if i < sockets:
+                threading.Thread(
+                    target=socket_loop, args=(url, session, random.Random(user_rng.random()), ids,
+                                              recorder, deadline, think), daemon=True,
+                ).start()
+            user_loop(url, session, user_rng, ids, recorder, deadline, think)
+        except Exception as exc:
+            print(f"user {i} ({username}) stopped: {exc}", file=sys.stderr)
+
+    for i in range(users):
+        thread = threading.Thread(target=start, args=(i,), daemon=True)
+        thread.start()
+        threads.append(thread)
+    started = time.time()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+    time.sleep(1)  # let socket loops drain
+    return recorder.summary(elapsed), recorder.pushes, elapsed
+
+
+def report(rows, pushes, elapsed, args):
+    print(f"{args.users} users ({args.sockets} with sockets), {args.duration}s, think {args.think * 1000:.0f} ms")
+    header = f"{'endpoint':<24}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for label, row in rows.items():
+        print(f"{label:<24}{row['requests']:>9}{row['errors']:>8}{row['rps']:>9.1f}"
+              f"{row['p50']:>9.1f}{row['p95']:>9.1f}{row['p99']:>9.1f}{row['max']:>9.1f}")
+    http = [row for label, row in rows.items() if not label.startswith("socket")]
+    total = sum(row["requests"] for row in http)
+    errors = sum(row["errors"] for row in http)
+    print("-" * len(header))
+    print(f"{'HTTP total':<24}{total:>9}{errors:>8}{total / elapsed:>9.1f}")
+    print(f"socket pushes received  {pushes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=1000, help="campus size to seed / accounts to log in as")
+    parser.add_argument("--users", type=int, default=50, help="concurrent simulated users")
+    parser.add_argument("--sockets", type=int, default=10, help="users that also hold a Socket.IO connection")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--ramp", type=float, default=5, help="seconds over which users start")
+    parser.add_argument("--think", type=float, default=0.2, help="mean think time between requests, seconds")
+    parser.add_argument("--password", default="nexus123")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", help="SQLite file to seed once and reuse")
+    parser.add_argument("--url", help="target a running, already seeded server")
+    parser.add_argument("--json", help="also write the per-endpoint results here")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.db)
+        return
+    args.sockets = min(args.sockets, args.users)
+
+    proc = workdir = None
+    url = args.url
+    if url is None:
+        workdir = tempfile.TemporaryDirectory()
+        path = os.path.abspath(args.db or os.path.join(workdir.name, "campus.db"))
+        if not os.path.exists(path):
+            seed_database(path, args.students, args.password, args.seed)
+        port = free_port()
+        proc = subprocess.Popen([sys.executable, "-m", "benchmarks.load_test", "--serve", str(port), "--db", path])
+        url = f"http://127.0.0.1:{port}"
+    url = url.rstrip("/")
+    try:
+        wait_until_up(url)
+        rows, pushes, elapsed = run(url, args.students, args.users, args.sockets, args.duration,
+                                    args.ramp, args.think, args.password, args.seed)
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+        if workdir:
+            workdir.cleanup()
+
+    report(rows, pushes, elapsed, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "endpoints": rows, "socket_pushes": pushes}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
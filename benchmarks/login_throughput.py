@@ -0,0 +1,137 @@
+"""Logins per second under concurrency, inline hashing vs the hashing pool.
+
+Serves the app from a threaded server with ``--users`` accounts and fires
+``--requests`` logins from ``--concurrency`` clients in two modes:
+
+    inline   the old login path: check_password_hash on the request thread
+    pooled   auth.login, verifying through website.passwords.hasher
+
+While each storm runs a probe thread times a cheap request, showing how much
+the logins slow down everything else. Pooled logins past PASSWORD_HASH_QUEUE
+are refused with 503 and counted separately.
+
+    python -m benchmarks.login_throughput --method scrypt --concurrency 32 --requests 400 --queue 16
+"""
+import argparse
+import http.client
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from flask import redirect, request
+from werkzeug.security import check_password_hash
+from werkzeug.serving import make_server
+
+from app import create_app
+from website.models import db, User
+from website.passwords import hasher
+
+
+def build_app(workdir, users, method, workers, queue):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "PASSWORD_HASH_METHOD": method,
+        "PASSWORD_HASH_WORKERS": workers,
+        "PASSWORD_HASH_QUEUE": queue,
+    })
+    with app.app_context():
+        pwhash = hasher.hash("bench")
+        db.session.add_all(
+            User(name=f"User {i}", username=f"user{i}", email=f"user{i}@example.com",
+                 password_hash=pwhash, role="student")
+            for i in range(users)
+        )
+        db.session.commit()
+
+    # The pre-change login path, for comparison
+    @app.route("/bench/login", methods=["POST"])
+    def inline_login():
+        user = User.query.filter_by(username=request.form["username"]).first()
+        if user and check_password_hash(user.password_hash, request.form["password"]):
+            return redirect("/")
+        return "invalid", 401
+
+    @app.route("/bench/ping")
+    def ping():
+        return "pong"
+
+    return app
+
+
+def storm(port, path, users, concurrency, requests):
+    local = threading.local()
+    stop = threading.Event()
+    probes = []
+
+    def login(i):
+        if not hasattr(local, "conn"):
+            local.conn = http.client.HTTPConnection("127.0.0.1", port)
+        body = urlencode({"username": f"user{i % users}", "password": "bench"})
+        started = time.perf_counter()
+        local.conn.request("POST", path, body, {"Content-Type": "application/x-www-form-urlencoded"})
+        response = local.conn.getresponse()
+        response.read()
+        return response.status, time.perf_counter() - started
+
+    def probe():
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        while not stop.is_set():
+            started = time.perf_counter()
+            conn.request("GET", "/bench/ping")
+            conn.getresponse().read()
+            probes.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(login, range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    prober.join()
+
+    ok = sorted(latency for status, latency in results if status == 302)
+    refused = sum(1 for status, _ in results if status == 503)
+    return {
+        "logins/s": len(ok) / elapsed,
+        "p50 ms": statistics.median(ok) * 1000 if ok else 0,
+        "p95 ms": ok[int(len(ok) * 0.95) - 1] * 1000 if ok else 0,
+        "503": refused,
+        "probe p95 ms": sorted(probes)[int(len(probes) * 0.95) - 1] * 1000 if probes else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--method", default="scrypt")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--queue", type=int, default=64)
+    args = parser.parse_args()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = build_app(workdir, args.users, args.method, args.workers, args.queue)
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        print(f"{args.method}: {args.concurrency} concurrent clients, {args.requests} logins, "
+              f"pool of {args.workers or os.cpu_count()} with queue {args.queue}")
+        columns = ["logins/s", "p50 ms", "p95 ms", "503", "probe p95 ms"]
+        print(f"{'mode':<8}" + "".join(f"{column:>14}" for column in columns))
+        for name, path in (("inline", "/bench/login"), ("pooled", "/auth/login")):
+            row = storm(server.server_port, path, args.users, args.concurrency, args.requests)
+            print(f"{name:<8}" + "".join(f"{row[column]:>14.1f}" for column in columns))
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
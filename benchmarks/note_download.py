@@ -0,0 +1,126 @@
+"""Concurrent note download throughput, before and after.
+
+Serves the app from a threaded server with one multi-MB note and hammers
+it from ``--concurrency`` threads in several modes:
+
+    baseline    the old send_from_directory path, full body every time
+    send_file   note_download in-worker: full body with a strong ETag
+    range       note_download resuming the last quarter of the file
+    revalidate  note_download with If-None-Match, answered 304
+    x-accel     note_download with DOWNLOAD_OFFLOAD=x-accel (headers only;
+                in production nginx streams the body)
+
+    python -m benchmarks.note_download --size-mb 8 --concurrency 16 --requests 400
+"""
+import argparse
+import http.client
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from flask import send_from_directory
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+from app import create_app
+from website.models import db, User, Note
+from website.storage import save_stream, local_path
+
+
+def build_app(workdir, size):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "UPLOAD_ROOT": os.path.join(workdir, "blobs"),
+    })
+    with app.app_context():
+        user = User(name="Bench", username="bench", email="bench@example.com",
+                    password_hash=generate_password_hash("bench"), role="teacher")
+        db.session.add(user)
+        db.session.flush()
+        url = save_stream(io.BytesIO(os.urandom(size)), "notes.pdf")
+        db.session.add(Note(title="Bench", file_url=url, semester=1, subject="Bench", uploaded_by=user.id))
+        db.session.commit()
+        path = local_path(url)
+
+    # The pre-change download path, for comparison
+    @app.route("/bench/baseline")
+    def baseline():
+        return send_from_directory(os.path.dirname(path), os.path.basename(path), as_attachment=True)
+
+    return app
+
+
+def login(port):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    conn.request("POST", "/auth/login", urlencode({"username": "bench", "password": "bench"}),
+                 {"Content-Type": "application/x-www-form-urlencoded"})
+    response = conn.getresponse()
+    response.read()
+    return response.getheader("Set-Cookie").split(";", 1)[0]
+
+
+def run_mode(port, cookie, path, headers, concurrency, requests):
+    local = threading.local()
+
+    def fetch(_):
+        if not hasattr(local, "conn"):
+            local.conn = http.client.HTTPConnection("127.0.0.1", port)
+        local.conn.request("GET", path, headers=dict(headers, Cookie=cookie))
+        response = local.conn.getresponse()
+        body = response.read()
+        return response.status, len(body)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(fetch, range(requests)))
+    elapsed = time.perf_counter() - started
+    statuses = sorted({status for status, _ in results})
+    sent = sum(size for _, size in results)
+    return requests / elapsed, sent / elapsed / 1e6, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400)
+    args = parser.parse_args()
+    size = int(args.size_mb * 1024 * 1024)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = build_app(workdir, size)
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        port = server.server_port
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        cookie = login(port)
+
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        conn.request("GET", "/notes/1/download", headers={"Cookie": cookie})
+        response = conn.getresponse()
+        response.read()
+        etag = response.getheader("ETag")
+
+        modes = [
+            ("baseline", "/bench/baseline", {}, None),
+            ("send_file", "/notes/1/download", {}, None),
+            ("range", "/notes/1/download", {"Range": f"bytes={size * 3 // 4}-"}, None),
+            ("revalidate", "/notes/1/download", {"If-None-Match": etag}, None),
+            ("x-accel", "/notes/1/download", {}, "x-accel"),
+        ]
+        print(f"{args.size_mb:g} MB note, {args.concurrency} concurrent clients, {args.requests} requests per mode")
+        print(f"{'mode':<12}{'req/s':>10}{'MB/s':>10}  status")
+        for name, path, headers, offload in modes:
+            app.config["DOWNLOAD_OFFLOAD"] = offload
+            rps, mbps, statuses = run_mode(port, cookie, path, headers, args.concurrency, args.requests)
+            print(f"{name:<12}{rps:>10.0f}{mbps:>10.1f}  {','.join(map(str, statuses))}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Hot query timings and plans on a large synthetic dataset, with and without indexes.
+
+Seeds ``--scale`` x (1k users, 20k posts, 80k comments, 80k likes, 10k notes,
+5k announcements, 2k events, 100k attendance rows, 10k timetable entries),
+runs ANALYZE, then times every query in website.query_plans.HOT_QUERIES and
+reports its plan. The declared ix_* indexes are then dropped and the run is
+repeated, which is what a regression would look like.
+
+    python -m benchmarks.query_plans --scale 1 --repeat 20
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, time as clock, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from website.models import (
+    db, User, Post, Comment, Like, Tag, Note, Announcement, Event, Attendance,
+    TimetableEntry, Report, post_tags, event_rsvps,
+)
+from website.query_plans import HOT_QUERIES, check_plans
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+
+def seed(scale):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    users, posts = 1000 * scale, 20000 * scale
+    pwhash = generate_password_hash("bench", "pbkdf2:sha256:1")
+
+    def when(i, total, span_days=730):
+        return start + timedelta(seconds=span_days * 86400 * i / total)
+
+    db.session.execute(db.insert(User), [
+        {"name": f"User {i}", "username": f"u{i}", "email": f"u{i}@example.com",
+         "password_hash": pwhash, "role": "student"}
+        for i in range(users)
+    ])
+    db.session.execute(db.insert(Tag), [{"name": name} for name in ("general", "exam", "club", "sports", "placement")])
+    db.session.execute(db.insert(Post), [
+        {"author_id": rng.randint(1, users), "title": f"Post {i}", "content": "Lorem ipsum",
+         "created_at": when(i, posts), "is_deleted": rng.random() < 0.05}
+        for i in range(posts)
+    ])
+    db.session.execute(post_tags.insert(), [
+        {"post_id": i, "tag_id": rng.randint(1, 5)} for i in range(1, posts + 1)
+    ])
+    db.session.execute(db.insert(Comment), [
+        {"post_id": rng.randint(1, posts), "author_id": rng.randint(1, users), "content": "Nice",
+         "created_at": when(i, 4 * posts), "is_deleted": False}
+        for i in range(4 * posts)
+    ])
+    pairs = {(rng.randint(1, users), rng.randint(1, posts)) for _ in range(4 * posts)}
+    db.session.execute(db.insert(Like), [{"user_id": u, "post_id": p} for u, p in pairs])
+    db.session.execute(db.insert(Report), [
+        {"reporter_id": rng.randint(1, users), "post_id": rng.randint(1, posts), "created_at": when(i, 500 * scale)}
+        for i in range(500 * scale)
+    ])
+    db.session.execute(db.insert(Note), [
+        {"title": f"Note {i}", "file_url": "/static/blobs/x.pdf", "semester": rng.randint(1, 8),
+         "subject": rng.choice(["Mathematics", "Physics", "Chemistry", "Networks", "DBMS"]),
+         "uploaded_by": 1, "uploaded_at": when(i, 10000 * scale)}
+        for i in range(10000 * scale)
+    ])
+    db.session.execute(db.insert(Announcement), [
+        {"title": f"Notice {i}", "content": "Details", "posted_by": 1, "posted_at": when(i, 5000 * scale),
+         "category": rng.choice(["Exam", "Holiday", "Placement", None]), "is_pinned": rng.random() < 0.01}
+        for i in range(5000 * scale)
+    ])
+    db.session.execute(db.insert(Event), [
+        {"title": f"Event {i}", "start_time": when(i, 2000 * scale, 1460), "end_time": when(i, 2000 * scale, 1460),
+         "posted_by": 1}
+        for i in range(2000 * scale)
+    ])
+    db.session.execute(event_rsvps.insert(), [
+        {"event_id": e, "user_id": u}
+        for e, u in {(rng.randint(1, 2000 * scale), rng.randint(1, users)) for _ in range(20000 * scale)}
+    ])
+    db.session.execute(db.insert(Attendance), [
+        {"student_id": rng.randint(1, users), "date": date(2024, 1, 1) + timedelta(days=i % 700),
+         "status": "present", "marked_by": 1}
+        for i in range(100000 * scale)
+    ])
+    db.session.execute(db.insert(TimetableEntry), [
+        {"student_id": rng.randint(1, users), "day": rng.choice(DAYS), "period": str(i % 8),
+         "subject": "Mathematics", "start_time": clock(9), "end_time": clock(10)}
+        for i in range(10000 * scale)
+    ])
+    db.session.commit()
+    db.session.connection().exec_driver_sql("ANALYZE")
+
+
+def measure(repeat):
+    plans = check_plans()
+    timings = {}
+    for name, build in HOT_QUERIES.items():
+        query = build()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            if hasattr(query, "all"):
+                query.all()
+            else:
+                db.session.execute(query).all()
+            db.session.expunge_all()
+        timings[name] = (time.perf_counter() - started) / repeat * 1000
+    return plans, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}"})
+        with app.app_context():
+            seed(args.scale)
+            plans, indexed = measure(args.repeat)
+
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    if index.name.startswith("ix_"):
+                        index.drop(db.engine)
+            db.session.connection().exec_driver_sql("ANALYZE")
+            bare_plans, bare = measure(args.repeat)
+
+        print(f"{'query':<34}{'indexed ms':>12}{'no ix_ ms':>12}  plan without ix_ indexes")
+        for name in HOT_QUERIES:
+            flag = "FULL SCAN" if bare_plans[name][1] else "ok"
+            print(f"{name:<34}{indexed[name]:>12.2f}{bare[name]:>12.2f}  {flag}")
+        failures = sum(1 for _, scans in plans.values() if scans)
+        print(f"{failures} hot query(s) scan a whole table with the indexes in place")
+
+
+if __name__ == "__main__":
+    main()
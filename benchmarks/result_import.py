@@ -0,0 +1,94 @@
+"""Bulk result import throughput: per-marksheet add/commit vs the streaming importer.
+
+Writes a CSV of ``--rows`` subject rows (``--subjects`` per marksheet) for
+freshly seeded students, then times:
+
+    baseline   the old write pattern: query the student, add a Result, commit
+    import     website.result_import: batched lookups, executemany upserts,
+               one transaction per batch, SGPA/CGPA included
+    reimport   the same file again: every sheet upserts, nothing recomputes
+
+    python -m benchmarks.result_import --rows 50000 --subjects 8
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from website.models import db, User, Result
+from website.result_import import import_results, read_rows
+
+
+def write_csv(path, students, subjects):
+    rng = random.Random(42)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["username", "semester", "code", "name", "credits", "grade"])
+        for i in range(students):
+            for j in range(subjects):
+                writer.writerow([f"s{i}", 5, f"PCC-CS50{j}", f"Subject {j}", rng.choice((2, 3, 4)), rng.choice("OEABCDF")])
+
+
+def baseline(path):
+    sheets = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            sheets.setdefault((row["username"], int(row["semester"])), []).append(
+                {"code": row["code"], "credits": float(row["credits"]), "grade": row["grade"]}
+            )
+    for (username, semester), subjects in sheets.items():
+        user = User.query.filter_by(username=username).first()
+        db.session.add(Result(student_id=user.id, semester=semester, details={"subjects": subjects}))
+        db.session.commit()
+    return len(sheets)
+
+
+def run_import(path):
+    with open(path, "rb") as f:
+        report = import_results(read_rows(f, path))
+    return report.results
+
+
+def timed(label, rows, fn):
+    started = time.perf_counter()
+    results = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<10}{elapsed:>9.2f}s{rows / elapsed:>12.0f} rows/s  {results} result(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--subjects", type=int, default=8)
+    args = parser.parse_args()
+    students = args.rows // args.subjects
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "results.csv")
+        write_csv(path, students, args.subjects)
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}"})
+        with app.app_context():
+            pwhash = generate_password_hash("bench", "pbkdf2:sha256:1")
+            db.session.execute(db.insert(User), [
+                {"name": f"Student {i}", "username": f"s{i}", "email": f"s{i}@example.com",
+                 "password_hash": pwhash, "role": "student"}
+                for i in range(students)
+            ])
+            db.session.commit()
+            rows = students * args.subjects
+            print(f"{rows} rows, {students} marksheets")
+
+            timed("baseline", rows, lambda: baseline(path))
+            db.session.execute(db.delete(Result))
+            db.session.commit()
+            timed("import", rows, lambda: run_import(path))
+            timed("reimport", rows, lambda: run_import(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""SGPA/CGPA recomputation on a synthetic batch, per-student ORM loop vs the engine.
+
+Builds ``--students`` students with ``--semesters`` marksheets of
+``--subjects`` subjects each, then times:
+
+    naive         one query per student, grades summed per subject in Python
+    full          recompute_results(force=True), numpy if installed
+    full (py)     the same with the pure-Python fallback
+    no-op         rerun with nothing changed: digests match, nothing parsed
+    incremental   rerun after ``--changed`` percent of students got a new last semester
+
+    python -m benchmarks.results_engine --students 10000 --semesters 8 --subjects 8
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+import website.results as results
+from website.models import db, User, Result
+from website.results import GRADE_POINTS, recompute_results
+
+
+def marksheet(rng, subjects):
+    return {"subjects": [
+        {"code": f"S{i}", "credits": rng.choice((1, 2, 3, 4)), "grade": rng.choice("OEABCDF")}
+        for i in range(subjects)
+    ]}
+
+
+def seed(students, semesters, subjects):
+    rng = random.Random(42)
+    pwhash = generate_password_hash("bench", "pbkdf2:sha256:1")
+    db.session.execute(db.insert(User), [
+        {"name": f"Student {i}", "username": f"s{i}", "email": f"s{i}@example.com",
+         "password_hash": pwhash, "role": "student"}
+        for i in range(students)
+    ])
+    ids = db.session.scalars(db.select(User.id).where(User.role == "student")).all()
+    db.session.execute(db.insert(Result), [
+        {"student_id": sid, "semester": sem, "details": marksheet(rng, subjects)}
+        for sid in ids for sem in range(1, semesters + 1)
+    ])
+    db.session.commit()
+    return ids
+
+
+# The straightforward version: load each student's results and sum subject by subject
+def naive():
+    for sid in db.session.scalars(db.select(Result.student_id).distinct()).all():
+        credits = points = 0.0
+        for result in Result.query.filter_by(student_id=sid).order_by(Result.semester):
+            sem_credits = sem_points = 0.0
+            for subject in result.details["subjects"]:
+                sem_credits += subject["credits"]
+                sem_points += subject["credits"] * GRADE_POINTS[subject["grade"]]
+            credits += sem_credits
+            points += sem_points
+            result.sgpa = round(sem_points / sem_credits, 2) if sem_credits else None
+            result.cgpa = round(points / credits, 2) if credits else None
+    db.session.commit()
+
+
+def timed(label, fn):
+    started = time.perf_counter()
+    outcome = fn()
+    print(f"{label:<14}{time.perf_counter() - started:>10.2f}s  {outcome if outcome is not None else ''}")
+
+
+def engine(**kwargs):
+    def run():
+        outcome = recompute_results(**kwargs)
+        db.session.commit()
+        return "updated %d, invalid %d" % outcome
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--semesters", type=int, default=8)
+    parser.add_argument("--subjects", type=int, default=8)
+    parser.add_argument("--changed", type=float, default=10, help="Percent of students with a new semester.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}"})
+        with app.app_context():
+            ids = seed(args.students, args.semesters, args.subjects)
+            print(f"{len(ids)} students x {args.semesters} semesters x {args.subjects} subjects, "
+                  f"numpy {'on' if results.np is not None else 'not installed'}")
+            timed("naive", naive)
+            expected = db.session.execute(db.select(Result.id, Result.sgpa, Result.cgpa)).all()
+            db.session.expunge_all()
+
+            timed("full", engine(force=True))
+            actual = db.session.execute(db.select(Result.id, Result.sgpa, Result.cgpa)).all()
+            print(f"{sum(a != b for a, b in zip(expected, actual))} row(s) differ from the naive pass")
+            numpy, results.np = results.np, None
+            timed("full (py)", engine(force=True))
+            results.np = numpy
+            timed("no-op", engine())
+
+            rng = random.Random(7)
+            changed = rng.sample(ids, int(len(ids) * args.changed / 100))
+            for result in Result.query.filter(Result.student_id.in_(changed), Result.semester == args.semesters):
+                result.details = marksheet(rng, args.subjects)
+            db.session.commit()
+            timed("incremental", engine(student_ids=changed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Socket.IO broadcast fan-out across worker processes.
+
+Starts ``--workers`` server processes that share one message queue, connects
+``--clients`` Socket.IO clients to each, publishes ``--messages`` broadcasts
+from a write-only emitter and reports how many deliveries arrived and how
+long they took. Without ``--queue`` a local:// broker is started in-process.
+
+    python -m benchmarks.socketio_fanout --workers 4 --clients 25 --messages 200
+    python -m benchmarks.socketio_fanout --queue redis://localhost:6379/0
+
+Needs the ``loadtest`` extra (python-socketio client).
+"""
+import argparse
+import logging
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import socketio as sio
+
+from website.message_queue import Broker, external_emitter
+
+EVENT = "broadcast_new_post"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(port, queue):
+    from flask import Flask
+    from flask_login import LoginManager
+    from website.socketio_events import socketio, register_socketio_events
+
+    logging.getLogger("werkzeug").setLevel(logging.CRITICAL)
+    app = Flask(__name__)
+    LoginManager(app).user_loader(lambda user_id: None)
+    app.config["SOCKETIO_MESSAGE_QUEUE"] = queue
+    app.config["SOCKETIO_ASYNC_MODE"] = "threading"
+    register_socketio_events(app)
+    socketio.run(app, port=port, allow_unsafe_werkzeug=True, log_output=False)
+
+
+def connect(url, latencies, lock, attempts=50):
+    client = sio.Client()
+
+    @client.on(EVENT)
+    def on_broadcast(data):
+        with lock:
+            latencies.append(time.time() - data["sent_at"])
+
+    for _ in range(attempts):
+        try:
+            client.connect(url, transports=["websocket"])
+            return client
+        except sio.exceptions.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f"could not connect to {url}")
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(workers, clients, messages, queue):
+    broker = None
+    if queue is None:
+        broker = Broker(("127.0.0.1", free_port()))
+        threading.Thread(target=broker.serve_forever, daemon=True).start()
+        queue = "local://127.0.0.1:%d" % broker.server_address[1]
+
+    ports = [free_port() for _ in range(workers)]
+    procs = [
+        subprocess.Popen([sys.executable, "-m", "benchmarks.socketio_fanout", "--serve", str(port), "--queue", queue])
+        for port in ports
+    ]
+    latencies, lock = [], threading.Lock()
+    connected = []
+    try:
+        for port in ports:
+            for _ in range(clients):
+                connected.append(connect(f"http://127.0.0.1:{port}", latencies, lock))
+        # Give every worker's queue listener time to subscribe
+        time.sleep(1)
+
+        emitter = external_emitter(queue)
+        expected = workers * clients * messages
+        started = time.time()
+        for i in range(messages):
+            emitter.emit(EVENT, {"id": i, "sent_at": time.time()}, namespace="/")
+        deadline = time.time() + 30
+        while len(latencies) < expected and time.time() < deadline:
+            time.sleep(0.05)
+        elapsed = time.time() - started
+    finally:
+        for client in connected:
+            client.disconnect()
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+        if broker:
+            broker.shutdown()
+
+    received = len(latencies)
+    ms = [value * 1000 for value in latencies]
+    print(f"queue          {queue}")
+    print(f"workers        {workers} x {clients} clients")
+    print(f"deliveries     {received}/{expected} ({received / expected:.1%})")
+    print(f"throughput     {received / elapsed:,.0f} deliveries/s")
+    if ms:
+        print(f"latency ms     p50={percentile(ms, 50):.1f} p95={percentile(ms, 95):.1f} "
+              f"p99={percentile(ms, 99):.1f} mean={statistics.mean(ms):.1f}")
+    return received == expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--queue", help="message queue URL shared by the workers")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.queue)
+        return
+    sys.exit(0 if run(args.workers, args.clients, args.messages, args.queue) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+-- The original schema (BASELINE in website/migrations.py): what db.create_all() built
+-- before migrations existed. Used to check that such databases still upgrade to head.
+
+CREATE TABLE users (
+	id INTEGER NOT NULL,
+	name VARCHAR(120) NOT NULL,
+	username VARCHAR(120) NOT NULL,
+	email VARCHAR(120) NOT NULL,
+	password_hash VARCHAR(255) NOT NULL,
+	role VARCHAR(20) NOT NULL,
+	created_at DATETIME,
+	PRIMARY KEY (id),
+	UNIQUE (username),
+	UNIQUE (email)
+);
+CREATE TABLE tags (
+	id INTEGER NOT NULL,
+	name VARCHAR(50) NOT NULL,
+	PRIMARY KEY (id),
+	UNIQUE (name)
+);
+CREATE TABLE results (
+	id INTEGER NOT NULL,
+	student_id INTEGER NOT NULL,
+	semester INTEGER NOT NULL,
+	sgpa FLOAT,
+	cgpa FLOAT,
+	details JSON,
+	created_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(student_id) REFERENCES users (id)
+);
+CREATE TABLE notes (
+	id INTEGER NOT NULL,
+	title VARCHAR(255) NOT NULL,
+	description TEXT,
+	file_url VARCHAR(255) NOT NULL,
+	semester INTEGER NOT NULL,
+	subject VARCHAR(120) NOT NULL,
+	uploaded_by INTEGER NOT NULL,
+	uploaded_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(uploaded_by) REFERENCES users (id)
+);
+CREATE TABLE announcements (
+	id INTEGER NOT NULL,
+	title VARCHAR(255) NOT NULL,
+	content TEXT NOT NULL,
+	posted_by INTEGER NOT NULL,
+	posted_at DATETIME,
+	category VARCHAR(100),
+	file_url VARCHAR(255),
+	is_pinned BOOLEAN,
+	PRIMARY KEY (id),
+	FOREIGN KEY(posted_by) REFERENCES users (id)
+);
+CREATE TABLE events (
+	id INTEGER NOT NULL,
+	title VARCHAR(255) NOT NULL,
+	description TEXT,
+	start_time DATETIME NOT NULL,
+	end_time DATETIME NOT NULL,
+	location VARCHAR(255),
+	registration_link VARCHAR(255),
+	file_url VARCHAR(255),
+	category VARCHAR(100),
+	posted_by INTEGER NOT NULL,
+	posted_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(posted_by) REFERENCES users (id)
+);
+CREATE TABLE feedbacks (
+	id INTEGER NOT NULL,
+	user_id INTEGER,
+	is_anonymous BOOLEAN,
+	content TEXT NOT NULL,
+	submitted_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE TABLE posts (
+	id INTEGER NOT NULL,
+	author_id INTEGER NOT NULL,
+	title VARCHAR(255) NOT NULL,
+	content TEXT NOT NULL,
+	created_at DATETIME,
+	updated_at DATETIME,
+	file_url VARCHAR(255),
+	is_deleted BOOLEAN,
+	is_reported BOOLEAN,
+	PRIMARY KEY (id),
+	FOREIGN KEY(author_id) REFERENCES users (id)
+);
+CREATE TABLE attendance (
+	id INTEGER NOT NULL,
+	student_id INTEGER NOT NULL,
+	date DATE NOT NULL,
+	status VARCHAR(20) NOT NULL,
+	marked_by INTEGER NOT NULL,
+	marked_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(student_id) REFERENCES users (id),
+	FOREIGN KEY(marked_by) REFERENCES users (id)
+);
+CREATE TABLE timetable_entries (
+	id INTEGER NOT NULL,
+	student_id INTEGER NOT NULL,
+	day VARCHAR(20) NOT NULL,
+	period VARCHAR(20) NOT NULL,
+	subject VARCHAR(120) NOT NULL,
+	start_time TIME NOT NULL,
+	end_time TIME NOT NULL,
+	location VARCHAR(120),
+	created_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(student_id) REFERENCES users (id)
+);
+CREATE TABLE announcement_tags (
+	announcement_id INTEGER NOT NULL,
+	tag_id INTEGER NOT NULL,
+	PRIMARY KEY (announcement_id, tag_id),
+	FOREIGN KEY(announcement_id) REFERENCES announcements (id),
+	FOREIGN KEY(tag_id) REFERENCES tags (id)
+);
+CREATE TABLE event_rsvps (
+	event_id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL,
+	PRIMARY KEY (event_id, user_id),
+	FOREIGN KEY(event_id) REFERENCES events (id),
+	FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE TABLE post_tags (
+	post_id INTEGER NOT NULL,
+	tag_id INTEGER NOT NULL,
+	PRIMARY KEY (post_id, tag_id),
+	FOREIGN KEY(post_id) REFERENCES posts (id),
+	FOREIGN KEY(tag_id) REFERENCES tags (id)
+);
+CREATE TABLE comments (
+	id INTEGER NOT NULL,
+	post_id INTEGER NOT NULL,
+	author_id INTEGER NOT NULL,
+	content TEXT NOT NULL,
+	created_at DATETIME,
+	updated_at DATETIME,
+	is_deleted BOOLEAN,
+	is_reported BOOLEAN,
+	PRIMARY KEY (id),
+	FOREIGN KEY(post_id) REFERENCES posts (id),
+	FOREIGN KEY(author_id) REFERENCES users (id)
+);
+CREATE TABLE likes (
+	id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL,
+	post_id INTEGER NOT NULL,
+	created_at DATETIME,
+	PRIMARY KEY (id),
+	CONSTRAINT _user_post_uc UNIQUE (user_id, post_id),
+	FOREIGN KEY(user_id) REFERENCES users (id),
+	FOREIGN KEY(post_id) REFERENCES posts (id)
+);
+CREATE TABLE reports (
+	id INTEGER NOT NULL,
+	reporter_id INTEGER NOT NULL,
+	post_id INTEGER,
+	comment_id INTEGER,
+	reason VARCHAR(255),
+	created_at DATETIME,
+	is_resolved BOOLEAN,
+	PRIMARY KEY (id),
+	FOREIGN KEY(reporter_id) REFERENCES users (id),
+	FOREIGN KEY(post_id) REFERENCES posts (id),
+	FOREIGN KEY(comment_id) REFERENCES comments (id)
+);
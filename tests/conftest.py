@@ -0,0 +1,93 @@
+import pytest
+from flask import g, has_app_context
+from flask.testing import FlaskClient
+from sqlalchemy import event
+
+from app import create_app
+
+
+# Requests made inside a test reuse the test's app context, and with it g, where
+# Flask-Login keeps current_user; each request starts from an empty g instead
+class Client(FlaskClient):
+    def open(self, *args, **kwargs):
+        if has_app_context():
+            vars(g._get_current_object()).clear()
+        return super().open(*args, **kwargs)
+
+
+# Each test gets its own app on a fresh SQLite file, with jobs run inline and
+# every view held to its query budget
+@pytest.fixture
+def app_factory(tmp_path):
+    def make_app(**config):
+        app = create_app({
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+            "SQLALCHEMY_ENGINE_OPTIONS": {},
+            "TASK_WORKERS": 0,
+            "TASK_EAGER": True,
+            "QUERY_BUDGET_MODE": "raise",
+            **config,
+        })
+        app.test_client_class = Client
+        return app
+    return make_app
+
+
+@pytest.fixture
+def app(app_factory):
+    app = app_factory()
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    return tmp_path / "test.db"
+
+
+@pytest.fixture
+def make_user(app):
+    from website.models import db, User
+
+    def make(role="student", name=None):
+        count = User.query.count()
+        name = name or f"{role}{count}"
+        user = User(name=name, username=name, email=f"{name}@example.com", password_hash="x", role=role)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+# A test client signed in as ``user`` (Flask-Login reads the id from the session)
+@pytest.fixture
+def client_for(app):
+    def client(user):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user.id)
+            session["_fresh"] = True
+        return client
+    return client
+
+
+# Runs ``fn`` and returns the INSERT/UPDATE/DELETE statements it sent to the database
+@pytest.fixture
+def writes_during(app):
+    from website.models import db
+
+    def writes(fn):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
+                statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            fn()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+        return statements
+    return writes
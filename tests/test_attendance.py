@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+
+import pytest
+
+from website.models import Attendance
+
+
+@pytest.mark.parametrize("subject", [42, ["Databases"], {"name": "Databases"}])
+def test_a_subject_that_is_not_a_string_is_a_400(make_user, client_for, subject):
+    teacher, student = client_for(make_user("teacher")), make_user()
+    response = teacher.post("/teacher/attendance", json={
+        "subject": subject, "records": [{"student_id": student.id, "status": "present"}],
+    })
+    assert response.status_code == 400
+    assert response.json["errors"] == ["subject must be a string."]
+    assert Attendance.query.count() == 0
+
+
+def test_marking_a_class(make_user, client_for):
+    teacher, student = client_for(make_user("teacher")), make_user()
+    response = teacher.post("/teacher/attendance", json={
+        "date": "2025-03-10", "subject": " Databases ",
+        "records": [{"username": student.username, "status": "present"}],
+    })
+    assert response.status_code == 200
+    assert (response.json["subject"], response.json["created"]) == ("Databases", 1)
+    assert teacher.post("/teacher/attendance", json={"records": []}).json["errors"] == [
+        "A subject is required.", "No attendance records given.",
+    ]
+
+
+def summary(teacher, subject):
+    response = teacher.get(f"/teacher/attendance/summary?subject={subject}")
+    return [(row["total"], row["attended"]) for row in response.json["students"]]
+
+
+def test_marking_a_class_again_moves_the_summary(make_user, client_for):
+    teacher, student = client_for(make_user("teacher")), make_user()
+    for status, outcome in (("absent", (1, 0, 0)), ("late", (0, 1, 0)), ("late", (0, 0, 1))):
+        response = teacher.post("/teacher/attendance", json={
+            "date": "2025-03-10", "subject": "Databases", "records": [{"student_id": student.id, "status": status}],
+        })
+        assert (response.json["created"], response.json["changed"], response.json["unchanged"]) == outcome
+    assert summary(teacher, "Databases") == [(1, 1)]
+
+
+def test_marking_waits_for_a_concurrent_mark_of_the_class(make_user, client_for, database_path):
+    teacher, student = client_for(make_user("teacher")), make_user()
+    # Another writer marks the student absent and commits while we are marking them present
+    other = sqlite3.connect(database_path, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    other.execute(
+        "INSERT INTO attendance (student_id, date, subject, status, marked_by) VALUES (?, '2025-03-10', 'Databases', 'absent', ?)",
+        (student.id, student.id),
+    )
+    other.execute(
+        "INSERT INTO attendance_summaries (student_id, subject, total, attended) VALUES (?, 'Databases', 1, 0)",
+        (student.id,),
+    )
+    timer = threading.Timer(0.3, other.execute, ["COMMIT"])
+    timer.start()
+    try:
+        response = teacher.post("/teacher/attendance", json={
+            "date": "2025-03-10", "subject": "Databases", "records": [{"student_id": student.id, "status": "present"}],
+        })
+    finally:
+        timer.join()
+        other.close()
+    assert (response.json["created"], response.json["changed"]) == (0, 1)
+    assert summary(teacher, "Databases") == [(1, 1)]
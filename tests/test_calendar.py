@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+from itsdangerous import URLSafeSerializer
+
+from website.cache import cache
+from website.ical import calendar_token
+from website.models import db, Event, User
+
+
+def add_event(poster, title, posted_at):
+    start = datetime.now() + timedelta(days=7)
+    event = Event(title=title, start_time=start, end_time=start + timedelta(hours=2),
+                  posted_by=poster.id, posted_at=posted_at)
+    db.session.add(event)
+    db.session.commit()
+    return event
+
+
+def test_rendering_the_same_feed_again_keeps_its_validators(app, make_user, client_for):
+    teacher = make_user("teacher")
+    add_event(teacher, "Tech fest", datetime(2026, 1, 5, 9, 30))
+    client = app.test_client()
+    url = f"/events/calendar/{calendar_token(teacher)}/all.ics"
+
+    first = client.get(url)
+    # Rendered again (an expired entry, an unrelated edit): same body, so a 304 either way
+    cache.invalidate("events")
+    again = client.get(url, headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert again.status_code == 304
+    cache.invalidate("events")
+    assert client.get(url, headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+
+def test_an_event_leaving_the_window_is_a_change(app, make_user, client_for):
+    teacher = make_user("teacher")
+    add_event(teacher, "Tech fest", datetime(2026, 1, 5))
+    ageing = add_event(teacher, "Sports day", datetime(2026, 1, 2))
+    client = app.test_client()
+    url = f"/events/calendar/{calendar_token(teacher)}/all.ics"
+    first = client.get(url)
+    assert "SUMMARY:Sports day" in first.text
+
+    # Time passing rather than an edit: nothing newer was posted
+    db.session.execute(db.update(Event).where(Event.id == ageing.id).values(start_time=datetime(2000, 1, 1)))
+    db.session.commit()
+    cache.invalidate("events")
+    later = client.get(url, headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert later.status_code == 200
+    assert "SUMMARY:Sports day" not in later.text
+    assert later.last_modified > first.last_modified
+
+
+def test_registering_moves_the_personal_feed_forward(app, make_user, client_for):
+    teacher, student = make_user("teacher"), make_user()
+    event = add_event(teacher, "Tech fest", datetime(2026, 1, 5))
+    url = f"/events/calendar/{calendar_token(student)}/mine.ics"
+    empty = app.test_client().get(url)
+
+    student_client = client_for(student)
+    assert calendar_token(student) in student_client.get(f"/events/{event.id}").text
+    student_client.post(f"/events/{event.id}/rsvp")
+    registered = app.test_client().get(url, headers={"If-Modified-Since": empty.headers["Last-Modified"]})
+    assert registered.status_code == 200
+    assert "SUMMARY:Tech fest" in registered.text
+    assert registered.last_modified > empty.last_modified
+
+    # Cancelling removes an event without posting anything newer
+    student_client.post(f"/events/{event.id}/cancel")
+    cancelled = app.test_client().get(url, headers={"If-Modified-Since": registered.headers["Last-Modified"]})
+    assert cancelled.status_code == 200
+    assert "SUMMARY:Tech fest" not in cancelled.text
+
+
+def test_resetting_revokes_earlier_feed_urls(app, make_user, client_for):
+    student = make_user()
+    old = calendar_token(student)
+    unversioned = URLSafeSerializer(app.secret_key, salt="calendar-feed").dumps(student.id)
+    assert app.test_client().get(f"/events/calendar/{unversioned}/all.ics").status_code == 200
+
+    assert client_for(student).post("/events/calendar/reset").status_code == 302
+    new = calendar_token(db.session.get(User, student.id))
+    assert new != old
+    for token in (old, unversioned):
+        assert app.test_client().get(f"/events/calendar/{token}/all.ics").status_code == 404
+    assert app.test_client().get(f"/events/calendar/{new}/all.ics").status_code == 200
@@ -0,0 +1,28 @@
+from website.database import database_url, engine_options
+from website.models import db
+
+
+def pragma(name):
+    return db.session.connection().exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def test_database_url_comes_from_the_environment(monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    assert database_url() == "sqlite:///website.db"
+    monkeypatch.setenv("DATABASE_URL", "postgres://nexus:secret@db:5432/nexus")
+    assert database_url() == "postgresql://nexus:secret@db:5432/nexus"
+
+
+def test_only_server_databases_get_a_pool(monkeypatch):
+    assert engine_options("sqlite:///website.db") == {}
+    monkeypatch.setenv("DATABASE_POOL_SIZE", "20")
+    options = engine_options("postgresql://db/nexus")
+    assert (options["pool_size"], options["max_overflow"], options["pool_pre_ping"]) == (20, 10, True)
+
+
+def test_sqlite_connections_get_the_configured_pragmas(app_factory):
+    app = app_factory(SQLITE_BUSY_TIMEOUT_MS=1234, SQLITE_SYNCHRONOUS="FULL")
+    with app.app_context():
+        assert pragma("journal_mode") == "wal"
+        assert pragma("busy_timeout") == 1234
+        assert pragma("synchronous") == 2  # FULL
@@ -0,0 +1,57 @@
+import io
+
+import pytest
+
+from website.models import db, Note
+from website.storage import save_stream
+
+BODY = b"".join(b"line %03d of the lecture notes\n" % i for i in range(100))
+
+
+@pytest.fixture
+def note_url(app, tmp_path, make_user):
+    app.config["UPLOAD_ROOT"] = str(tmp_path / "blobs")
+    teacher = make_user("teacher")
+    note = Note(title="Week 1", file_url=save_stream(io.BytesIO(BODY), "week1.txt"), semester=3,
+                subject="Mathematics", uploaded_by=teacher.id)
+    db.session.add(note)
+    db.session.commit()
+    return f"/notes/{note.id}/download"
+
+
+def test_a_range_request_gets_the_slice(note_url, make_user, client_for):
+    client = client_for(make_user())
+    full = client.get(note_url)
+    assert (full.status_code, full.data) == (200, BODY)
+    assert full.headers["Accept-Ranges"] == "bytes"
+    assert full.headers["Content-Disposition"] == "attachment; filename=Week_1.txt"
+
+    part = client.get(note_url, headers={"Range": "bytes=100-199"})
+    assert (part.status_code, part.data) == (206, BODY[100:200])
+    assert part.headers["Content-Range"] == f"bytes 100-199/{len(BODY)}"
+
+
+def test_the_strong_etag_answers_a_revalidation(note_url, make_user, client_for):
+    client = client_for(make_user())
+    etag = client.get(note_url).headers["ETag"]
+    assert not etag.startswith("W/")
+    assert client.get(note_url, headers={"If-None-Match": etag}).status_code == 304
+    # If-Range with the current ETag keeps the range; a stale one gets the whole file
+    assert client.get(note_url, headers={"Range": "bytes=0-9", "If-Range": etag}).status_code == 206
+    assert client.get(note_url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'}).status_code == 200
+
+
+def test_a_range_past_the_end_is_a_416(note_url, make_user, client_for):
+    response = client_for(make_user()).get(note_url, headers={"Range": f"bytes={len(BODY)}-"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(BODY)}"
+
+
+def test_nginx_streams_the_file_through_x_accel_redirect(app, note_url, make_user, client_for):
+    app.config["DOWNLOAD_OFFLOAD"] = "x-accel"
+    client = client_for(make_user())
+    response = client.get(note_url)
+    assert (response.status_code, response.data) == (200, b"")
+    accel = response.headers["X-Accel-Redirect"]
+    assert accel.startswith("/_protected/blobs/") and accel.endswith(".txt")
+    assert client.get(note_url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
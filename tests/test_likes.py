@@ -0,0 +1,59 @@
+from website.models import db, Comment, Post
+
+
+def add_post(author):
+    post = Post(author_id=author.id, title="Lost calculator", content="Blue, left in room 204")
+    db.session.add(post)
+    db.session.commit()
+    return post.id
+
+
+def like(client, post_id, action=None):
+    response = client.post(f"/feed/like/{post_id}", data={"action": action} if action else {})
+    assert response.status_code == 200
+    return response.json["status"], response.json["count"]
+
+
+def like_count(post_id):
+    return db.session.scalar(db.select(Post.like_count).where(Post.id == post_id))
+
+
+def test_toggling_a_like_moves_the_counter(make_user, client_for):
+    post_id = add_post(make_user())
+    first, second = client_for(make_user()), client_for(make_user())
+    assert like(first, post_id) == ("liked", 1)
+    assert like(second, post_id) == ("liked", 2)
+    assert like(first, post_id) == ("unliked", 1)
+    assert like_count(post_id) == 1
+
+
+def test_pinned_actions_can_be_retried(make_user, client_for):
+    post_id = add_post(make_user())
+    client = client_for(make_user())
+    assert like(client, post_id, "like") == ("liked", 1)
+    assert like(client, post_id, "like") == ("liked", 1)
+    assert like(client, post_id, "unlike") == ("unliked", 0)
+    assert like(client, post_id, "unlike") == ("unliked", 0)
+    assert client.post("/feed/like/999", data={"action": "like"}).status_code == 404
+    assert client.post(f"/feed/like/{post_id}", data={"action": "love"}).status_code == 400
+
+
+def test_reconcile_recounts_drifted_counters(make_user, client_for):
+    author = make_user()
+    post_id = add_post(author)
+    like(client_for(make_user()), post_id)
+    db.session.add_all([
+        Comment(post_id=post_id, author_id=author.id, content="Found it"),
+        Comment(post_id=post_id, author_id=author.id, content="Never mind", is_deleted=True),
+    ])
+    # Rows written behind the counters' back, the way an old import would
+    db.session.execute(db.update(Post).values(like_count=7, comment_count=0))
+    db.session.commit()
+
+    assert Post.reconcile_counters(dry_run=True) == 1
+    assert like_count(post_id) == 7
+    assert Post.reconcile_counters() == 1
+    post = db.session.get(Post, post_id)
+    db.session.refresh(post)
+    assert (post.like_count, post.comment_count) == (1, 1)
+    assert Post.reconcile_counters() == 0
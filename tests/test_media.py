@@ -0,0 +1,59 @@
+import errno
+import io
+
+import pytest
+
+from website import media
+from website.media import responsive_image
+from website.models import db, Job, StoredFile
+from website.storage import save_stream
+
+Image = pytest.importorskip("PIL.Image")  # the media extra
+
+
+@pytest.fixture
+def media_app(app_factory, tmp_path):
+    app = app_factory(UPLOAD_ROOT=str(tmp_path / "blobs"))
+    with app.app_context():
+        yield app
+
+
+def store(body, filename):
+    url = save_stream(io.BytesIO(body), filename)
+    db.session.commit()  # queues media.variants, run inline by TASK_EAGER
+    return db.session.get(StoredFile, media.media_sha(url))
+
+
+def png(width=800, height=600):
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), "teal").save(out, "PNG")
+    return out.getvalue()
+
+
+def test_legacy_bare_filenames_point_at_the_old_uploads_folder(app):
+    with app.test_request_context():
+        assert 'src="/static/uploads/pic.png"' in responsive_image("pic.png")
+
+
+def test_variants_are_built_for_a_new_image(media_app):
+    blob = store(png(), "poster.png")
+    assert blob.media_status == "ready"
+    assert sorted(variant.name for variant in blob.variants) == ["original", "w320", "w640"]
+
+
+def test_undecodable_upload_is_marked_failed(media_app):
+    blob = store(b"not an image", "broken.png")
+    assert blob.media_status == "failed"
+    assert Job.query.count() == 0
+
+
+def test_transient_error_is_left_for_the_task_to_retry(media_app, monkeypatch):
+    def disk_full(*args, **kwargs):
+        raise OSError(errno.ENOSPC, "No space left on device")
+    monkeypatch.setattr(media, "_write", disk_full)
+
+    blob = store(png(), "poster.png")
+    assert blob.media_status is None
+    job = Job.query.one()
+    assert (job.status, job.attempts) == ("queued", 1)
+    assert "No space left" in job.last_error
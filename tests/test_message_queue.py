@@ -0,0 +1,58 @@
+import json
+import queue
+import threading
+import time
+
+import pytest
+
+from website.message_queue import Broker, LocalManager, hub
+
+
+@pytest.fixture
+def broker():
+    server = Broker(("127.0.0.1", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def listen(manager):
+    """Messages ``manager`` receives, read on a background thread."""
+    received = queue.Queue()
+
+    def run():
+        for message in manager._listen():
+            received.put(json.loads(message))
+
+    threading.Thread(target=run, daemon=True).start()
+    return received
+
+
+def wait_for_subscribers(broker, channel, count):
+    deadline = time.monotonic() + 5
+    while len(broker.subscribers.get(channel, ())) < count:
+        assert time.monotonic() < deadline, "subscribers never connected"
+        time.sleep(0.01)
+
+
+def test_the_hub_fans_out_to_every_server_but_not_to_emitters():
+    first, second = LocalManager(channel="hub-test"), LocalManager(channel="hub-test")
+    LocalManager(channel="hub-test", write_only=True)
+    assert len(hub.channels["hub-test"]) == 2
+
+    LocalManager(channel="hub-test", write_only=True)._publish({"event": "new_post", "id": 1})
+    for server in (first, second):
+        assert json.loads(server._inbox.get(timeout=1)) == {"event": "new_post", "id": 1}
+
+
+def test_the_broker_fans_out_over_tcp(broker):
+    url = f"local://127.0.0.1:{broker.server_address[1]}"
+    inboxes = [listen(LocalManager(url, channel="broker-test")) for _ in range(2)]
+    wait_for_subscribers(broker, "broker-test", 2)
+
+    emitter = LocalManager(url, channel="broker-test", write_only=True)
+    for i in range(3):
+        emitter._publish({"event": "like_count", "count": i})
+    for inbox in inboxes:
+        assert [inbox.get(timeout=5)["count"] for _ in range(3)] == [0, 1, 2]
@@ -0,0 +1,39 @@
+import re
+
+from website.metrics import registry
+
+
+def scrape(client, token=None):
+    return client.get("/admin/metrics", headers={"Authorization": f"Bearer {token}"} if token else {})
+
+
+def sample(body, name, **labels):
+    """The value of one series in a Prometheus text exposition."""
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{name}\{{{re.escape(wanted)}\}} (\S+)$", body, re.M)
+    return float(match.group(1)) if match else None
+
+
+def test_requests_show_up_in_the_scrape(app, make_user, client_for):
+    app.config["METRICS_TOKEN"] = "scrape-me"
+    registry.clear()
+    student = client_for(make_user())
+    for _ in range(2):
+        assert student.get("/feed").status_code == 200
+
+    assert scrape(student).status_code == 403
+    assert scrape(app.test_client(), "wrong").status_code == 403
+    response = scrape(app.test_client(), "scrape-me")
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert "# TYPE nexus_http_request_duration_seconds histogram" in body
+    assert sample(body, "nexus_http_requests_total", endpoint="feed.feed", method="GET", status=200) == 2
+    assert sample(body, "nexus_http_request_duration_seconds_count", endpoint="feed.feed", method="GET") == 2
+    assert sample(body, "nexus_sql_queries_total", endpoint="feed.feed") >= 2
+    assert sample(body, "nexus_template_renders_total", template="feed/feed.html") == 2
+
+
+def test_admins_can_profile_a_request(make_user, client_for):
+    response = client_for(make_user("admin")).get("/feed?_profile=1")
+    assert response.headers["Content-Type"] == "text/plain; charset=utf-8"
+    assert client_for(make_user()).get("/feed?_profile=1").headers["Content-Type"].startswith("text/html")
@@ -0,0 +1,72 @@
+import sqlite3
+from pathlib import Path
+
+from sqlalchemy import inspect
+
+from website.migrations import BASELINE, MIGRATIONS, current_version, head, upgrade
+from website.models import db, AnnouncementChange, Event, Post, SectionPeriod, User
+from website.search import matching_ids
+
+BASELINE_SCHEMA = Path(__file__).with_name("baseline_schema.sql")
+
+# A little of everything the migrations rewrite
+LEGACY_ROWS = """
+INSERT INTO users VALUES (1, 'Admin', 'admin', 'admin@x', 'x', 'admin', '2024-01-01 00:00:00');
+INSERT INTO users VALUES (2, 'Asha', 'asha', 'asha@x', 'x', 'student', '2024-01-01 00:00:00');
+INSERT INTO users VALUES (3, 'Bilal', 'bilal', 'bilal@x', 'x', 'student', '2024-01-01 00:00:00');
+INSERT INTO posts VALUES (1, 2, 'Hello', 'first post', '2024-01-02 00:00:00', NULL, 'pic.png', 0, 0);
+INSERT INTO comments VALUES (1, 1, 3, 'welcome', '2024-01-02 00:00:00', NULL, 0, 0);
+INSERT INTO likes VALUES (1, 3, 1, '2024-01-02 00:00:00');
+INSERT INTO announcements VALUES (1, 'Midterm schedule', 'Exams start Monday', 1, '2024-01-03 00:00:00', 'exam', NULL, 1);
+INSERT INTO events VALUES (1, 'Tech fest', 'Talks', '2030-01-01 10:00:00', '2030-01-01 12:00:00', 'Hall', NULL, NULL, 'Tech', 1, '2024-01-01 00:00:00');
+INSERT INTO event_rsvps VALUES (1, 2);
+INSERT INTO notes VALUES (1, 'Calculus', 'Limits', 'calc.pdf', 3, 'Math', 1, '2024-01-01 00:00:00');
+INSERT INTO results VALUES (1, 2, 1, 8.0, 8.0, '{}', '2024-01-01 00:00:00');
+INSERT INTO attendance VALUES (1, 2, '2024-01-05', 'present', 1, '2024-01-05 00:00:00');
+INSERT INTO timetable_entries VALUES (1, 2, 'Monday', '1', 'Math', '09:00:00.000000', '10:00:00.000000', 'R1', '2024-01-01 00:00:00');
+INSERT INTO timetable_entries VALUES (2, 3, 'Monday', '1', 'Math', '09:00:00.000000', '10:00:00.000000', 'R1', '2024-01-01 00:00:00');
+"""
+
+
+def legacy_database(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA.read_text())
+    conn.executescript(LEGACY_ROWS)
+    conn.commit()
+    conn.close()
+
+
+def test_baseline_database_upgrades_to_head(app_factory, database_path):
+    legacy_database(database_path)
+    app = app_factory(DATABASE_AUTO_MIGRATE=False)
+    with app.app_context():
+        assert upgrade() == [version for version in sorted(MIGRATIONS) if version > BASELINE]
+        assert current_version() == head()
+
+        # The upgraded schema has everything the models declare
+        inspector = inspect(db.engine)
+        for table in db.metadata.sorted_tables:
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            assert set(table.c.keys()) <= columns, table.name
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            assert {index.name for index in table.indexes} <= indexes, table.name
+
+
+def test_upgrade_carries_legacy_rows_forward(app_factory, database_path):
+    legacy_database(database_path)
+    app = app_factory(DATABASE_AUTO_MIGRATE=False)
+    with app.app_context():
+        upgrade()
+        post = db.session.get(Post, 1)
+        assert (post.like_count, post.comment_count) == (1, 1)
+        assert db.session.get(Event, 1).rsvp_count == 1
+        assert db.session.scalars(matching_ids("announcement", "midterm")).all() == [1]
+        # Identical personal timetables became one shared section
+        assert db.session.get(User, 2).section_id == db.session.get(User, 3).section_id is not None
+        assert SectionPeriod.query.count() == 1
+        assert db.session.get(AnnouncementChange, 1).seq == 1
+
+
+def test_new_database_is_created_at_head(app):
+    assert current_version() == head()
+    assert User.query.filter_by(username="admin").count() == 1
@@ -0,0 +1,52 @@
+from website.models import db, Announcement, AnnouncementRead
+
+
+def post_announcement(client, title, **form):
+    response = client.post("/announcements/create", data={"title": title, "content": "...", **form})
+    assert response.status_code == 302
+    return Announcement.query.filter_by(title=title).one().id
+
+
+def test_delta_sync_reports_new_edited_and_deleted(make_user, client_for):
+    teacher, student = client_for(make_user("teacher")), client_for(make_user())
+    first = post_announcement(teacher, "Exam dates")
+    second = post_announcement(teacher, "Holiday")
+
+    synced = student.get("/announcements/since?cursor=0").json
+    assert [item["title"] for item in synced["changed"]] == ["Exam dates", "Holiday"]
+    assert synced["deleted"] == [] and synced["unread"] == 2
+
+    teacher.post(f"/announcements/edit/{first}", data={"title": "Exam dates", "content": "...", "is_pinned": "1"})
+    teacher.post(f"/announcements/delete/{second}")
+    delta = student.get(f"/announcements/since?cursor={synced['cursor']}").json
+    assert [(item["id"], item["pinned"]) for item in delta["changed"]] == [(first, True)]
+    assert delta["deleted"] == [second]
+    assert delta["unread"] == 1
+
+    assert student.get(f"/announcements/since?cursor={delta['cursor']}").json["changed"] == []
+    assert student.get("/announcements/since?cursor=999").json["reset"] is True
+    assert student.get("/announcements/since?cursor=x").status_code == 400
+
+
+def test_reading_moves_the_cursor_forward_only(make_user, client_for):
+    teacher, student = client_for(make_user("teacher")), client_for(make_user())
+    for title in ("One", "Two", "Three"):
+        post_announcement(teacher, title)
+    assert student.post("/announcements/read", data={"cursor": "2"}).json == {"unread": 1}
+    assert student.post("/announcements/read", data={"cursor": "1"}).json == {"unread": 1}
+    assert student.post("/announcements/read").json == {"unread": 0}
+
+
+def test_list_view_only_writes_when_the_reader_is_behind(make_user, client_for, writes_during):
+    teacher, user = client_for(make_user("teacher")), make_user()
+    student = client_for(user)
+    post_announcement(teacher, "Exam dates", category="exam")
+
+    # A filtered view shows only part of the list, so nothing is marked read
+    assert writes_during(lambda: student.get("/announcements?category=exam")) == []
+    assert db.session.get(AnnouncementRead, user.id) is None
+
+    assert writes_during(lambda: student.get("/announcements"))
+    assert student.get("/announcements/since?cursor=0").json["unread"] == 0
+    assert writes_during(lambda: student.get("/announcements")) == []
+    assert writes_during(lambda: student.get("/announcements/since?cursor=0")) == []
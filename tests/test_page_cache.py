@@ -0,0 +1,10 @@
+def test_events_page_does_not_leak_another_users_search(make_user, client_for):
+    first, second = client_for(make_user()), client_for(make_user())
+    assert b"my private search" in first.get("/events?q=my private search").data
+    assert b"my private search" not in second.get("/events").data
+
+
+def test_announcements_page_does_not_leak_other_query_args(make_user, client_for):
+    first, second = client_for(make_user()), client_for(make_user())
+    first.get("/announcements?category=exam&note=private")
+    assert b"private" not in second.get("/announcements?category=exam").data
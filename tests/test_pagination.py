@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from website.models import db, Post
+from website.pagination import clamp_page_size, decode_cursor, encode_cursor
+
+
+def add_posts(author, created_at):
+    db.session.add_all([Post(author_id=author.id, title=f"Post {i}", content="...", created_at=moment)
+                        for i, moment in enumerate(created_at)])
+    db.session.commit()
+    return [post.id for post in Post.query.order_by(Post.id)]
+
+
+def walk(client, per_page):
+    pages, cursor = [], None
+    while True:
+        query = f"/feed/api/posts?per_page={per_page}" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(query).json
+        pages.append([post["id"] for post in page["posts"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_pages_split_ties_on_created_at_by_id(make_user, client_for):
+    author = make_user()
+    noon = datetime(2025, 3, 10, 12)
+    # Five posts in the same instant between an older and a newer one
+    ids = add_posts(author, [noon - timedelta(hours=1)] + [noon] * 5 + [noon + timedelta(hours=1)])
+    pages = walk(client_for(author), per_page=2)
+    assert pages == [[ids[6], ids[5]], [ids[4], ids[3]], [ids[2], ids[1]], [ids[0]]]
+
+
+def test_a_full_last_page_has_no_next_cursor(make_user, client_for):
+    author = make_user()
+    ids = add_posts(author, [datetime(2025, 3, d) for d in range(1, 5)])
+    assert walk(client_for(author), per_page=2) == [[ids[3], ids[2]], [ids[1], ids[0]]]
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor(datetime(2025, 1, 1), 1)[:-3], "////"])
+def test_a_bad_cursor_is_a_400(make_user, client_for, cursor):
+    client = client_for(make_user())
+    response = client.get(f"/feed/api/posts?cursor={cursor}")
+    assert (response.status_code, response.json) == (400, {"error": "invalid cursor"})
+    assert client.get(f"/feed?cursor={cursor}").status_code == 400
+
+
+def test_cursors_round_trip_and_page_sizes_stay_in_bounds():
+    moment = datetime(2025, 3, 10, 12, 30, 15, 250)
+    assert decode_cursor(encode_cursor(moment, 42)) == (moment, 42)
+    assert [clamp_page_size(value, 20, 50) for value in (None, "5", "0", "500", "ten")] == [20, 5, 1, 50, 20]
@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from website.models import db, User
+from website.passwords import HasherBusy, hasher
+
+
+@pytest.fixture
+def app(app_factory):
+    # A cheap work factor; what matters here is which parameters a hash was made with
+    app = app_factory(PASSWORD_HASH_METHOD="scrypt:1024:8:1")
+    with app.app_context():
+        yield app
+
+
+def add_user(password_hash):
+    user = User(name="Asha", username="asha", email="asha@example.com", password_hash=password_hash, role="student")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def login(app, password):
+    return app.test_client().post("/auth/login", data={"username": "asha", "password": password})
+
+
+def test_hashes_with_other_parameters_are_upgraded_at_login(app):
+    old = generate_password_hash("hunter22", "pbkdf2:sha256:1000")
+    user = add_user(old)
+    assert hasher.needs_rehash(old)
+
+    assert login(app, "wrong").status_code == 200
+    assert db.session.get(User, user.id).password_hash == old
+    assert login(app, "hunter22").status_code == 302
+    upgraded = db.session.scalar(db.select(User.password_hash).where(User.id == user.id))
+    assert upgraded.startswith("scrypt:1024:8:1$") and not hasher.needs_rehash(upgraded)
+    assert hasher.verify(upgraded, "hunter22")
+
+
+def test_hashing_runs_in_the_pool(app):
+    assert hasher.submit(threading.get_ident) != threading.get_ident()
+
+
+def test_a_full_queue_turns_logins_away(app, monkeypatch):
+    add_user(hasher.hash("hunter22"))
+    monkeypatch.setattr(hasher, "slots", threading.BoundedSemaphore(1))
+    hasher.slots.acquire()  # a hash already in flight
+    with pytest.raises(HasherBusy):
+        hasher.verify(hasher.signature, "hunter22")
+    response = login(app, "hunter22")
+    assert (response.status_code, response.headers["Retry-After"]) == (503, "2")
+    hasher.slots.release()
+    assert login(app, "hunter22").status_code == 302
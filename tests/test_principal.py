@@ -0,0 +1,39 @@
+from website.models import db, User
+from website.principal import Principal, load_principal
+
+
+def test_principals_are_cached_until_a_change_to_the_user_commits(make_user):
+    user = make_user()
+    principal = load_principal(str(user.id))
+    assert load_principal(user.id) is principal
+
+    user.role = "cr"
+    db.session.flush()
+    # Not committed yet: other requests keep seeing the committed row
+    assert load_principal(user.id) is principal
+    db.session.commit()
+    assert load_principal(user.id).role == "cr"
+
+    db.session.delete(db.session.get(User, user.id))
+    db.session.commit()
+    assert load_principal(user.id) is None
+
+
+def test_principals_stand_in_for_the_user(make_user):
+    user = make_user(name="asha")
+    principal = load_principal(user.id)
+    assert isinstance(principal, Principal)
+    assert (principal.get_id(), principal.username, principal.is_authenticated) == (str(user.id), "asha", True)
+    # Fields outside the slim copy come from the ORM row
+    assert principal.password_hash == "x"
+    assert principal == user and principal == load_principal(user.id)
+    assert load_principal("not-an-id") is None and load_principal(9999) is None
+
+
+def test_a_role_change_reaches_the_next_request(make_user, client_for):
+    user = make_user()
+    client = client_for(user)
+    assert client.get("/teacher/attendance/summary?subject=Databases").status_code == 403
+    db.session.get(User, user.id).role = "teacher"
+    db.session.commit()
+    assert client.get("/teacher/attendance/summary?subject=Databases").status_code == 200
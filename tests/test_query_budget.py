@@ -0,0 +1,57 @@
+import re
+
+import pytest
+
+from website.models import db, User
+from website.query_budget import QueryBudgetExceeded, QueryBudgetWarning, query_budget, statement_shape
+
+
+# An app with two views that overspend: three statements against a budget of
+# two, and one statement repeated per row the way a lazy load in a loop is
+def budget_app(app_factory, mode):
+    app = app_factory(QUERY_BUDGET_MODE=mode)
+
+    @query_budget(2)
+    def three_queries():
+        for _ in range(3):
+            db.session.scalar(db.select(db.func.count(User.id)))
+        return "ok"
+
+    @query_budget(20, repeat_limit=3)
+    def lazy_loop():
+        for user_id in range(1, 6):
+            db.session.get(User, user_id)
+        return "ok"
+
+    app.add_url_rule("/three-queries", view_func=three_queries)
+    app.add_url_rule("/lazy-loop", view_func=lazy_loop)
+    return app
+
+
+@pytest.mark.parametrize("path, report", [
+    ("/three-queries", "ran 3 SQL statement(s), budget 2"),
+    ("/lazy-loop", "5x SELECT users.id"),
+])
+def test_raise_mode_fails_the_request(app_factory, path, report):
+    app = budget_app(app_factory, "raise")
+    with app.app_context(), pytest.raises(QueryBudgetExceeded, match=re.escape(report)):
+        app.test_client().get(path)
+
+
+def test_warn_mode_lets_the_response_through(app_factory):
+    app = budget_app(app_factory, "warn")
+    with app.app_context(), pytest.warns(QueryBudgetWarning, match="budget 2"):
+        assert app.test_client().get("/three-queries").text == "ok"
+
+
+def test_off_mode_does_not_count(app_factory, recwarn):
+    app = budget_app(app_factory, "off")
+    with app.app_context():
+        assert app.test_client().get("/three-queries").text == "ok"
+    assert not [w for w in recwarn if issubclass(w.category, QueryBudgetWarning)]
+
+
+def test_in_lists_of_any_length_share_a_shape():
+    assert statement_shape("SELECT * FROM users\n WHERE id IN (?, ?, ?)") == statement_shape(
+        "SELECT * FROM users WHERE id IN (?)"
+    ) == statement_shape("SELECT * FROM users WHERE id IN (__[POSTCOMPILE_id_1])")
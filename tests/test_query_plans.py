@@ -0,0 +1,26 @@
+import pytest
+
+from website.models import db
+from website.query_plans import HOT_QUERIES, check_plans
+from website.seed import seed_campus
+
+
+# A small campus with statistics gathered, so plans are the ones a real database would get
+@pytest.fixture
+def seeded(app):
+    seed_campus(students=300)
+    db.session.connection().exec_driver_sql("ANALYZE")
+    db.session.commit()
+
+
+def test_no_hot_query_scans_a_table(seeded):
+    report = check_plans()
+    assert report.keys() == HOT_QUERIES.keys()
+    regressions = {name: plan for name, (plan, scans) in report.items() if scans}
+    assert regressions == {}
+
+
+def test_a_dropped_index_shows_up_as_a_full_scan(seeded):
+    db.session.connection().exec_driver_sql("DROP INDEX ix_notes_uploaded_at")
+    plan, scans = check_plans({"notes: all": HOT_QUERIES["notes: all"]})["notes: all"]
+    assert scans == ["SCAN notes"]
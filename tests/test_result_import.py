@@ -0,0 +1,46 @@
+import io
+
+from website.models import Result
+from website.result_import import import_results, read_rows
+
+HEADER = b"username,semester,code,credits,grade\n"
+
+
+def upload(client, body, filename="results.csv"):
+    return client.post("/admin/results/import?format=json",
+                       data={"file": (io.BytesIO(body), filename)}, content_type="multipart/form-data")
+
+
+def test_a_bad_header_is_a_400(make_user, client_for):
+    response = upload(client_for(make_user("admin")), b"roll,marks\ns1,90\n")
+    assert response.status_code == 400
+    assert "Expected columns" in response.json["error"]
+
+
+def test_a_file_that_is_not_utf8_is_a_400(make_user, client_for):
+    student = make_user()
+    body = HEADER + f"{student.username},1,CS101,4,A\n".encode() + b"caf\xe9,1,CS102,4,B\n"
+    response = upload(client_for(make_user("admin")), body)
+    assert response.status_code == 400
+    assert response.json["error"] == "The file is not UTF-8 text."
+    assert Result.query.count() == 0
+
+
+def test_a_corrupt_workbook_is_a_400(make_user, client_for):
+    response = upload(client_for(make_user("admin")), b"PK\x03\x04 not really a zip", "results.xlsx")
+    assert response.status_code == 400
+    assert response.json["error"] == "The file is not a readable .xlsx workbook."
+
+
+def test_an_import_that_breaks_part_way_keeps_the_finished_batches(app, make_user):
+    first, second = make_user(), make_user()
+    # Past the reader's first 8 KiB, so the bad byte turns up after a batch has committed
+    body = HEADER + f"{first.username},1,CS101,4,A\n".encode()
+    body += b"".join(f"{second.username},1,CS{i:03d},4,B\n".encode() for i in range(400))
+    body += b"caf\xe9,2,CS999,4,B\n"
+
+    report = import_results(read_rows(io.BytesIO(body), "results.csv"), batch_size=1)
+    assert report.stopped.startswith("The file is not UTF-8 text (after line ")
+    assert report.results == 1
+    assert [(r.student_id, r.semester) for r in Result.query] == [(first.id, 1)]
+    assert Result.query.one().sgpa == 8.0  # grade A
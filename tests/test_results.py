@@ -0,0 +1,72 @@
+import pytest
+
+from website import results
+from website.models import db, Result
+from website.results import recompute_results
+
+
+def marksheet(*subjects):
+    return {"subjects": [{"code": code, "credits": credits, "grade": grade} for code, credits, grade in subjects]}
+
+
+def add_results(student, *semesters):
+    db.session.add_all([Result(student_id=student.id, semester=i, details=details)
+                        for i, details in enumerate(semesters, 1)])
+    db.session.commit()
+
+
+def grades(student):
+    return [(r.sgpa, r.cgpa) for r in Result.query.filter_by(student_id=student.id).order_by(Result.semester)]
+
+
+@pytest.fixture(params=["numpy", "loops"])
+def engine(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")  # the results extra
+    else:
+        monkeypatch.setattr(results, "np", None)
+    return request.param
+
+
+def test_sgpa_and_cgpa_match_the_hand_computed_figures(app, make_user, engine):
+    repeater, other = make_user(), make_user()
+    add_results(
+        repeater,
+        # Chemistry failed; the audit course carries no credits: (4*10 + 3*0) / 7
+        marksheet(("MA101", 4, "O"), ("CH101", 3, "F"), ("AU101", 0, "A")),
+        # Chemistry repeated, and both attempts count towards CGPA: (3*6 + 4*8) / 7, (40 + 50) / 14
+        marksheet(("CH101", 3, "C"), ("CS201", 4, "A")),
+        # Only a zero-credit seminar: no SGPA, CGPA unchanged
+        marksheet(("SE301", 0, "O")),
+    )
+    # Batched with the first student: running totals restart per student
+    add_results(other, marksheet(("MA101", 4, "E")))
+
+    assert recompute_results() == (4, 0)
+    db.session.commit()
+    assert grades(repeater) == [(5.71, 5.71), (7.14, 6.43), (None, 6.43)]
+    assert grades(other) == [(9.0, 9.0)]
+
+
+def test_a_changed_marksheet_moves_the_later_cgpas(app, make_user, engine):
+    student = make_user()
+    add_results(student, marksheet(("MA101", 4, "B")), marksheet(("PH101", 4, "A")))
+    recompute_results()
+    db.session.commit()
+    assert grades(student) == [(7.0, 7.0), (8.0, 7.5)]
+
+    first = Result.query.filter_by(student_id=student.id, semester=1).one()
+    first.details = marksheet(("MA101", 4, "O"))
+    db.session.commit()
+    # Only the two rows whose figures moved are written
+    assert recompute_results() == (2, 0)
+    db.session.commit()
+    assert grades(student) == [(10.0, 10.0), (8.0, 9.0)]
+
+
+def test_an_unreadable_marksheet_has_no_sgpa(app, make_user, engine):
+    student = make_user()
+    add_results(student, marksheet(("MA101", 4, "Z")), marksheet(("PH101", 4, "A")))
+    assert recompute_results() == (2, 1)
+    db.session.commit()
+    assert grades(student) == [(None, None), (8.0, 8.0)]
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+from website.models import db, Event
+from website.rsvp import REGISTERED, WAITLISTED, reconcile_counts, rsvp_status
+
+
+def add_event(poster, capacity):
+    start = datetime.now() + timedelta(days=7)
+    event = Event(title="Workshop", start_time=start, end_time=start + timedelta(hours=2),
+                  posted_by=poster.id, capacity=capacity)
+    db.session.add(event)
+    db.session.commit()
+    return event.id
+
+
+def rsvp(client, event_id):
+    response = client.post(f"/events/{event_id}/rsvp?format=json")
+    assert response.status_code == 200
+    return response.json
+
+
+def counts(event_id):
+    event = db.session.get(Event, event_id)
+    db.session.refresh(event)
+    return event.rsvp_count, event.waitlist_count
+
+
+def test_a_full_event_waitlists_instead_of_overselling(make_user, client_for):
+    event_id = add_event(make_user("teacher"), capacity=2)
+    students = [make_user() for _ in range(4)]
+    statuses = [rsvp(client_for(student), event_id)["status"] for student in students]
+    assert statuses == [REGISTERED, REGISTERED, WAITLISTED, WAITLISTED]
+    assert counts(event_id) == (2, 2)
+    assert [rsvp_status(event_id, student.id) for student in students[2:]] == [(WAITLISTED, 1), (WAITLISTED, 2)]
+
+
+def test_registering_again_changes_nothing(make_user, client_for):
+    event_id = add_event(make_user("teacher"), capacity=1)
+    first, second = client_for(make_user()), client_for(make_user())
+    rsvp(first, event_id)
+    rsvp(second, event_id)
+    # Again while there are seats in general, and while the event is full
+    assert rsvp(first, event_id)["seats"]["registered"] == 1
+    assert rsvp(second, event_id)["seats"]["waitlist"] == 1
+    assert counts(event_id) == (1, 1)
+
+
+def test_cancelling_promotes_the_head_of_the_waitlist(make_user, client_for):
+    event_id = add_event(make_user("teacher"), capacity=1)
+    holder, head, next_in_line = make_user(), make_user(), make_user()
+    for student in (holder, head, next_in_line):
+        rsvp(client_for(student), event_id)
+
+    response = client_for(holder).post(f"/events/{event_id}/cancel?format=json")
+    assert response.json["seats"] == {"capacity": 1, "registered": 1, "left": 0, "waitlist": 1}
+    assert rsvp_status(event_id, holder.id) == (None, None)
+    assert rsvp_status(event_id, head.id) == (REGISTERED, None)
+    assert rsvp_status(event_id, next_in_line.id) == (WAITLISTED, 1)
+
+
+def test_reconcile_recounts_drifted_events(make_user, client_for):
+    event_id = add_event(make_user("teacher"), capacity=1)
+    rsvp(client_for(make_user()), event_id)
+    rsvp(client_for(make_user()), event_id)
+    db.session.execute(db.update(Event).values(rsvp_count=5, waitlist_count=0))
+    db.session.commit()
+
+    assert reconcile_counts(dry_run=True) == 1
+    assert counts(event_id) == (5, 0)
+    assert reconcile_counts() == 1
+    assert counts(event_id) == (1, 1)
+    assert reconcile_counts() == 0
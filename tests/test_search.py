@@ -0,0 +1,44 @@
+from website.models import db, Comment, Post
+from website.search import rebuild_index
+
+
+def add_post(author, title, comments=()):
+    post = Post(author_id=author.id, title=title, content="...")
+    db.session.add(post)
+    db.session.flush()
+    db.session.add_all(Comment(post_id=post.id, author_id=author.id, content=text) for text in comments)
+    db.session.commit()
+    return post
+
+
+def found(client, q, kind):
+    return [hit["id"] for hit in client.get(f"/search?q={q}&kind={kind}&format=json").json]
+
+
+def test_comments_leave_the_results_with_their_post(make_user, client_for):
+    author = make_user()
+    client = client_for(author)
+    post = add_post(author, "Lost and found", ["Blue umbrella near the library"])
+    kept = add_post(author, "Lab notes", ["Umbrella stand by the lab"])
+    assert len(found(client, "umbrella", "comment")) == 2
+
+    assert client.post(f"/feed/delete_post/{post.id}").status_code == 302
+    assert found(client, "umbrella", "comment") == [kept.comments[0].id]
+    assert found(client, "library", "comment") == []
+
+    # Restoring the post brings its comments back
+    db.session.get(Post, post.id).is_deleted = False
+    db.session.commit()
+    assert len(found(client, "umbrella", "comment")) == 2
+
+
+def test_rebuild_skips_comments_of_deleted_posts(make_user, client_for):
+    author = make_user()
+    client = client_for(author)
+    post = add_post(author, "Lost and found", ["Blue umbrella near the library"])
+    # A bulk write skips the ORM hooks; the rebuild and the search both leave the comment out
+    db.session.execute(db.update(Post).where(Post.id == post.id).values(is_deleted=True))
+    db.session.commit()
+    assert found(client, "umbrella", "comment") == []
+    rebuild_index()
+    assert found(client, "umbrella", "comment") == []
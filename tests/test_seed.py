@@ -0,0 +1,47 @@
+from website.models import db, AttendanceSummary, Attendance, Post, Result, User
+from website.passwords import hasher
+from website.rsvp import reconcile_counts
+from website.seed import seed_campus
+from website.search import search
+
+
+def titles():
+    return db.session.scalars(db.select(Post.title).order_by(Post.id)).all()
+
+
+def test_a_seeded_campus_is_consistent(app):
+    counts = seed_campus(students=120, password="campus1", attendance_days=5)
+    assert counts["users"] == 120 + 3 + 2  # one teacher per 40 students, one class rep per 60
+    assert counts["users"] == User.query.filter(User.username != "admin").count()
+    assert counts["attendance"] == 120 * 5
+
+    # The derived data the app keeps on writes was rebuilt at the end
+    assert Post.reconcile_counters(dry_run=True) == 0
+    assert reconcile_counts(dry_run=True) == 0
+    assert db.session.scalar(db.select(db.func.sum(AttendanceSummary.total))) == Attendance.query.count()
+    assert Result.query.filter(Result.cgpa.is_(None)).count() == 0
+    with app.test_request_context():
+        assert search("exam", kinds=["post"])
+
+    student = User.query.filter_by(username="student00000").one()
+    assert (student.role, student.section_id is not None) == ("student", True)
+    assert hasher.verify(student.password_hash, "campus1")
+
+
+def test_the_same_seed_gives_the_same_rows(app_factory, tmp_path):
+    seeded = []
+    for name in ("first", "second"):
+        with app_factory(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / name}.db").app_context():
+            seed_campus(students=60, seed=7, attendance_days=1)
+            seeded.append(titles())
+    assert seeded[0] == seeded[1] and seeded[0]
+
+
+def test_the_command_refuses_to_seed_twice(app):
+    runner = app.test_cli_runner()
+    first = runner.invoke(args=["seed-campus", "--students", "60"])
+    assert first.exit_code == 0
+    assert "log in as student00000 / nexus123" in first.output
+    again = runner.invoke(args=["seed-campus", "--students", "60"])
+    assert again.exit_code == 1
+    assert "already been seeded" in again.output
@@ -0,0 +1,51 @@
+from flask import g
+
+from website.models import db, Post
+from website.socketio_events import like_counts, socketio
+
+
+def connect(app, client):
+    # The handshake runs in the test's app context, like requests do (see conftest.Client)
+    vars(g._get_current_object()).clear()
+    return socketio.test_client(app, flask_test_client=client)
+
+
+def received(socket, name):
+    return [message["args"][0] for message in socket.get_received() if message["name"] == name]
+
+
+def add_post(author):
+    post = Post(author_id=author.id, title="Hackathon teams", content="Looking for a designer")
+    db.session.add(post)
+    db.session.commit()
+    return post.id
+
+
+def test_like_counts_reach_only_the_posts_room_once_per_batch(app, make_user, client_for, monkeypatch):
+    monkeypatch.setattr(like_counts, "interval", 60)  # flushed by hand below
+    watched, other = add_post(make_user()), add_post(make_user())
+    viewer = connect(app, client_for(make_user()))
+    bystander = connect(app, client_for(make_user()))
+    viewer.emit("watch_posts", {"post_ids": [watched]})
+    bystander.emit("watch_posts", {"post_ids": [other]})
+    viewer.get_received(), bystander.get_received()
+
+    for count in (1, 2, 3):
+        like_counts.add(watched, count)
+    like_counts.flush()
+    assert [(m["post_id"], m["count"]) for m in received(viewer, "broadcast_like_post")] == [(watched, 3)]
+    assert received(bystander, "broadcast_like_post") == []
+
+
+def test_reports_go_to_moderators_only(app, make_user, client_for):
+    post_id = add_post(make_user())
+    admin = connect(app, client_for(make_user("admin")))
+    student_client = client_for(make_user())
+    student = connect(app, student_client)
+    student.emit("watch_posts", {"feed": True, "post_ids": [post_id]})
+    admin.get_received(), student.get_received()
+
+    student_client.post("/feed/report", data={"post_id": post_id, "reason": "spam"})
+    reports = received(admin, "broadcast_report_content")
+    assert [(r["post_id"], r["reason"]) for r in reports] == [(str(post_id), "spam")]
+    assert received(student, "broadcast_report_content") == []
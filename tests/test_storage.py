@@ -0,0 +1,94 @@
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from website.models import db, ChunkedUpload, StoredFile
+from website.storage import append_chunk, collect_garbage, local_path, release, save_stream, start_upload
+
+
+# Blobs go under the test's tmp_path; the signed-in clients talk to the same app
+@pytest.fixture
+def storage_app(app, tmp_path):
+    app.config["UPLOAD_ROOT"] = str(tmp_path / "blobs")
+    return app
+
+
+def store(body, filename):
+    url = save_stream(io.BytesIO(body), filename)
+    db.session.commit()
+    return url
+
+
+def blob(url):
+    return db.session.get(StoredFile, os.path.basename(url).split(".", 1)[0])
+
+
+def put(client, upload_id, start, body, size):
+    return client.put(f"/uploads/{upload_id}", data=body, headers={
+        "Content-Range": f"bytes {start}-{start + len(body) - 1}/{size}",
+    })
+
+
+def test_the_same_body_is_stored_once_and_counted(storage_app):
+    first, second = store(b"lecture notes", "week1.txt"), store(b"lecture notes", "copy.txt")
+    assert first == second
+    assert StoredFile.query.count() == 1
+    assert blob(first).ref_count == 2
+    release(first)
+    db.session.commit()
+    db.session.refresh(blob(first))
+    assert blob(first).ref_count == 1
+
+
+def test_a_stored_body_whose_file_went_missing_is_written_back(storage_app):
+    url = store(b"1,2,3", "marks.txt")
+    os.remove(local_path(url))
+    # Same body under another extension: the existing row's path is the one served
+    assert store(b"1,2,3", "marks.csv") == url
+    with open(local_path(url), "rb") as f:
+        assert f.read() == b"1,2,3"
+
+
+def test_chunks_must_arrive_in_order_and_can_be_resumed(storage_app, make_user, client_for):
+    client = client_for(make_user())
+    body = b"0123456789"
+    upload = client.post("/uploads", json={"filename": "slides.txt", "size": len(body)}).json
+
+    skipped = put(client, upload["id"], 4, body[4:], len(body))
+    assert (skipped.status_code, skipped.json["offset"]) == (409, 0)
+    assert put(client, upload["id"], 0, body[:4], len(body)).json["offset"] == 4
+    # The connection drops partway: Content-Range promises six bytes, three arrive
+    short = client.put(f"/uploads/{upload['id']}", data=body[4:7], headers={
+        "Content-Range": f"bytes 4-9/{len(body)}",
+    })
+    assert (short.status_code, short.json["offset"]) == (409, 4)
+
+    assert client.get(f"/uploads/{upload['id']}").json["offset"] == 4
+    done = put(client, upload["id"], 4, body[4:], len(body)).json
+    assert done["complete"]
+    stored = db.session.get(StoredFile, db.session.get(ChunkedUpload, upload["id"]).sha256)
+    with open(os.path.join(storage_app.config["UPLOAD_ROOT"], stored.path), "rb") as f:
+        assert f.read() == body
+
+
+def test_garbage_collection_keeps_what_is_referenced_or_pending(storage_app, make_user):
+    user = make_user()
+    kept, dropped = store(b"kept", "kept.txt"), store(b"dropped", "dropped.txt")
+    release(dropped)
+    abandoned = start_upload(user.id, "half.txt", 100)
+    finished = start_upload(user.id, "done.txt", 4)
+    append_chunk(finished, 0, io.BytesIO(b"done"), 4)
+    db.session.commit()
+    # Everything but the finished upload, waiting to be attached to a form, is past the grace period
+    long_ago = datetime.utcnow() - timedelta(days=2)
+    db.session.execute(db.update(StoredFile).values(created_at=long_ago))
+    db.session.execute(db.update(ChunkedUpload).where(ChunkedUpload.id == abandoned.id).values(created_at=long_ago))
+    db.session.commit()
+
+    assert collect_garbage(grace=timedelta(days=1)) == 2
+    assert blob(kept) is not None and os.path.exists(local_path(kept))
+    assert blob(dropped) is None and not os.path.exists(local_path(dropped))
+    assert db.session.get(ChunkedUpload, abandoned.id) is None
+    assert db.session.get(StoredFile, finished.sha256) is not None
@@ -0,0 +1,18 @@
+from datetime import datetime, timedelta
+
+from website.models import db, Job
+from website.tasks import TaskRunner
+
+
+def test_idle_workers_sweep_abandoned_jobs_once_per_lease(app, writes_during):
+    runner = TaskRunner()
+    runner.init_app(app, spawn=None)
+    abandoned = Job(name="media.variants", payload={}, status="running", attempts=1, max_attempts=1,
+                    locked_by="gone:1", locked_at=datetime.utcnow() - timedelta(hours=1))
+    db.session.add(abandoned)
+    db.session.commit()
+
+    assert len(writes_during(lambda: runner.work("test:0", burst=True))) == 1
+    assert db.session.get(Job, abandoned.id).status == "failed"
+    # Polling again within the lease neither sweeps nor writes
+    assert writes_during(lambda: runner.work("test:0", burst=True)) == []
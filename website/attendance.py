@@ -0,0 +1,317 @@
+import math
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from website.dashboard import record_attendance
+from website.database import begin_write
+from website.models import (
+    db, dialect_insert, Attendance, AttendanceSummary, StudentDashboard, User, STUDENT_ROLES,
+)
+
+# Attendance marking and running aggregates.
+#
+# A teacher marks a whole class for one date and subject in a single batched
+# upsert (mark_attendance). Every write, bulk or through the ORM, turns into
+# (total, attended) deltas per student and subject, which are added to
+# attendance_summaries and to the dashboard's overall totals in the same
+# transaction. Views read percentages and shortfalls from the summaries
+# instead of counting the attendance history.
+#
+# Marking reads the class's previous marks to work out those deltas, so it
+# first takes a lock that concurrent marks of the same class wait on (the
+# write lock on SQLite, an advisory lock per class on PostgreSQL); otherwise
+# two teachers marking at once could both count a student's first mark.
+#
+#     flask attendance-reconcile      rebuild the summaries from the rows
+
+STATUSES = ("present", "absent", "late")
+ATTENDED = ("present", "late")
+MAX_RECORDS = 500
+
+
+class AttendanceError(ValueError):
+    pass
+
+
+def attendance_stats(total, attended, minimum=75):
+    """Percentage plus how many classes must be attended in a row to reach
+    ``minimum`` percent, or how many can be missed while staying at it."""
+    share = minimum / 100
+    percent = round(attended * 100 / total, 1) if total else None
+    needed = can_miss = 0
+    if total and attended < share * total:
+        needed = math.ceil((share * total - attended) / (1 - share)) if share < 1 else None
+    elif share:
+        can_miss = math.floor(attended / share - total + 1e-9)
+    return {
+        "total": total,
+        "attended": attended,
+        "percent": percent,
+        "short": needed != 0,
+        "needed": needed,
+        "can_miss": can_miss,
+    }
+
+
+# --- Aggregates ---
+
+def apply_deltas(conn, deltas):
+    """Add ``{(student_id, subject): (total delta, attended delta)}`` to the summaries and dashboards."""
+    rows = [
+        {"student_id": student_id, "subject": subject, "total": total, "attended": attended,
+         "updated_at": datetime.utcnow()}
+        for (student_id, subject), (total, attended) in deltas.items() if total or attended
+    ]
+    if not rows:
+        return
+    table = AttendanceSummary.__table__
+    stmt = dialect_insert(table)
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["student_id", "subject"],
+            set_={
+                "total": table.c.total + stmt.excluded.total,
+                "attended": table.c.attended + stmt.excluded.attended,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ),
+        rows,
+    )
+    overall = defaultdict(lambda: (0, 0))
+    for row in rows:
+        total, attended = overall[row["student_id"]]
+        overall[row["student_id"]] = (total + row["total"], attended + row["attended"])
+    record_attendance(conn, overall)
+
+
+def _add(deltas, student_id, subject, status, sign):
+    total, attended = deltas[student_id, subject]
+    deltas[student_id, subject] = (total + sign, attended + (sign if status in ATTENDED else 0))
+
+
+def rebuild_summaries(commit=True):
+    """Recount every summary and dashboard total from the attendance rows; returns summary rows.
+
+    Migration 8 passes ``commit=False`` so the rebuild commits with it.
+    """
+    summaries = AttendanceSummary.__table__
+    dashboards = StudentDashboard.__table__
+    attended = db.func.sum(db.case((Attendance.status.in_(ATTENDED), 1), else_=0))
+    db.session.execute(db.delete(summaries))
+    db.session.execute(
+        summaries.insert().from_select(
+            ["student_id", "subject", "total", "attended", "updated_at"],
+            db.select(
+                Attendance.student_id, Attendance.subject, db.func.count(), attended,
+                db.literal(datetime.utcnow(), db.DateTime),
+            ).group_by(Attendance.student_id, Attendance.subject),
+        )
+    )
+
+    def overall(column):
+        return db.func.coalesce(
+            db.select(db.func.sum(column))
+            .where(summaries.c.student_id == dashboards.c.student_id)
+            .scalar_subquery(),
+            0,
+        )
+
+    db.session.execute(
+        db.update(dashboards).values(
+            attendance_total=overall(summaries.c.total),
+            attendance_attended=overall(summaries.c.attended),
+        )
+    )
+    if commit:
+        db.session.commit()
+    return db.session.scalar(db.select(db.func.count()).select_from(summaries))
+
+
+# --- Marking ---
+
+def _key(record):
+    if record.get("student_id") is not None:
+        try:
+            return int(record["student_id"])
+        except (TypeError, ValueError):
+            return None
+    return record.get("username")
+
+
+def _students(keys):
+    """Resolve student ids / usernames to student ids in one query."""
+    ids = {key for key in keys if isinstance(key, int)}
+    names = {key for key in keys if isinstance(key, str)}
+    found = {}
+    if ids or names:
+        query = db.select(User.id, User.username).where(
+            User.role.in_(STUDENT_ROLES), db.or_(User.id.in_(ids), User.username.in_(names))
+        )
+        for user_id, username in db.session.execute(query):
+            found[user_id] = user_id
+            found[username] = user_id
+    return found
+
+
+def previous_marks_query(day, subject, student_ids):
+    return (
+        db.select(Attendance.student_id, Attendance.status)
+        .where(Attendance.date == day, Attendance.subject == subject, Attendance.student_id.in_(student_ids))
+    )
+
+
+def _lock_class(day, subject):
+    """Serialize marking of one class until the transaction ends."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        # Row locks would miss students marked for the first time by both
+        db.session.execute(db.select(db.func.pg_advisory_xact_lock(
+            db.func.hashtext(f"attendance:{day.isoformat()}:{subject}")
+        )))
+    else:
+        begin_write()
+
+
+def mark_attendance(day, subject, records, marked_by):
+    """Mark one class: ``records`` is a list of ``{"student_id" or "username", "status"}``.
+
+    Either every record is valid and all are written, or AttendanceError
+    carries the list of problems and nothing is. Returns (created, changed,
+    unchanged). The caller commits.
+    """
+    subject = subject.strip() if isinstance(subject, str) else subject
+    errors = []
+    if not subject:
+        errors.append("A subject is required.")
+    elif not isinstance(subject, str):
+        errors.append("subject must be a string.")
+    if not records:
+        errors.append("No attendance records given.")
+    elif len(records) > MAX_RECORDS:
+        errors.append(f"At most {MAX_RECORDS} records per request.")
+    if errors:
+        raise AttendanceError(errors)
+
+    if not all(isinstance(record, dict) for record in records):
+        raise AttendanceError(["Each record must be an object."])
+    keys = [_key(record) for record in records]
+    found = _students(keys)
+    statuses = {}
+    for i, (record, key) in enumerate(zip(records, keys)):
+        status = str(record.get("status", "")).lower()
+        if status not in STATUSES:
+            errors.append(f"Record {i}: status must be one of {', '.join(STATUSES)}.")
+        elif key not in found:
+            errors.append(f"Record {i}: unknown student {key!r}.")
+        elif found[key] in statuses:
+            errors.append(f"Record {i}: student {key!r} appears twice.")
+        else:
+            statuses[found[key]] = status
+    if errors:
+        raise AttendanceError(errors)
+
+    # Previous marks for this class decide the deltas, so nobody may change them until we commit
+    _lock_class(day, subject)
+    existing = dict(db.session.execute(previous_marks_query(day, subject, sorted(statuses))).all())
+
+    now = datetime.utcnow()
+    table = Attendance.__table__
+    stmt = dialect_insert(table)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["student_id", "date", "subject"],
+            set_={"status": stmt.excluded.status, "marked_by": stmt.excluded.marked_by,
+                  "marked_at": stmt.excluded.marked_at},
+        ),
+        [
+            {"student_id": student_id, "date": day, "subject": subject, "status": status,
+             "marked_by": marked_by, "marked_at": now}
+            for student_id, status in statuses.items()
+        ],
+    )
+
+    deltas = defaultdict(lambda: (0, 0))
+    created = changed = 0
+    for student_id, status in statuses.items():
+        old = existing.get(student_id)
+        if old == status:
+            continue
+        if old is None:
+            created += 1
+        else:
+            changed += 1
+            _add(deltas, student_id, subject, old, -1)
+        _add(deltas, student_id, subject, status, 1)
+    apply_deltas(db.session.connection(), deltas)
+    return created, changed, len(statuses) - created - changed
+
+
+# --- Reading ---
+
+def student_summary_query(student_id):
+    return (
+        AttendanceSummary.query.filter(AttendanceSummary.student_id == student_id, AttendanceSummary.total > 0)
+        .order_by(AttendanceSummary.subject)
+    )
+
+
+def class_summary_query(subject):
+    return (
+        db.select(AttendanceSummary, User.name, User.username)
+        .join(User, User.id == AttendanceSummary.student_id)
+        .where(AttendanceSummary.subject == subject, AttendanceSummary.total > 0)
+        .order_by(User.username)
+    )
+
+
+def student_summary(student_id, minimum=75):
+    """Per-subject stats for one student, plus the overall figure."""
+    rows = student_summary_query(student_id)
+    subjects, total, attended = [], 0, 0
+    for row in rows:
+        subjects.append(dict(attendance_stats(row.total, row.attended, minimum), subject=row.subject or "General"))
+        total += row.total
+        attended += row.attended
+    return {"overall": attendance_stats(total, attended, minimum), "subjects": subjects}
+
+
+def class_summary(subject, minimum=75, short_only=False):
+    """Stats for every student with attendance in ``subject``."""
+    rows = db.session.execute(class_summary_query(subject))
+    students = []
+    for summary, name, username in rows:
+        stats = attendance_stats(summary.total, summary.attended, minimum)
+        if stats["short"] or not short_only:
+            students.append(dict(stats, student_id=summary.student_id, name=name, username=username))
+    return students
+
+
+# --- ORM writes (single rows edited through the session) ---
+
+def _sync_summaries(session, flush_context):
+    deltas = defaultdict(lambda: (0, 0))
+    for obj in session.new:
+        if isinstance(obj, Attendance):
+            _add(deltas, obj.student_id, obj.subject or "", obj.status, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Attendance):
+            _add(deltas, obj.student_id, obj.subject or "", obj.status, -1)
+    for obj in session.dirty:
+        if not isinstance(obj, Attendance):
+            continue
+        attrs = inspect(obj).attrs
+        if not any(attrs[name].history.has_changes() for name in ("student_id", "subject", "status")):
+            continue
+        old = {name: (attrs[name].history.deleted or [getattr(obj, name)])[0]
+               for name in ("student_id", "subject", "status")}
+        _add(deltas, old["student_id"], old["subject"] or "", old["status"], -1)
+        _add(deltas, obj.student_id, obj.subject or "", obj.status, 1)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def init_attendance():
+    if not event.contains(Session, "after_flush", _sync_summaries):
+        event.listen(Session, "after_flush", _sync_summaries)
@@ -1,7 +1,77 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, request, jsonify, abort, make_response
+from flask_login import login_required, current_user
+
+from website.result_import import ImportFormatError, import_results, read_rows
+from website.socketio_events import socketio, MODERATORS_ROOM
+from website.metrics import registry, scrape_allowed
+from website.models import db
+from website.timetable import TimetableError, set_section_timetable
 
 admin_bp = Blueprint('admin', __name__)
 
+
+# Helper: only admins past this point
+def require_admin():
+    if current_user.role != 'admin':
+        abort(403)
+
+
 @admin_bp.route('/')
 def admin_home():
     return render_template('admin/admin.html')
+
+
+# Prometheus scrape target: admins, or METRICS_TOKEN as a bearer token
+@admin_bp.route('/metrics')
+def metrics():
+    if not scrape_allowed():
+        abort(403)
+    response = make_response(registry.render())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+# Bulk-import published results; progress goes to admins' sockets per batch
+# and SGPA/CGPA are recomputed by a task worker after each one
+@admin_bp.route('/results/import', methods=['GET', 'POST'])
+@login_required
+def results_import():
+    require_admin()
+    if request.method == 'GET':
+        return render_template('admin/results_import.html', report=None)
+
+    def progress(report):
+        socketio.emit('results_import_progress', {'rows': report.rows, 'results': report.results}, to=MODERATORS_ROOM)
+
+    file = request.files.get('file')
+    try:
+        if not file or not file.filename:
+            raise ImportFormatError('Choose a .csv or .xlsx file to import.')
+        report = import_results(read_rows(file.stream, file.filename), progress=progress, defer=True)
+    except ImportFormatError as e:
+        if request.args.get('format') == 'json':
+            return jsonify({'error': str(e)}), 400
+        return render_template('admin/results_import.html', report=None, error=str(e)), 400
+    if request.args.get('format') == 'json':
+        return jsonify(report.as_dict())
+    return render_template('admin/results_import.html', report=report)
+
+
+# Create or update a section: {"periods": [{"day": "Mon", "start": "09:00", "end": "09:50",
+# "subject": "Physics", "period": "1", "location": "LH-2"}, ...], "students": [ids or usernames]}
+# Either key may be left out to keep what the section has.
+@admin_bp.route('/sections/<name>', methods=['PUT'])
+@login_required
+def section_update(name):
+    require_admin()
+    data = request.get_json(silent=True) or {}
+    periods, students = data.get('periods'), data.get('students')
+    if not isinstance(periods, (list, type(None))) or not isinstance(students, (list, type(None))):
+        return jsonify({'errors': ['periods and students must be lists.']}), 400
+    try:
+        section = set_section_timetable(name, periods, students)
+    except TimetableError as e:
+        return jsonify({'errors': e.args[0]}), 400
+    db.session.commit()
+    return jsonify({'section': section.name, 'periods': len(section.periods), 'students': len(section.students)})
@@ -1,26 +1,107 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, send_from_directory
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload, selectinload
 
 from website.models import db, Announcement, User
-
-import os
+from website.search import matching_ids
+from website.cache import cached_page, make_key
+from website.media import prefetch_media
+from website.notifications import changes_since, is_behind, mark_read, unread_count
+from website.pagination import clamp_page_size
+from website.storage import UploadError, file_from_request, release
+from website.query_budget import query_budget
 
 def is_poster():
     return current_user.role in ["teacher", "admin", "cr"]
 
 announcements_bp = Blueprint("announcements", __name__)
 
+# Helper: announcements, pinned first then newest, optionally one category or matching ?q
+def announcements_query(category=None, q=None):
+    query = Announcement.query.options(joinedload(Announcement.poster), selectinload(Announcement.tags))
+    if category:
+        query = query.filter_by(category=category)
+    if q:
+        query = query.filter(Announcement.id.in_(matching_ids("announcement", q)))
+    return query.order_by(Announcement.is_pinned.desc(), Announcement.posted_at.desc())
+
+# Helper: JSON shape of an announcement in the sync API
+def serialize_announcement(announcement):
+    return {
+        "id": announcement.id,
+        "title": announcement.title,
+        "content": announcement.content,
+        "category": announcement.category,
+        "pinned": bool(announcement.is_pinned),
+        "file_url": announcement.file_url,
+        "tags": [tag.name for tag in announcement.tags],
+        "posted_by": announcement.poster.name,
+        "posted_at": announcement.posted_at.isoformat() if announcement.posted_at else None,
+    }
+
 @announcements_bp.route("/announcements")
 @login_required
+@query_budget(6)
 def announcement_list():
     category = request.args.get("category")
-    query = Announcement.query
+    q = request.args.get("q")
 
-    if category:
-        query = query.filter_by(category=category)
-    
-    announcements = query.order_by(Announcement.is_pinned.desc(), Announcement.posted_at.desc()).all()
-    return render_template("announcements/announcement_list.html", announcements=announcements)
+    def render():
+        announcements = announcements_query(category, q).all()
+        prefetch_media(announcement.file_url for announcement in announcements)
+        return render_template(
+            "announcements/announcement_list.html", announcements=announcements, category=category, q=q,
+        )
+
+    # Posters see edit controls on their own announcements, so they get their own entry
+    viewer = f"user:{current_user.id}" if is_poster() else f"role:{current_user.role}"
+    response = cached_page("announcements", make_key(category, q, viewer), render)
+    # Only the full list counts as read, and only a reader who is behind costs a write
+    if not category and not q and is_behind(current_user.id):
+        mark_read(current_user.id)
+        db.session.commit()
+    return response
+
+# Delta sync for clients that keep their own copy: announcements created or
+# edited and ids deleted after change ?cursor (0 for everything), a page at a
+# time; pass the returned cursor back while has_more is set, and start over
+# from 0 on reset
+@announcements_bp.route("/announcements/since")
+@login_required
+@query_budget(6)
+def announcement_since():
+    cursor = request.args.get("cursor", "0")
+    if not cursor.isdigit():
+        return jsonify({"error": "cursor must be a change number"}), 400
+    limit = clamp_page_size(
+        request.args.get("limit"),
+        current_app.config.get("ANNOUNCEMENTS_SYNC_PAGE_SIZE", 50),
+        current_app.config.get("ANNOUNCEMENTS_SYNC_MAX_PAGE_SIZE", 200),
+    )
+    delta = changes_since(int(cursor), limit)
+    response = jsonify({
+        "changed": [serialize_announcement(a) for a in delta.changed],
+        "deleted": delta.deleted,
+        "cursor": delta.cursor,
+        "has_more": delta.more,
+        "reset": delta.reset,
+        "unread": unread_count(current_user.id),
+    })
+    response.add_etag()
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
+
+# Mark announcements read up to ?cursor (default: all); returns the unread count left
+@announcements_bp.route("/announcements/read", methods=["POST"])
+@login_required
+@query_budget(4)
+def announcement_read():
+    cursor = request.values.get("cursor")
+    if cursor is not None and not cursor.isdigit():
+        return jsonify({"error": "cursor must be a change number"}), 400
+    mark_read(current_user.id, None if cursor is None else int(cursor))
+    db.session.commit()
+    return jsonify({"unread": unread_count(current_user.id)})
 
 @announcements_bp.route("/announcements/create", methods=["GET", "POST"])
 @login_required
@@ -44,13 +125,12 @@ def announcement_create():
                 tag = Tag(name=tag_name)
                 db.session.add(tag)
             tags.append(tag)
-        file = request.files.get("file")
-        file_url = None
-        if file and file.filename:
-            upload_folder = os.path.join(current_app.root_path, "static", "announcement_files")
-            os.makedirs(upload_folder, exist_ok=True)
-            file.save(os.path.join(upload_folder, file.filename))
-            file_url = f"/static/announcement_files/{file.filename}"
+        try:
+            file_url = file_from_request(request)
+        except UploadError as e:
+            db.session.rollback()
+            flash(str(e), "error")
+            return redirect(request.url)
         announcement = Announcement(
             title=title,
             content=content,
@@ -91,12 +171,15 @@ def announcement_edit(announcement_id):
                 db.session.add(tag)
             tags.append(tag)
         announcement.tags = tags
-        file = request.files.get("file")
-        if file and file.filename:
-            upload_folder = os.path.join(current_app.root_path, "static", "announcement_files")
-            os.makedirs(upload_folder, exist_ok=True)
-            file.save(os.path.join(upload_folder, file.filename))
-            announcement.file_url = f"/static/announcement_files/{file.filename}"
+        try:
+            file_url = file_from_request(request)
+        except UploadError as e:
+            db.session.rollback()
+            flash(str(e), "error")
+            return redirect(request.url)
+        if file_url:
+            release(announcement.file_url)
+            announcement.file_url = file_url
         db.session.commit()
         flash("Announcement updated!", "success")
         return redirect(url_for("announcements.announcement_list"))
@@ -112,6 +195,7 @@ def announcement_delete(announcement_id):
         flash("You do not have permission to delete this announcement.", "error")
         return redirect(url_for("announcements.announcement_list"))
     
+    release(announcement.file_url)
     db.session.delete(announcement)
     db.session.commit()
     
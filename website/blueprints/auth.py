@@ -1,27 +1,41 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, login_required
 from sqlalchemy import or_
 
 from website.models import db, User
+from website.passwords import hasher, HasherBusy
 
 auth_bp = Blueprint("auth", __name__)
 
 
+def login_query(username_or_email):
+    return User.query.filter(
+        or_(
+            User.username == username_or_email,
+            User.email == username_or_email
+        )
+    )
+
+
 @auth_bp.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         username_or_email = request.form["username"]
         password = request.form["password"]
 
-        user = User.query.filter(
-            or_(
-                User.username == username_or_email,
-                User.email == username_or_email
-            )
-        ).first()
+        user = login_query(username_or_email).first()
+
+        try:
+            verified = user is not None and hasher.verify(user.password_hash, password)
+            # Upgrade hashes made with an older method or work factor
+            if verified and hasher.needs_rehash(user.password_hash):
+                user.password_hash = hasher.hash(password)
+                db.session.commit()
+        except HasherBusy:
+            flash("Too many sign-ins right now, please try again in a moment.", "error")
+            return render_template("auth/login.html"), 503, {"Retry-After": "2"}
 
-        if user and check_password_hash(user.password_hash, password):
+        if verified:
             login_user(user)
             flash("Login Successful!", "success")
 
@@ -57,7 +71,11 @@ def register():
         if existing_email:
             flash("Email Already Exists", "error")
             return render_template("auth/register.html")
-        hashed_password = generate_password_hash(password)
+        try:
+            hashed_password = hasher.hash(password)
+        except HasherBusy:
+            flash("Too many sign-ins right now, please try again in a moment.", "error")
+            return render_template("auth/register.html"), 503, {"Retry-After": "2"}
         new_user = User(
             username=username,
             name=name,
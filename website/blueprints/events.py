@@ -1,22 +1,151 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, current_app
 from flask_login import login_required, current_user
-from website.models import db, Event, event_rsvps, User
-import os
-from datetime import datetime
+from website.models import db, Event, User
+from website.cache import cached_page, make_key
+from website.pagination import clamp_page_size, keyset_filter, fetch_page
+from website.ical import (
+    calendar_token, category_feed, feed_response, personal_feed, reset_calendar_token, user_from_token,
+)
+from website.storage import UploadError, file_from_request
+from website.media import prefetch_media
+from website.query_budget import query_budget
+from website.rsvp import REGISTERED, WAITLISTED, cancel, register, rsvp_status, seats
+from website.socketio_events import seat_counts
+from werkzeug.utils import secure_filename
+from datetime import datetime, timedelta
 
 def is_event_poster():
     return current_user.role in ["teacher", "admin", "cr"]
 
 events_bp = Blueprint("events", __name__)
 
+# Helper: events starting in [start, end), keyset-paginated on (start_time, id)
+def events_query(start=None, end=None, category=None, cursor=None, descending=False):
+    query = Event.query
+    if start is not None:
+        query = query.filter(Event.start_time >= start)
+    if end is not None:
+        query = query.filter(Event.start_time < end)
+    if category:
+        query = query.filter(Event.category == category)
+    query = keyset_filter(query, Event.start_time, Event.id, cursor, descending)
+    if descending:
+        return query.order_by(Event.start_time.desc(), Event.id.desc())
+    return query.order_by(Event.start_time, Event.id)
+
+# Helper: page size from ?per_page within the configured bounds
+def page_size():
+    return clamp_page_size(
+        request.args.get("per_page"),
+        current_app.config.get("EVENTS_PAGE_SIZE", 12),
+        current_app.config.get("EVENTS_MAX_PAGE_SIZE", 100),
+    )
+
+# Helper: JSON shape of an event in the API
+def serialize_event(event):
+    return {
+        "id": event.id,
+        "title": event.title,
+        "start": event.start_time.isoformat(),
+        "end": event.end_time.isoformat(),
+        "location": event.location,
+        "category": event.category,
+        "capacity": event.capacity,
+        "registered": event.rsvp_count,
+        "url": url_for("events.event_details", event_id=event.id),
+    }
+
+# Upcoming events in the next EVENTS_WINDOW_DAYS, and past events a page at a time (?before=cursor)
 @events_bp.route("/events")
 @login_required
+@query_budget(5)
 def event_list():
-    # Filtering and search logic will be added later
+    before = request.args.get("before")
+    q = request.args.get("q", "")
+    kind = request.args.get("type")
+
+    def render():
+        now = datetime.now()
+        window = timedelta(days=current_app.config.get("EVENTS_WINDOW_DAYS", 60))
+        size = current_app.config.get("EVENTS_PAGE_SIZE", 12)
+        try:
+            past_events, next_before = fetch_page(
+                events_query(end=now, cursor=before, descending=True), size, lambda e: (e.start_time, e.id)
+            )
+        except ValueError:
+            abort(400)
+        upcoming_events = [] if before else events_query(start=now, end=now + window).limit(current_app.config.get("EVENTS_UPCOMING_MAX", 50)).all()
+        prefetch_media(event.file_url for event in upcoming_events + past_events)
+        return render_template(
+            "events/events.html", upcoming_events=upcoming_events, past_events=past_events,
+            next_before=next_before, window_days=window.days, before=before, q=q, kind=kind,
+        )
+
+    # Short TTL: the upcoming/past split moves with the clock. The template
+    # echoes only what it is given here, and all of that is in the key
+    return cached_page("events", make_key(current_user.role, before, q, kind), render, ttl=60)
+
+# Events starting between ?start and ?end (ISO dates, default: the next
+# EVENTS_WINDOW_DAYS), optionally one ?category; ?past=1 pages backwards from now
+@events_bp.route("/events/api/events")
+@login_required
+@query_budget(3)
+def events_api():
     now = datetime.now()
-    upcoming_events = Event.query.filter(Event.start_time >= now).order_by(Event.start_time).all()
-    past_events = Event.query.filter(Event.start_time < now).order_by(Event.start_time.desc()).all()
-    return render_template("events/events.html", upcoming_events=upcoming_events, past_events=past_events)
+    max_window = timedelta(days=current_app.config.get("EVENTS_MAX_WINDOW_DAYS", 366))
+    try:
+        if request.args.get("past"):
+            query = events_query(end=now, category=request.args.get("category"),
+                                 cursor=request.args.get("cursor"), descending=True)
+        else:
+            start = datetime.fromisoformat(request.args["start"]) if request.args.get("start") else now
+            end = (datetime.fromisoformat(request.args["end"]) if request.args.get("end")
+                   else start + timedelta(days=current_app.config.get("EVENTS_WINDOW_DAYS", 60)))
+            if not start < end <= start + max_window:
+                return jsonify({"error": f"end must be after start, at most {max_window.days} days on"}), 400
+            query = events_query(start, end, request.args.get("category"), request.args.get("cursor"))
+        events, next_cursor = fetch_page(query, page_size(), lambda e: (e.start_time, e.id))
+    except ValueError:
+        return jsonify({"error": "invalid date or cursor"}), 400
+    response = jsonify({"events": [serialize_event(e) for e in events], "next_cursor": next_cursor})
+    response.add_etag()
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
+
+# Helper: the user a calendar feed URL was issued to
+def feed_user(token):
+    user = user_from_token(token)
+    if user is None:
+        abort(404)
+    return user
+
+# iCalendar feeds for calendar apps; the signed token stands in for the session (see website/ical.py)
+@events_bp.route("/events/calendar/<token>/mine.ics")
+@query_budget(3)
+def calendar_mine(token):
+    return feed_response(personal_feed(feed_user(token)), "my-events.ics")
+
+# Revoke the user's calendar feed URLs (say one was shared by mistake); the event page shows the new ones
+@events_bp.route("/events/calendar/reset", methods=["POST"])
+@login_required
+def calendar_reset():
+    reset_calendar_token(current_user.id)
+    db.session.commit()
+    flash("Your calendar links were reset. Subscribe again with the new ones.", "success")
+    event_id = request.form.get("event_id", type=int)
+    return redirect(url_for("events.event_details", event_id=event_id) if event_id else url_for("events.event_list"))
+
+@events_bp.route("/events/calendar/<token>/all.ics")
+@query_budget(3)
+def calendar_all(token):
+    feed_user(token)
+    return feed_response(category_feed(), "events.ics")
+
+@events_bp.route("/events/calendar/<token>/category/<category>.ics")
+@query_budget(3)
+def calendar_category(token, category):
+    feed_user(token)
+    return feed_response(category_feed(category), f"events-{secure_filename(category) or 'category'}.ics")
 
 @events_bp.route("/events/create", methods=["GET", "POST"])
 @login_required
@@ -32,13 +161,15 @@ def event_create():
         location = request.form.get("location")
         registration_link = request.form.get("registration_link")
         category = request.form.get("category")
-        file = request.files.get("file")
-        file_url = None
-        if file and file.filename:
-            upload_folder = os.path.join(current_app.root_path, "static", "event_files")
-            os.makedirs(upload_folder, exist_ok=True)
-            file.save(os.path.join(upload_folder, file.filename))
-            file_url = f"/static/event_files/{file.filename}"
+        capacity = request.form.get("capacity", type=int)
+        if request.form.get("capacity") and not (capacity and capacity > 0):
+            flash("Capacity must be a whole number of seats.", "error")
+            return redirect(request.url)
+        try:
+            file_url = file_from_request(request)
+        except UploadError as e:
+            flash(str(e), "error")
+            return redirect(request.url)
         event = Event(
             title=title,
             description=description,
@@ -47,6 +178,7 @@ def event_create():
             location=location,
             registration_link=registration_link,
             category=category,
+            capacity=capacity,
             file_url=file_url,
             posted_by=current_user.id
         )
@@ -58,22 +190,50 @@ def event_create():
 
 @events_bp.route("/events/<int:event_id>")
 @login_required
+@query_budget(6)
 def event_details(event_id):
     event = Event.query.get_or_404(event_id)
     poster = User.query.get(event.posted_by)
-    is_registered = False
-    if current_user.is_authenticated:
-        is_registered = event in current_user.events_rsvped
-    return render_template("events/event_details.html", event=event, poster=poster, is_registered=is_registered)
+    status, position = rsvp_status(event.id, current_user.id)
+    prefetch_media([event.file_url])
+    return render_template(
+        "events/event_details.html", event=event, poster=poster, seats=seats(event),
+        is_registered=status == REGISTERED, is_waitlisted=status == WAITLISTED, position=position,
+        calendar_token=calendar_token(current_user),
+    )
+
+# Helper: answer an RSVP change as JSON (?format=json) or with a flash and redirect
+def rsvp_response(event, status, message, category):
+    if request.args.get("format") == "json":
+        return jsonify({"status": status, "seats": seats(event)})
+    flash(message, category)
+    return redirect(url_for("events.event_details", event_id=event.id))
 
+# Register, or join the waitlist when the event is full
 @events_bp.route("/events/<int:event_id>/rsvp", methods=["POST"])
 @login_required
+@query_budget(7)
 def event_rsvp(event_id):
     event = Event.query.get_or_404(event_id)
-    if event in current_user.events_rsvped:
-        flash("You have already registered for this event.", "info")
-    else:
-        current_user.events_rsvped.append(event)
-        db.session.commit()
-        flash("RSVP successful!", "success")
-    return redirect(url_for("events.event_details", event_id=event_id))
+    status, changed = register(event, current_user.id)
+    db.session.commit()
+    seat_counts.add(event.id, seats(event))
+    if status == WAITLISTED:
+        message = "The event is full; you are on the waitlist." if changed else "You are already on the waitlist."
+        return rsvp_response(event, status, message, "info")
+    if not changed:
+        return rsvp_response(event, status, "You have already registered for this event.", "info")
+    return rsvp_response(event, status, "RSVP successful!", "success")
+
+# Give up a seat (the next waitlisted user gets it) or a waitlist place
+@events_bp.route("/events/<int:event_id>/cancel", methods=["POST"])
+@login_required
+def event_cancel(event_id):
+    event = Event.query.get_or_404(event_id)
+    previous = cancel(event, current_user.id)
+    db.session.commit()
+    if previous is None:
+        return rsvp_response(event, None, "You were not registered for this event.", "info")
+    seat_counts.add(event.id, seats(event))
+    message = "Registration cancelled." if previous == REGISTERED else "You have left the waitlist."
+    return rsvp_response(event, None, message, "info")
@@ -1,33 +1,108 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, current_app
 from flask_login import login_required, current_user
 from website.models import db, Post, Tag, Comment, Like, Report
-from werkzeug.utils import secure_filename
+from website.pagination import clamp_page_size, keyset_filter, fetch_page
+from website.search import matching_ids
+from website.cache import cache
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime
-import os
-from website.socketio_events import socketio
+from website.storage import save_stream
+from website.media import prefetch_media
+from website.socketio_events import emit_after_commit, like_counts, post_room, FEED_ROOM, MODERATORS_ROOM
+from website.query_budget import query_budget
 
 feed_bp = Blueprint('feed', __name__, template_folder='../templates/feed')
 
-UPLOAD_FOLDER = 'static/uploads/'
-
 # Helper: allowed file extensions
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'docx'}
 
+# Helper: all tags as plain dicts, cached until a tag is written
+def all_tags():
+    return cache.get_or_set('tags', 'all', lambda: [{'id': t.id, 'name': t.name} for t in Tag.query.order_by(Tag.name)])
+
+# Helper: live feed posts after a cursor, newest first
+def feed_query(tag=None, search=None, cursor=None):
+    query = (
+        Post.query
+        .options(joinedload(Post.author), selectinload(Post.tags))
+        .filter(Post.is_deleted == False)
+    )
+    if tag:
+        query = query.join(Post.tags).filter(Tag.name == tag)
+    if search:
+        query = query.filter(Post.id.in_(matching_ids('post', search)))
+    query = keyset_filter(query, Post.created_at, Post.id, cursor)
+    return query.order_by(Post.created_at.desc(), Post.id.desc())
+
+# Helper: a post's live comments, oldest first
+def comments_query(post_id):
+    return (
+        Comment.query.options(joinedload(Comment.author))
+        .filter_by(post_id=post_id, is_deleted=False)
+        .order_by(Comment.created_at.asc())
+    )
+
+# Helper: reported posts and comments, newest first
+def reports_query():
+    return Report.query.order_by(Report.created_at.desc())
+
+# Helper: one page of feed posts
+def get_feed_page(tag=None, search=None, cursor=None, per_page=None):
+    query = feed_query(tag, search, cursor)
+    page_size = clamp_page_size(
+        per_page,
+        current_app.config.get('FEED_PAGE_SIZE', 20),
+        current_app.config.get('FEED_MAX_PAGE_SIZE', 50),
+    )
+    return fetch_page(query, page_size, lambda post: (post.created_at, post.id))
+
+# Helper: JSON shape of a feed post
+def serialize_post(post):
+    return {
+        'id': post.id,
+        'title': post.title,
+        'content': post.content,
+        'author': post.author.name,
+        'tags': [tag.name for tag in post.tags],
+        'like_count': post.like_count,
+        'comment_count': post.comment_count,
+        'created_at': post.created_at.strftime('%d %b %Y %H:%M'),
+        'url': url_for('feed.post_detail', post_id=post.id),
+    }
+
 # Feed main page: list & filter posts
 @feed_bp.route('/feed', methods=['GET'])
 @login_required
+@query_budget(6)
 def feed():
     tag = request.args.get('tag')
     search = request.args.get('search')
-    query = Post.query.filter_by(is_deleted=False)
-    if tag:
-        query = query.join(Post.tags).filter(Tag.name == tag)
-    if search:
-        query = query.filter((Post.title.ilike(f'%{search}%')) | (Post.content.ilike(f'%{search}%')))
-    posts = query.order_by(Post.created_at.desc()).all()
-    tags = Tag.query.all()
-    return render_template('feed/feed.html', posts=posts, tags=tags)
+    try:
+        posts, next_cursor = get_feed_page(tag, search, request.args.get('cursor'), request.args.get('per_page'))
+    except ValueError:
+        abort(400)
+    tags = all_tags()
+    prefetch_media(post.file_url for post in posts)
+    return render_template('feed/feed.html', posts=posts, tags=tags, next_cursor=next_cursor)
+
+# Infinite scroll: next page of the feed as JSON
+@feed_bp.route('/feed/api/posts', methods=['GET'])
+@login_required
+@query_budget(5)
+def feed_page_api():
+    tag = request.args.get('tag')
+    search = request.args.get('search')
+    try:
+        posts, next_cursor = get_feed_page(tag, search, request.args.get('cursor'), request.args.get('per_page'))
+    except ValueError:
+        return jsonify({'error': 'invalid cursor'}), 400
+    prefetch_media(post.file_url for post in posts)
+    return jsonify({
+        'posts': [serialize_post(post) for post in posts],
+        'next_cursor': next_cursor,
+        'html': render_template('feed/_posts.html', posts=posts),
+    })
 
 # New post form
 @feed_bp.route('/feed/new', methods=['GET', 'POST'])
@@ -38,33 +113,34 @@ def new_post():
         content = request.form['content']
         tag_ids = request.form.getlist('tags')
         file = request.files.get('file')
-        filename = None
+        file_url = None
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            file.save(os.path.join(UPLOAD_FOLDER, filename))
-        post = Post(title=title, content=content, author_id=current_user.id, file_url=filename)
+            file_url = save_stream(file.stream, file.filename)
+        post = Post(title=title, content=content, author_id=current_user.id, file_url=file_url)
         for tag_id in tag_ids:
             tag = Tag.query.get(tag_id)
             if tag:
                 post.tags.append(tag)
         db.session.add(post)
-        db.session.commit()
-        # Emit real-time event
-        socketio.emit('broadcast_new_post', {
+        db.session.flush()
+        # Real-time event, sent by a task worker once the post is committed
+        emit_after_commit('broadcast_new_post', {
             'id': post.id,
             'title': post.title,
             'content': post.content,
             'author': current_user.name,
             'created_at': post.created_at.strftime('%d %b %Y %H:%M'),
-        })
+        }, room=FEED_ROOM)
+        db.session.commit()
         flash('Post created!', 'success')
         return redirect(url_for('feed.feed'))
-    tags = Tag.query.all()
+    tags = all_tags()
     return render_template('feed/new_post.html', tags=tags)
 
 # Post detail & comments
 @feed_bp.route('/feed/post/<int:post_id>', methods=['GET', 'POST'])
 @login_required
+@query_budget(7)
 def post_detail(post_id):
     post = Post.query.get_or_404(post_id)
     if post.is_deleted:
@@ -73,45 +149,38 @@ def post_detail(post_id):
         content = request.form['content']
         comment = Comment(post_id=post.id, author_id=current_user.id, content=content)
         db.session.add(comment)
-        db.session.commit()
-        # Emit real-time event
-        socketio.emit('broadcast_new_comment', {
+        Post.bump_comment_count(post.id, 1)
+        db.session.flush()
+        # Real-time event, sent by a task worker once the comment is committed
+        emit_after_commit('broadcast_new_comment', {
             'post_id': post.id,
             'comment_id': comment.id,
             'author': current_user.name,
             'content': comment.content,
             'created_at': comment.created_at.strftime('%d %b %Y %H:%M'),
-        })
+        }, room=post_room(post.id))
+        db.session.commit()
         flash('Comment added!', 'success')
         return redirect(url_for('feed.post_detail', post_id=post.id))
-    comments = Comment.query.filter_by(post_id=post.id, is_deleted=False).order_by(Comment.created_at.asc()).all()
+    comments = comments_query(post.id).all()
+    prefetch_media([post.file_url])
     return render_template('feed/post_details.html', post=post, comments=comments)
 
 # Like a post
 @feed_bp.route('/feed/like/<int:post_id>', methods=['POST'])
 @login_required
 def like_post(post_id):
-    post = Post.query.get_or_404(post_id)
-    existing = Like.query.filter_by(user_id=current_user.id, post_id=post_id).first()
-    if not existing:
-        like = Like(user_id=current_user.id, post_id=post_id)
-        db.session.add(like)
-        db.session.commit()
-        # Emit real-time event
-        socketio.emit('broadcast_like_post', {
-            'post_id': post.id,
-            'count': len(post.likes),
-        })
-        return jsonify({'status': 'liked', 'count': len(post.likes)})
-    else:
-        db.session.delete(existing)
-        db.session.commit()
-        # Emit real-time event
-        socketio.emit('broadcast_like_post', {
-            'post_id': post.id,
-            'count': len(post.likes),
-        })
-        return jsonify({'status': 'unliked', 'count': len(post.likes)})
+    action = request.form.get('action')
+    if action not in (None, 'like', 'unlike'):
+        abort(400)
+    result = Like.toggle(current_user.id, post_id, action)
+    if result is None:
+        abort(404)
+    db.session.commit()
+    liked, count = result
+    # Real-time update, coalesced per post
+    like_counts.add(post_id, count)
+    return jsonify({'status': 'liked' if liked else 'unliked', 'count': count})
 
 # Report post or comment
 @feed_bp.route('/feed/report', methods=['POST'])
@@ -122,25 +191,27 @@ def report():
     reason = request.form.get('reason')
     report = Report(reporter_id=current_user.id, post_id=post_id, comment_id=comment_id, reason=reason)
     db.session.add(report)
-    db.session.commit()
-    # Emit real-time event
-    socketio.emit('broadcast_report_content', {
+    db.session.flush()
+    # Real-time event, sent by a task worker once the report is committed
+    emit_after_commit('broadcast_report_content', {
         'report_id': report.id,
         'post_id': report.post_id,
         'comment_id': report.comment_id,
         'reason': report.reason,
         'reporter': current_user.name,
-    })
+    }, room=MODERATORS_ROOM)
+    db.session.commit()
     flash('Reported for review.', 'info')
     return redirect(request.referrer or url_for('feed.feed'))
 
 # Admin: view reported content
 @feed_bp.route('/feed/reports')
 @login_required
+@query_budget(4)
 def reports():
     if not current_user.role == 'admin':
         abort(403)
-    reports = Report.query.order_by(Report.created_at.desc()).all()
+    reports = reports_query().all()
     return render_template('feed/reports.html', reports=reports)
 
 # Admin: delete post/comment
@@ -161,7 +232,9 @@ def delete_post(post_id):
 def delete_comment(comment_id):
     comment = Comment.query.get_or_404(comment_id)
     if current_user.role == 'admin' or comment.author_id == current_user.id:
-        comment.is_deleted = True
+        if not comment.is_deleted:
+            comment.is_deleted = True
+            Post.bump_comment_count(comment.post_id, -1)
         db.session.commit()
         flash('Comment deleted.', 'info')
     else:
@@ -6,12 +6,15 @@ from flask import (
     redirect,
     url_for,
     flash,
-    send_from_directory,
-    current_app,
 )
 import os
+from werkzeug.utils import secure_filename
 
 from website.models import db, Note
+from website.search import matching_ids
+from website.cache import cached_page, make_key
+from website.storage import UploadError, file_from_request, send_stored_file
+from website.query_budget import query_budget
 
 resources_bp = Blueprint("resources", __name__)
 
@@ -20,12 +23,7 @@ def is_faculty_or_admin():
     return current_user.role in ["teacher", "admin"]
 
 
-@resources_bp.route("/notes", methods=["GET"])
-@login_required
-def notes_list():
-    semester = request.args.get("semester")
-    subject = request.args.get("subject")
-
+def notes_query(semester=None, subject=None, q=None):
     query = Note.query
 
     if semester:
@@ -34,8 +32,25 @@ def notes_list():
     if subject:
         query = query.filter_by(subject=subject)
 
-    notes = query.order_by(Note.uploaded_at.desc()).all()
-    return render_template("resources/note_list.html", notes=notes)
+    if q:
+        query = query.filter(Note.id.in_(matching_ids("note", q)))
+
+    return query.order_by(Note.uploaded_at.desc())
+
+
+@resources_bp.route("/notes", methods=["GET"])
+@login_required
+@query_budget(3)
+def notes_list():
+    semester = request.args.get("semester")
+    subject = request.args.get("subject")
+    q = request.args.get("q")
+
+    def render():
+        notes = notes_query(semester, subject, q).all()
+        return render_template("resources/note_list.html", notes=notes)
+
+    return cached_page("notes", make_key(semester, subject, q, current_user.role), render)
 
 
 @resources_bp.route("/notes/upload", methods=["GET", "POST"])
@@ -52,24 +67,21 @@ def notes_upload():
         semester = request.form["semester"]
 
         subject = request.form["subject"]
-        file = request.files["file"]
 
-        if not file:
-            flash("No file selected.", "error")
+        try:
+            file_url = file_from_request(request)
+        except UploadError as e:
+            flash(str(e), "error")
             return redirect(request.url)
 
-        filename = file.filename
-        upload_folder = os.path.join(current_app.root_path, "static", "uploads")
-
-        os.makedirs(upload_folder, exist_ok=True)
-
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
+        if not file_url:
+            flash("No file selected.", "error")
+            return redirect(request.url)
 
         note = Note(
             title=title,
             description=description,
-            file_url=f"/static/uploads/{filename}",
+            file_url=file_url,
             semester=semester,
             subject=subject,
             uploaded_by=current_user.id,
@@ -88,8 +100,6 @@ def notes_upload():
 @login_required
 def note_download(note_id):
     note = Note.query.get_or_404(note_id)
-    file_path = note.file_url.replace("/static/uploads/", "")
-
-    upload_folder = os.path.join(current_app.root_path, "static", "uploads")
+    extension = os.path.splitext(note.file_url)[1]
 
-    return send_from_directory(upload_folder, file_path, as_attachment=True)
+    return send_stored_file(note.file_url, secure_filename(note.title) + extension)
@@ -0,0 +1,38 @@
+from flask import Blueprint, render_template, request, jsonify
+from flask_login import login_required
+
+from website.search import KINDS, search
+from website.query_budget import query_budget
+
+search_bp = Blueprint("search", __name__)
+
+PAGE_SIZE = 20
+
+
+@search_bp.route("/search")
+@login_required
+@query_budget(8)
+def search_results():
+    q = request.args.get("q", "").strip()
+    kind = request.args.get("kind")
+    kinds = [kind] if kind in KINDS else None
+    page = max(request.args.get("page", 1, type=int), 1)
+
+    results = search(q, kinds=kinds, limit=PAGE_SIZE, offset=(page - 1) * PAGE_SIZE) if q else []
+
+    if request.args.get("format") == "json":
+        return jsonify(
+            [
+                {
+                    "kind": r["kind"],
+                    "id": r["id"],
+                    "url": r["url"],
+                    "title": str(r["title"]),
+                    "snippet": str(r["snippet"]),
+                }
+                for r in results
+            ]
+        )
+    return render_template(
+        "search/results.html", q=q, kind=kind, kinds=list(KINDS), results=results, page=page, page_size=PAGE_SIZE
+    )
@@ -1,7 +1,34 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, current_app, jsonify
+from flask_login import login_required, current_user
+
+from website.attendance import student_summary
+from website.dashboard import student_dashboard
+from website.models import STUDENT_ROLES
+from website.query_budget import query_budget
+from website.timetable import timetable
 
 student_bp = Blueprint('student', __name__)
 
+# Dashboard: one read of the student's materialized snapshot once it is built
 @student_bp.route('/')
+@login_required
+@query_budget(8)
 def student_home():
-    return render_template('student/student.html')
+    dashboard = student_dashboard(current_user.id) if current_user.role in STUDENT_ROLES else None
+    return render_template('student/student.html', dashboard=dashboard)
+
+
+# Per-subject attendance with shortfall warnings, read from the running summaries
+@student_bp.route('/attendance')
+@login_required
+@query_budget(2)
+def student_attendance():
+    minimum = current_app.config.get('ATTENDANCE_MIN_PERCENT', 75)
+    return render_template('student/attendance.html', summary=student_summary(current_user.id, minimum), minimum=minimum)
+
+
+# Class in progress and the next one, from the compiled timetable
+@student_bp.route('/timetable/next')
+@login_required
+def timetable_next():
+    return jsonify(timetable.now_and_next(current_user.id))
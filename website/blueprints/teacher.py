@@ -1,7 +1,71 @@
-from flask import Blueprint, render_template
+from datetime import date
+
+from flask import Blueprint, render_template, request, jsonify, abort, current_app
+from flask_login import login_required, current_user
+
+from website.models import db
+from website.attendance import AttendanceError, mark_attendance, class_summary
+from website.query_budget import query_budget
 
 teacher_bp = Blueprint('teacher', __name__)
 
+MARKERS = ('teacher', 'faculty', 'admin')
+
+
+# Helper: only staff who take attendance past this point
+def require_marker():
+    if current_user.role not in MARKERS:
+        abort(403)
+
+
 @teacher_bp.route('/')
 def teacher_home():
     return render_template('teacher/teacher.html')
+
+
+# Mark a whole class in one request:
+# {"date": "2025-03-10", "subject": "Databases",
+#  "records": [{"student_id": 12, "status": "present"}, {"username": "s042", "status": "absent"}, ...]}
+# Re-sending a class for the same date and subject corrects it.
+@teacher_bp.route('/attendance', methods=['POST'])
+@login_required
+@query_budget(7)
+def attendance_mark():
+    require_marker()
+    data = request.get_json(silent=True) or {}
+    try:
+        day = date.fromisoformat(str(data.get('date') or date.today().isoformat()))
+    except ValueError:
+        return jsonify({'errors': ['date must be YYYY-MM-DD.']}), 400
+    subject = data.get('subject') or ''
+    if not isinstance(subject, str):
+        return jsonify({'errors': ['subject must be a string.']}), 400
+    records = data.get('records')
+    if not isinstance(records, list):
+        return jsonify({'errors': ['records must be a list.']}), 400
+    try:
+        created, changed, unchanged = mark_attendance(day, subject, records, current_user.id)
+    except AttendanceError as e:
+        return jsonify({'errors': e.args[0]}), 400
+    db.session.commit()
+    return jsonify({
+        'date': day.isoformat(),
+        'subject': subject.strip(),
+        'created': created,
+        'changed': changed,
+        'unchanged': unchanged,
+    })
+
+
+# Per-student percentages for one subject; ?short=1 lists only students below the minimum
+@teacher_bp.route('/attendance/summary', methods=['GET'])
+@login_required
+@query_budget(2)
+def attendance_summary():
+    require_marker()
+    subject = request.args.get('subject', '').strip()
+    if not subject:
+        return jsonify({'errors': ['subject is required.']}), 400
+    minimum = current_app.config.get('ATTENDANCE_MIN_PERCENT', 75)
+    students = class_summary(subject, minimum, short_only=request.args.get('short') == '1')
+    return jsonify({'subject': subject, 'minimum': minimum, 'students': students})
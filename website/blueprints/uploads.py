@@ -0,0 +1,69 @@
+import re
+
+from flask import Blueprint, request, jsonify, abort, current_app
+from flask_login import login_required, current_user
+
+from website.models import db, ChunkedUpload
+from website.storage import UploadError, start_upload, append_chunk
+
+uploads_bp = Blueprint("uploads", __name__)
+
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)$")
+
+
+def upload_status(upload):
+    return {
+        "id": upload.id,
+        "size": upload.size,
+        "offset": upload.received,
+        "complete": upload.sha256 is not None,
+        "chunk_size": current_app.config.get("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024),
+    }
+
+
+def get_own_upload(upload_id):
+    upload = ChunkedUpload.query.filter_by(id=upload_id, user_id=current_user.id).first()
+    if upload is None:
+        abort(404)
+    return upload
+
+
+# Start a resumable upload: {"filename": ..., "size": ...}
+@uploads_bp.route("/uploads", methods=["POST"])
+@login_required
+def upload_start():
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = start_upload(current_user.id, str(data.get("filename", "")), int(data.get("size", 0)))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e) if isinstance(e, UploadError) else "Invalid upload request."}), 400
+    db.session.commit()
+    return jsonify(upload_status(upload)), 201
+
+
+# Where to resume from
+@uploads_bp.route("/uploads/<upload_id>", methods=["GET"])
+@login_required
+def upload_status_view(upload_id):
+    return jsonify(upload_status(get_own_upload(upload_id)))
+
+
+# Append one chunk; the body is the raw bytes described by Content-Range
+@uploads_bp.route("/uploads/<upload_id>", methods=["PUT"])
+@login_required
+def upload_chunk(upload_id):
+    upload = get_own_upload(upload_id)
+    match = CONTENT_RANGE.match(request.headers.get("Content-Range", ""))
+    if not match or int(match.group(3)) != upload.size:
+        return jsonify({"error": "Content-Range must be 'bytes start-end/size'."}), 400
+    start, end = int(match.group(1)), int(match.group(2))
+    if end < start:
+        return jsonify({"error": "Empty range."}), 400
+    try:
+        append_chunk(upload, start, request.stream, end - start + 1)
+    except UploadError as e:
+        db.session.rollback()
+        # 409 carries the offset the client should resume from
+        return jsonify(dict(upload_status(get_own_upload(upload_id)), error=str(e))), 409
+    db.session.commit()
+    return jsonify(upload_status(upload))
@@ -0,0 +1,235 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask import make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from website.models import Announcement, Event, Note, Tag
+
+# Two-tier cache for rendered fragments and query results.
+#
+# Entries live in an in-process LRU and, when CACHE_URL is set, in a shared
+# backend so every worker sees them. Keys embed a per-namespace version;
+# invalidating a namespace bumps the version, which orphans every entry under
+# the old one at once. Without a shared backend versions are per process, so
+# other workers only catch up when their entries expire.
+
+MISSING = object()
+
+# Models whose writes invalidate a namespace
+WATCHED = {
+    Announcement: "announcements",
+    Event: "events",
+    Note: "notes",
+    Tag: "tags",
+}
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry TTL."""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return MISSING
+            expires, value = item
+            if expires is not None and expires < time.monotonic():
+                del self.data[key]
+                return MISSING
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self.lock:
+            self.data[key] = (expires, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class LocalBackend:
+    """Stand-in for a shared store: values go through pickle as they would over the wire."""
+
+    def __init__(self, url=None):
+        self.lock = threading.Lock()
+        self.data = {}
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires is not None and expires < time.monotonic():
+                del self.data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.data[key] = (time.monotonic() + ttl if ttl else None, value)
+
+    def incr(self, key):
+        with self.lock:
+            expires, value = self.data.get(key, (None, b"0"))
+            value = int(value) + 1
+            self.data[key] = (expires, str(value).encode())
+            return value
+
+
+class RedisBackend:
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl or None)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+
+BACKENDS = {"local": LocalBackend, "redis": RedisBackend, "rediss": RedisBackend}
+
+
+class Cache:
+    def __init__(self):
+        self.local = LRUCache()
+        self.shared = None
+        self.prefix = "cache"
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        self.local = LRUCache(
+            maxsize=app.config.get("CACHE_MAX_ENTRIES", 1024),
+            ttl=app.config.get("CACHE_DEFAULT_TTL", 300),
+        )
+        url = app.config.get("CACHE_URL")
+        self.shared = BACKENDS[url.split("://", 1)[0]](url) if url else None
+        self.prefix = app.config.get("CACHE_KEY_PREFIX", "cache")
+        self.versions = {}
+        for name, listener in (
+            ("after_flush", _collect_namespaces),
+            ("after_commit", _invalidate_namespaces),
+            ("after_rollback", _discard_namespaces),
+        ):
+            if not event.contains(Session, name, listener):
+                event.listen(Session, name, listener)
+        app.extensions["cache"] = self
+
+    def version(self, namespace):
+        if self.shared is not None:
+            return int(self.shared.get(f"{self.prefix}:version:{namespace}") or 0)
+        return self.versions.get(namespace, 0)
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            if self.shared is not None:
+                self.shared.incr(f"{self.prefix}:version:{namespace}")
+            else:
+                with self.lock:
+                    self.versions[namespace] = self.versions.get(namespace, 0) + 1
+
+    def get(self, key):
+        """An entry stored with set(), outside any namespace; MISSING when absent.
+
+        These live in the shared store when there is one, so every worker sees
+        the same value rather than its own copy.
+        """
+        full_key = f"{self.prefix}:{key}"
+        if self.shared is None:
+            return self.local.get(full_key)
+        raw = self.shared.get(full_key)
+        return MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        full_key = f"{self.prefix}:{key}"
+        if self.shared is None:
+            self.local.set(full_key, value, ttl)
+        else:
+            self.shared.set(full_key, pickle.dumps(value), self.local.ttl if ttl is None else ttl)
+
+    def get_or_set(self, namespace, key, compute, ttl=None):
+        full_key = f"{self.prefix}:{namespace}:{self.version(namespace)}:{key}"
+        value = self.local.get(full_key)
+        if value is not MISSING:
+            return value
+        if self.shared is not None:
+            raw = self.shared.get(full_key)
+            if raw is not None:
+                value = pickle.loads(raw)
+                self.local.set(full_key, value, ttl)
+                return value
+        value = compute()
+        self.local.set(full_key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(full_key, pickle.dumps(value), ttl if ttl is not None else self.local.ttl)
+        return value
+
+
+cache = Cache()
+
+
+# Helper: stable cache key from request-dependent parts
+def make_key(*parts):
+    return "|".join("" if part is None else str(part) for part in parts)
+
+
+# Serve a cached rendered page with a strong ETag, answering If-None-Match with 304
+def cached_page(namespace, key, render, ttl=None):
+    def compute():
+        body = render()
+        return body, hashlib.sha1(body.encode()).hexdigest()
+
+    body, etag = cache.get_or_set(namespace, key, compute, ttl)
+    response = make_response(body)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Cookie")
+    return response.make_conditional(request)
+
+
+# --- Invalidation hooks: bump namespaces only once the write has committed ---
+
+def _collect_namespaces(session, flush_context):
+    touched = session.info.setdefault("cache_namespaces", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        namespace = WATCHED.get(type(obj))
+        if namespace:
+            touched.add(namespace)
+
+
+def _invalidate_namespaces(session):
+    touched = session.info.pop("cache_namespaces", None)
+    if touched:
+        cache.invalidate(*touched)
+
+
+def _discard_namespaces(session):
+    session.info.pop("cache_namespaces", None)
@@ -0,0 +1,210 @@
+from datetime import datetime, timedelta
+
+import threading
+
+import click
+
+from website.models import db, Post
+from website.search import rebuild_index
+from website.message_queue import Broker, external_emitter
+from website.storage import collect_garbage
+from website.media import build_variants, pending_blobs
+from website.results import recompute_results
+from website.query_plans import check_plans
+from website.migrations import MIGRATIONS, current_version, head, upgrade
+from website.result_import import BATCH_SIZE, ImportFormatError, import_results, read_rows
+from website.seed import SeedError, seed_campus
+from website.attendance import rebuild_summaries
+from website.rsvp import reconcile_counts
+from website.timetable import reminders
+from website.tasks import TASKS, queue_stats, retry_failed, runner
+
+# --- Flask CLI commands ---
+
+def register_commands(app):
+    # Apply pending schema migrations (run once per release when auto-migrate is off)
+    @app.cli.command("db-upgrade")
+    @click.option("--target", type=int, help="Stop at this version instead of the head.")
+    def db_upgrade(target):
+        applied = upgrade(target)
+        for version in applied:
+            click.echo(f"Applied {version}: {MIGRATIONS[version][0]}")
+        click.echo(f"Database is at version {current_version()} (head {head()})")
+
+    @app.cli.command("db-status")
+    def db_status():
+        current = current_version()
+        if current is None:
+            click.echo("No migrations recorded; db-upgrade will create or stamp the schema")
+            return
+        click.echo(f"Database is at version {current} (head {head()})")
+        for version, (name, _) in sorted(MIGRATIONS.items()):
+            if version > current:
+                click.echo(f"  pending {version}: {name}")
+
+    # Backfill / reconcile the denormalized post and event counters
+    @app.cli.command("reconcile-counters")
+    @click.option("--dry-run", is_flag=True, help="Only report drifted rows.")
+    def reconcile_counters(dry_run):
+        drifted = Post.reconcile_counters(dry_run=dry_run)
+        events = reconcile_counts(dry_run=dry_run)
+        if dry_run:
+            click.echo(f"{drifted} post(s) and {events} event(s) have drifted counters")
+        else:
+            click.echo(f"Reconciled counters on {drifted} post(s) and {events} event(s)")
+
+    # Recount attendance summaries and dashboard totals from the attendance rows
+    @app.cli.command("attendance-reconcile")
+    def attendance_reconcile():
+        total = rebuild_summaries()
+        click.echo(f"Rebuilt {total} attendance summary row(s)")
+
+    # Rebuild the full-text search index from scratch
+    @app.cli.command("search-reindex")
+    def search_reindex():
+        total = rebuild_index()
+        click.echo(f"Indexed {total} document(s)")
+
+    # Fan-out broker for SOCKETIO_MESSAGE_QUEUE=local://host:port
+    @app.cli.command("socketio-broker")
+    @click.option("--host", default="127.0.0.1")
+    @click.option("--port", default=5680, type=int)
+    def socketio_broker(host, port):
+        click.echo(f"Socket.IO broker listening on {host}:{port}")
+        with Broker((host, port)) as broker:
+            broker.serve_forever()
+
+    # Class reminders from one dedicated process, through SOCKETIO_MESSAGE_QUEUE
+    # (set TIMETABLE_REMINDERS=0 on the web workers so they do not also send them)
+    @app.cli.command("timetable-reminders")
+    def timetable_reminders():
+        url = app.config.get("SOCKETIO_MESSAGE_QUEUE")
+        if not url:
+            raise click.ClickException("SOCKETIO_MESSAGE_QUEUE must be set to reach the web workers")
+        click.echo(f"Sending class reminders {reminders.lead} minute(s) ahead")
+        reminders.run(app, external_emitter(url, app.config.get("SOCKETIO_CHANNEL", "flask-socketio")))
+
+    # Run background jobs in this process (TASK_WORKERS=0 on the web workers to
+    # leave them all here); broadcasts reach clients through SOCKETIO_MESSAGE_QUEUE
+    @app.cli.command("tasks-worker")
+    @click.option("--workers", default=2, type=int, help="Worker threads.")
+    @click.option("--burst", is_flag=True, help="Exit once no job is due.")
+    def tasks_worker(workers, burst):
+        url = app.config.get("SOCKETIO_MESSAGE_QUEUE")
+        if url:
+            app.extensions["socketio_emitter"] = external_emitter(url, app.config.get("SOCKETIO_CHANNEL", "flask-socketio"))
+        else:
+            click.echo("SOCKETIO_MESSAGE_QUEUE is not set; broadcasts from this worker reach no one", err=True)
+        click.echo(f"Running {', '.join(sorted(TASKS))} on {workers} thread(s)")
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=runner.work, args=(f"{runner.worker}:{number}", stop, burst), daemon=True)
+            for number in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1)
+        except KeyboardInterrupt:
+            stop.set()
+            runner.wakeup.set()
+            click.echo("Stopping after the jobs in hand")
+            for thread in threads:
+                thread.join()
+
+    @app.cli.command("tasks-status")
+    def tasks_status():
+        stats = queue_stats()
+        if not stats:
+            click.echo("No jobs queued")
+            return
+        now = datetime.utcnow()
+        for (name, status), (count, oldest) in sorted(stats.items()):
+            wait = f", oldest due {int((now - oldest).total_seconds())}s ago" if status == "queued" and oldest <= now else ""
+            click.echo(f"{name:<20}{status:<9}{count:>8}{wait}")
+
+    # Requeue jobs that ran out of retries, with their attempts reset
+    @app.cli.command("tasks-retry")
+    @click.option("--name", help="Only jobs of this task.")
+    def tasks_retry(name):
+        click.echo(f"Requeued {retry_failed(name)} failed job(s)")
+
+    # Build media variants for uploads stored before the pipeline (or that failed)
+    @app.cli.command("media-backfill")
+    @click.option("--retry-failed", is_flag=True)
+    def media_backfill(retry_failed):
+        blobs = pending_blobs(retry_failed)
+        written = sum(build_variants(sha256) for sha256 in blobs)
+        click.echo(f"Wrote {written} variant(s) for {len(blobs)} file(s)")
+
+    # Remove unreferenced upload blobs and abandoned chunked uploads
+    @app.cli.command("storage-gc")
+    @click.option("--hours", default=24, type=int, help="Grace period before deleting.")
+    def storage_gc(hours):
+        removed = collect_garbage(timedelta(hours=hours))
+        click.echo(f"Removed {removed} file(s)")
+
+    # Recompute SGPA/CGPA; only marksheets that changed are re-parsed unless --force
+    @app.cli.command("results-recompute")
+    @click.option("--semester", type=int, help="Only students with a result in this semester.")
+    @click.option("--force", is_flag=True, help="Re-parse every marksheet.")
+    def results_recompute(semester, force):
+        updated, invalid = recompute_results(semester=semester, force=force)
+        db.session.commit()
+        click.echo(f"Updated {updated} result(s)")
+        if invalid:
+            click.echo(f"{invalid} result(s) have unreadable details", err=True)
+
+    # Bulk-load published results from a CSV/.xlsx export (one row per subject)
+    @app.cli.command("results-import")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--batch-size", default=BATCH_SIZE, type=int, help="Marksheets per transaction.")
+    def results_import(path, batch_size):
+        def progress(report):
+            click.echo(f"{report.rows} row(s) read, {report.results} result(s) saved", err=True)
+
+        with open(path, "rb") as f:
+            try:
+                report = import_results(read_rows(f, path), batch_size=batch_size, progress=progress)
+            except ImportFormatError as e:
+                raise click.ClickException(str(e))
+        click.echo(f"Imported {report.results} result(s) from {report.rows} row(s), skipped {report.skipped}")
+        for line, message in report.errors:
+            click.echo(f"  line {line}: {message}", err=True)
+        if report.stopped:
+            raise click.ClickException(f"Stopped: {report.stopped} The results imported before it were kept.")
+
+    # Fail (exit 1) if any hot blueprint query plans a full table scan
+    @app.cli.command("query-plans")
+    @click.option("--verbose", is_flag=True, help="Print every plan, not just regressions.")
+    def query_plans(verbose):
+        if db.engine.dialect.name != "sqlite":
+            click.echo("Query-plan checks run against SQLite only")
+            return
+        failed = 0
+        for name, (plan, scans) in check_plans().items():
+            if scans:
+                failed += 1
+                click.echo(f"FULL SCAN  {name}: {'; '.join(scans)}", err=True)
+            elif verbose:
+                click.echo(f"ok         {name}: {'; '.join(plan)}")
+        if failed:
+            raise click.ClickException(f"{failed} hot query(s) scan a whole table")
+        click.echo("Every hot query uses an index")
+
+    # Fill the database with synthetic campus data for load tests (see website/seed.py)
+    @app.cli.command("seed-campus")
+    @click.option("--students", default=5000, type=int, help="Other volumes scale with this.")
+    @click.option("--password", default="nexus123", help="Password for every seeded account.")
+    @click.option("--seed", default=1, type=int, help="Random seed; same seed, same data.")
+    def seed(students, password, seed):
+        try:
+            counts = seed_campus(
+                students=students, password=password, seed=seed,
+                progress=lambda name, count: click.echo(f"  {name:<14}{count:>10,}"),
+            )
+        except SeedError as exc:
+            raise click.ClickException(str(exc))
+        click.echo(f"Seeded {sum(counts.values()):,} row(s); log in as student00000 / {password}")
@@ -0,0 +1,283 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from website.cache import cache
+from website.models import (
+    db, dialect_insert, Announcement, AttendanceSummary, Event, Result, SectionPeriod, StudentDashboard,
+    TimetableEntry, User, event_rsvps,
+)
+
+# Materialized student dashboard.
+#
+# The student home page shows today's classes, attendance, latest results,
+# pinned announcements and upcoming RSVP'd events. Rather than querying each
+# on every load, every student has one student_dashboards row:
+#
+#     attendance   running totals, adjusted in place by website.attendance
+#     timetable    the whole week (section plus personal periods); today is
+#                  picked at read time
+#     results      SGPA/CGPA of the latest semesters
+#     events       upcoming RSVP'd events
+#
+# A write to the underlying rows marks only the affected sections of the
+# affected students stale (NULL), in the writer's transaction; the next page
+# load rebuilds just those sections and stores them back. A steady-state load
+# is one primary-key read. Pinned announcements are the same for everyone and
+# come from the cached "announcements" namespace instead.
+#
+# Core bulk writes skip the ORM hooks below; code doing them calls
+# mark_stale() itself, as results.recompute_results does.
+
+SECTIONS = ("timetable", "results", "events")
+LATEST_RESULTS = 3
+UPCOMING_EVENTS = 10
+PINNED_ANNOUNCEMENTS = 5
+
+# Event columns shown on the dashboard; editing one refreshes RSVP'd students
+EVENT_FIELDS = ("title", "start_time", "end_time", "location")
+
+
+# --- Section builders ---
+
+def _day_key(day):
+    return (day or "").strip()[:3].lower()
+
+
+def section_periods_query(student_id):
+    return SectionPeriod.query.join(User, User.section_id == SectionPeriod.section_id).filter(User.id == student_id)
+
+
+def timetable_entries_query(student_id):
+    return TimetableEntry.query.filter_by(student_id=student_id)
+
+
+def latest_results_query(student_id):
+    return Result.query.filter_by(student_id=student_id).order_by(Result.semester.desc()).limit(LATEST_RESULTS)
+
+
+def upcoming_events_query(student_id, now):
+    return (
+        Event.query.join(event_rsvps, event_rsvps.c.event_id == Event.id)
+        .filter(event_rsvps.c.user_id == student_id, Event.end_time >= now)
+        .order_by(Event.start_time)
+        .limit(UPCOMING_EVENTS)
+    )
+
+
+def pinned_announcements_query():
+    return (
+        Announcement.query.filter_by(is_pinned=True)
+        .order_by(Announcement.posted_at.desc())
+        .limit(PINNED_ANNOUNCEMENTS)
+    )
+
+
+def snapshot_query(student_id):
+    table = StudentDashboard.__table__
+    return db.select(table).where(table.c.student_id == student_id)
+
+
+def _build_timetable(student_id, now):
+    week = defaultdict(list)
+    periods = section_periods_query(student_id)
+    entries = timetable_entries_query(student_id)
+    for row in sorted([*periods, *entries], key=lambda row: row.start_time):
+        week[_day_key(row.day)].append({
+            "period": row.period,
+            "subject": row.subject,
+            "start": row.start_time.strftime("%H:%M"),
+            "end": row.end_time.strftime("%H:%M"),
+            "location": row.location,
+        })
+    return dict(week)
+
+
+def _build_results(student_id, now):
+    results = latest_results_query(student_id)
+    return [{"semester": r.semester, "sgpa": r.sgpa, "cgpa": r.cgpa} for r in results]
+
+
+def _build_events(student_id, now):
+    events = upcoming_events_query(student_id, now)
+    return [{
+        "id": e.id,
+        "title": e.title,
+        "start": e.start_time.isoformat(),
+        "end": e.end_time.isoformat(),
+        "location": e.location,
+    } for e in events]
+
+
+BUILDERS = {"timetable": _build_timetable, "results": _build_results, "events": _build_events}
+
+
+def _attendance_totals(student_id):
+    return db.session.execute(
+        db.select(
+            db.func.coalesce(db.func.sum(AttendanceSummary.total), 0),
+            db.func.coalesce(db.func.sum(AttendanceSummary.attended), 0),
+        ).where(AttendanceSummary.student_id == student_id)
+    ).one()
+
+
+def pinned_announcements():
+    def load():
+        announcements = pinned_announcements_query()
+        return [
+            {"id": a.id, "title": a.title, "category": a.category, "posted_at": a.posted_at}
+            for a in announcements
+        ]
+    return cache.get_or_set("announcements", "pinned", load)
+
+
+# --- Reading ---
+
+def _ended(events, now):
+    return any(datetime.fromisoformat(e["end"]) < now for e in events)
+
+
+def student_dashboard(student_id, now=None):
+    """The dashboard for one student, rebuilding stale sections first.
+
+    Commits when it had to (re)build anything, so call it before making
+    other changes in the same session.
+    """
+    now = now or datetime.now()
+    table = StudentDashboard.__table__
+    row = db.session.execute(snapshot_query(student_id)).first()
+    if row is None:
+        snapshot = {section: build(student_id, now) for section, build in BUILDERS.items()}
+        snapshot["attendance_total"], snapshot["attendance_attended"] = _attendance_totals(student_id)
+        db.session.execute(
+            dialect_insert(table)
+            .values(student_id=student_id, version=0, updated_at=datetime.utcnow(), **snapshot)
+            .on_conflict_do_nothing(index_elements=["student_id"])
+        )
+        db.session.commit()
+    else:
+        snapshot = dict(row._mapping)
+        stale = [section for section in SECTIONS if snapshot[section] is None]
+        if "events" not in stale and _ended(snapshot["events"], now):
+            stale.append("events")
+        if stale:
+            fresh = {section: BUILDERS[section](student_id, now) for section in stale}
+            snapshot.update(fresh)
+            # A write that landed since we read the row wins; it marked its sections stale again
+            db.session.execute(
+                db.update(table)
+                .where(table.c.student_id == student_id, table.c.version == snapshot["version"])
+                .values(updated_at=datetime.utcnow(), **fresh)
+            )
+            db.session.commit()
+
+    total, attended = snapshot["attendance_total"], snapshot["attendance_attended"]
+    return {
+        "today": snapshot["timetable"].get(_day_key(now.strftime("%A")), []),
+        "timetable": snapshot["timetable"],
+        "attendance": {
+            "total": total,
+            "attended": attended,
+            "percent": round(attended * 100 / total, 1) if total else None,
+        },
+        "results": snapshot["results"],
+        "events": [e for e in snapshot["events"] if datetime.fromisoformat(e["end"]) >= now],
+        "announcements": pinned_announcements(),
+    }
+
+
+# --- Maintenance ---
+
+def mark_stale(conn, section, student_ids):
+    """Mark ``section`` stale for ``student_ids``; runs on ``conn`` so it commits with the write."""
+    student_ids = sorted(set(student_ids))
+    table = StudentDashboard.__table__
+    for start in range(0, len(student_ids), 500):
+        conn.execute(
+            db.update(table)
+            .where(table.c.student_id.in_(student_ids[start:start + 500]))
+            .values({section: None, "version": table.c.version + 1})
+        )
+
+
+def record_attendance(conn, deltas):
+    """Apply ``{student_id: (total delta, attended delta)}`` to the running totals."""
+    table = StudentDashboard.__table__
+    rows = [
+        {"sid": student_id, "total": total, "attended": attended}
+        for student_id, (total, attended) in deltas.items() if total or attended
+    ]
+    if rows:
+        conn.execute(
+            db.update(table)
+            .where(table.c.student_id == db.bindparam("sid"))
+            .values(
+                attendance_total=table.c.attendance_total + db.bindparam("total"),
+                attendance_attended=table.c.attendance_attended + db.bindparam("attended"),
+            ),
+            rows,
+        )
+
+
+# Students whose RSVP'd events are about to change; association rows of a
+# deleted event are gone by after_flush, so they are looked up here
+def _collect_event_changes(session, flush_context, instances):
+    event_ids = [obj.id for obj in session.deleted if isinstance(obj, Event)]
+    for obj in session.dirty:
+        if isinstance(obj, Event) and obj.id is not None:
+            attrs = inspect(obj).attrs
+            if any(attrs[name].history.has_changes() for name in EVENT_FIELDS):
+                event_ids.append(obj.id)
+    if event_ids:
+        rows = session.connection().execute(
+            db.select(event_rsvps.c.user_id).where(event_rsvps.c.event_id.in_(event_ids))
+        )
+        session.info.setdefault("dashboard_rsvps", set()).update(rows.scalars())
+
+
+def _sync_dashboards(session, flush_context):
+    stale = defaultdict(set)
+    stale["events"].update(session.info.pop("dashboard_rsvps", ()))
+    sections = set()
+
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Result):
+            stale["results"].add(obj.student_id)
+        elif isinstance(obj, TimetableEntry):
+            stale["timetable"].add(obj.student_id)
+        elif isinstance(obj, SectionPeriod):
+            sections.add(obj.section_id)
+    for obj in session.dirty:
+        if isinstance(obj, Result):
+            stale["results"].add(obj.student_id)
+        elif isinstance(obj, TimetableEntry):
+            stale["timetable"].add(obj.student_id)
+        elif isinstance(obj, SectionPeriod):
+            sections.add(obj.section_id)
+            sections.update(inspect(obj).attrs.section_id.history.deleted)
+        elif isinstance(obj, User):
+            attrs = inspect(obj).attrs
+            history = attrs.events_rsvped.history
+            if history.added or history.deleted:
+                stale["events"].add(obj.id)
+            if attrs.section_id.history.has_changes():
+                stale["timetable"].add(obj.id)
+        elif isinstance(obj, Event):
+            history = inspect(obj).attrs.rsvps.history
+            stale["events"].update(user.id for user in history.added + history.deleted)
+    sections.discard(None)
+    if sections:
+        rows = session.connection().execute(db.select(User.id).where(User.section_id.in_(sections)))
+        stale["timetable"].update(rows.scalars())
+
+    for section, student_ids in stale.items():
+        if student_ids:
+            mark_stale(session.connection(), section, student_ids)
+
+
+def init_dashboards():
+    for name, listener in (("before_flush", _collect_event_changes), ("after_flush", _sync_dashboards)):
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
@@ -0,0 +1,72 @@
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from website.models import db
+
+# Engine configuration from the environment.
+#
+# DATABASE_URL picks the database (default: sqlite:///website.db). SQLite
+# connections get WAL journaling, a busy timeout and relaxed fsyncs at
+# connect, so readers never block the writer and concurrent writes wait
+# instead of failing with "database is locked". Server databases get a
+# tunable connection pool with pre-ping and recycling.
+#
+# SQLite transactions start deferred: reads share the snapshot of whenever
+# the first statement ran. Code that reads rows to decide what to write
+# calls begin_write() first, so the reads and writes run under the write lock.
+
+
+def database_url():
+    url = os.environ.get("DATABASE_URL", "sqlite:///website.db")
+    # Heroku-style URLs use the scheme SQLAlchemy dropped in 1.4
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def engine_options(url):
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": int(os.environ.get("DATABASE_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DATABASE_MAX_OVERFLOW", 10)),
+        "pool_timeout": int(os.environ.get("DATABASE_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.environ.get("DATABASE_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": True,
+    }
+
+
+def init_database(app):
+    """Apply SQLite pragmas on every new connection; call after db.init_app."""
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = {
+        "journal_mode": app.config.get("SQLITE_JOURNAL_MODE", "WAL"),
+        "busy_timeout": app.config.get("SQLITE_BUSY_TIMEOUT_MS", 5000),
+        "synchronous": app.config.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    }
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            if value is not None:
+                cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def begin_write():
+    """Start the session's transaction holding SQLite's write lock (BEGIN IMMEDIATE).
+
+    A no-op on other databases, and once the transaction has already written
+    (the lock is then held). Concurrent callers queue on busy_timeout.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name != "sqlite":
+        return
+    if not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
@@ -0,0 +1,208 @@
+import hashlib
+from datetime import datetime, timedelta
+
+from flask import current_app, make_response, request, url_for
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from website.cache import MISSING, cache, make_key
+from website.models import db, Event, User, event_rsvps
+
+# iCalendar (RFC 5545) feeds of campus events.
+#
+#     /events/calendar/<token>/mine.ics              events the user registered for
+#     /events/calendar/<token>/category/<name>.ics   every event in one category
+#     /events/calendar/<token>/all.ics               every event
+#
+# Calendar apps poll these without a session cookie, so the URL carries a
+# token signed with SECRET_KEY that names the user and their calendar_version.
+# Resetting the version (POST /events/calendar/reset) revokes every URL issued
+# before. A feed covers events from CALENDAR_PAST_DAYS ago onwards.
+#
+# Rendered feeds are cached: category and full feeds under the "events"
+# namespace, personal feeds also under a per-user one that website.rsvp bumps
+# when their registrations change. Each body is stored with a content hash
+# (the ETag) and the time the feed last rendered differently (Last-Modified),
+# kept per feed alongside the hash it was taken for. Re-rendering the same
+# body keeps the time; any change (an edit, a cancelled registration, an
+# event ageing out of the window) moves it forward, and a lost record falls
+# back to now. A client polling every few minutes gets a 304 until something
+# it shows changes, whichever validator it sends.
+# Times are written as floating local times, the same naive local times the
+# events table stores.
+
+PRODID = "-//TeamNexus//Campus Events//EN"
+MAX_LINE = 75  # octets per content line before folding
+FEED_CHANGES_TTL = 30 * 86400  # a feed nobody polls for this long starts over from now
+
+
+def calendar_namespace(user_id):
+    return f"calendar:{user_id}"
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.secret_key, salt="calendar-feed")
+
+
+def calendar_token(user):
+    return _serializer().dumps([user.id, user.calendar_version])
+
+
+def user_from_token(token):
+    """The user a feed token was issued to, or None if it does not verify or was revoked."""
+    try:
+        claim = _serializer().loads(token)
+    except BadSignature:
+        return None
+    # Tokens from before versions named only the user
+    if isinstance(claim, int):
+        claim = [claim, 0]
+    if not (isinstance(claim, list) and len(claim) == 2 and all(isinstance(part, int) for part in claim)):
+        return None
+    user = db.session.get(User, claim[0])
+    return user if user is not None and user.calendar_version == claim[1] else None
+
+
+def reset_calendar_token(user_id):
+    """Revoke every feed URL issued to ``user_id``. The caller commits."""
+    db.session.execute(
+        db.update(User).where(User.id == user_id).values(calendar_version=User.calendar_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# --- Rendering ---
+
+def _escape(text):
+    return (
+        str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _fold(line):
+    """Split a content line into CRLF + space continuations of at most 75 octets."""
+    raw = line.encode()
+    if len(raw) <= MAX_LINE:
+        return line
+    parts, start, limit = [], 0, MAX_LINE
+    while start < len(raw):
+        end = min(start + limit, len(raw))
+        while end < len(raw) and (raw[end] & 0xC0) == 0x80:  # never split a UTF-8 sequence
+            end -= 1
+        parts.append(raw[start:end].decode())
+        start, limit = end, MAX_LINE - 1
+    return "\r\n ".join(parts)
+
+
+def _local(moment):
+    return moment.strftime("%Y%m%dT%H%M%S")
+
+
+def _vevent(event, host):
+    stamp = (event.posted_at or event.start_time).strftime("%Y%m%dT%H%M%SZ")
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:event-{event.id}@{host}",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{_local(event.start_time)}",
+        f"DTEND:{_local(event.end_time)}",
+        f"SUMMARY:{_escape(event.title)}",
+        f"URL:{url_for('events.event_details', event_id=event.id, _external=True)}",
+    ]
+    if event.location:
+        lines.append(f"LOCATION:{_escape(event.location)}")
+    if event.description:
+        lines.append(f"DESCRIPTION:{_escape(event.description)}")
+    if event.category:
+        lines.append(f"CATEGORIES:{_escape(event.category)}")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def render_calendar(events, name):
+    """An iCalendar document for ``events``."""
+    host = request.host.split(":")[0]
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(name)}",
+    ]
+    for event in events:
+        lines += _vevent(event, host)
+    lines.append("END:VCALENDAR")
+    return "".join(_fold(line) + "\r\n" for line in lines)
+
+
+# --- Feeds ---
+
+def _since():
+    return datetime.now() - timedelta(days=current_app.config.get("CALENDAR_PAST_DAYS", 90))
+
+
+def calendar_query(category=None, user_id=None):
+    """Events a feed shows: those ``user_id`` registered for, else every event or those in ``category``."""
+    query = Event.query
+    if user_id is not None:
+        query = query.join(event_rsvps, event_rsvps.c.event_id == Event.id).filter(event_rsvps.c.user_id == user_id)
+    elif category is not None:
+        query = query.filter(Event.category == category)
+    return query.filter(Event.start_time >= _since()).order_by(Event.start_time, Event.id)
+
+
+def _changed_at(feed, etag):
+    """When ``feed`` started rendering as ``etag``; later than any earlier body's time."""
+    key = f"calendar-changed:{feed}"
+    seen = cache.get(key)
+    if seen is not MISSING and seen[0] == etag:
+        return seen[1]
+    changed = datetime.utcnow().replace(microsecond=0)
+    if seen is not MISSING:
+        # HTTP dates are whole seconds; a change within the same one must still compare newer
+        changed = max(changed, seen[1] + timedelta(seconds=1))
+    cache.set(key, (etag, changed), FEED_CHANGES_TTL)
+    return changed
+
+
+def _cached_feed(namespace, key, feed, build):
+    def compute():
+        body = build()
+        etag = hashlib.sha1(body.encode()).hexdigest()
+        return body, etag, _changed_at(feed, etag)
+    return cache.get_or_set(namespace, key, compute, current_app.config.get("CALENDAR_CACHE_TTL", 300))
+
+
+def category_feed(category=None):
+    """(body, etag, last modified) for every event, or those in ``category``."""
+    def build():
+        name = "Campus events" if category is None else f"Campus events: {category}"
+        return render_calendar(calendar_query(category).all(), name)
+    return _cached_feed("events", make_key("ics", category), make_key("category", category), build)
+
+
+def personal_feed(user):
+    """(body, etag, last modified) for the events ``user`` registered for."""
+    def build():
+        return render_calendar(calendar_query(user_id=user.id).all(), "My campus events")
+    # Changes to the events themselves and to this user's registrations both show
+    return _cached_feed(
+        calendar_namespace(user.id), make_key("ics", cache.version("events")), make_key("user", user.id), build
+    )
+
+
+def touch_personal_feeds(user_ids):
+    """Refresh these users' personal feeds once the current transaction commits."""
+    db.session.info.setdefault("cache_namespaces", set()).update(calendar_namespace(uid) for uid in user_ids)
+
+
+def feed_response(feed, filename):
+    body, etag, last_modified = feed
+    response = make_response(body)
+    response.headers["Content-Type"] = "text/calendar; charset=utf-8"
+    response.headers["Content-Disposition"] = f'inline; filename="{filename}"'
+    response.headers["Cache-Control"] = "private, max-age=300"
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response.make_conditional(request)
@@ -0,0 +1,277 @@
+import logging
+import os
+import uuid
+
+from flask import current_app, g
+from markupsafe import Markup, escape
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from website.cache import LRUCache, MISSING, cache
+from website.models import db, dialect_insert, MediaVariant, StoredFile
+from website.storage import public_url, storage_root, url_prefix
+from website.tasks import enqueue, task
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: pip install website[media]
+    Image = None
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # optional: pip install website[media]
+    pdfium = None
+
+# Responsive image variants and PDF previews for uploads.
+#
+# When an upload stores a new blob, a "media.variants" job is queued in the
+# same transaction and a task worker builds, next to the original:
+#
+#     <sha>.w320.webp, .w640.webp, .w1280.webp    downscaled copies of an image
+#     <sha>.preview.png (+ the widths above)       first page of a PDF
+#
+# Only widths below the original's are made. Each file gets a media_variants
+# row with its dimensions ("original" describes the upload itself), and the
+# blob's media_status ends "ready" or "failed".
+#
+# Views call prefetch_media() with the URLs on the page (one query for
+# anything not already cached in-process), and templates call
+# responsive_image(url) for an <img> with srcset, sizes and dimensions. Until
+# the variants exist, or without Pillow installed, images fall back to the
+# original and PDFs show no preview.
+#
+#     flask media-backfill      build for blobs stored before this, or that failed
+
+WIDTHS = (320, 640, 1280)
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp"}  # GIFs keep their animation
+PREVIEW_EXTENSIONS = {".pdf"}
+MEDIA_NAMESPACES = ("events", "announcements")  # cached pages that show uploads
+ORIENTATION = 0x0112  # EXIF tag; 5-8 mean the stored image is rotated a quarter turn
+
+logger = logging.getLogger(__name__)
+
+# sha256 -> tuple of variants; finished manifests never change, pending ones are re-read soon
+_manifests = LRUCache(maxsize=4096, ttl=0)
+PENDING_TTL = 30
+
+
+class MediaError(ValueError):
+    pass
+
+
+def _undecodable():
+    """Errors that mean the file itself cannot be made into variants; anything else is retried."""
+    errors = (MediaError,)
+    if Image is not None:
+        errors += (Image.UnidentifiedImageError, Image.DecompressionBombError)
+    if pdfium is not None:
+        errors += (pdfium.PdfiumError,)
+    return errors
+
+
+def media_sha(url):
+    """sha256 of a stored blob URL that can have variants, else None."""
+    prefix = url_prefix() + "/"
+    if not url or not url.startswith(prefix):
+        return None
+    name = os.path.basename(url)
+    sha256, _, ext = name.partition(".")
+    return sha256 if "." + ext.lower() in IMAGE_EXTENSIONS | PREVIEW_EXTENSIONS else None
+
+
+# --- Building variants ---
+
+def _open_source(path, ext):
+    """Decoded image to resize from, and the source's own (width, height)."""
+    if ext in PREVIEW_EXTENSIONS:
+        if pdfium is None:
+            raise MediaError("PDF previews need pypdfium2 (pip install website[media]).")
+        pdf = pdfium.PdfDocument(path)
+        try:
+            if len(pdf) == 0:
+                raise MediaError("PDF has no pages.")
+            page = pdf[0]
+            scale = min(2.0, WIDTHS[-1] / max(1.0, page.get_width()))
+            image = page.render(scale=scale).to_pil().convert("RGB")
+            return image, image.size
+        finally:
+            pdf.close()
+    image = Image.open(path)
+    if image.width * image.height > current_app.config.get("MEDIA_MAX_PIXELS", 50_000_000):
+        raise MediaError(f"Image is too large ({image.width}x{image.height}).")
+    size = image.size[::-1] if image.getexif().get(ORIENTATION) in (5, 6, 7, 8) else image.size
+    # JPEGs decode straight at a reduced scale when the largest variant allows
+    image.draft("RGB", (WIDTHS[-1], WIDTHS[-1]))
+    image = ImageOps.exif_transpose(image)
+    return image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB"), size
+
+
+def _write(image, path, format_, **options):
+    dest = os.path.join(storage_root(), path)
+    tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+    image.save(tmp, format_, **options)
+    os.replace(tmp, dest)
+    return os.path.getsize(dest)
+
+
+def build_variants(sha256):
+    """Make the variants of one stored file; returns how many were written.
+
+    A file that cannot be decoded is marked "failed". Other errors (a full
+    disk, a locked database) propagate, so the task retries them.
+    """
+    blob = db.session.get(StoredFile, sha256)
+    if blob is None or blob.media_status == "ready":
+        return 0
+    stem, ext = os.path.splitext(blob.path)
+    ext = ext.lower()
+    if ext not in IMAGE_EXTENSIONS | PREVIEW_EXTENSIONS:
+        return 0
+    quality = current_app.config.get("MEDIA_QUALITY", 80)
+    rows = []
+    try:
+        if Image is None:
+            raise MediaError("Image variants need Pillow (pip install website[media]).")
+        try:
+            image, (width, height) = _open_source(os.path.join(storage_root(), blob.path), ext)
+        except OSError as exc:
+            # Pillow reports a truncated or corrupt body as an OSError without an errno
+            if exc.errno is not None:
+                raise
+            raise MediaError(f"Could not decode {blob.path}: {exc}") from exc
+        if ext in PREVIEW_EXTENSIONS:
+            path = f"{stem}.preview.png"
+            size = _write(image, path, "PNG", optimize=True)
+            rows.append({"name": "preview", "path": path, "width": image.width, "height": image.height, "size": size})
+        else:
+            rows.append({"name": "original", "path": blob.path, "width": width, "height": height, "size": blob.size})
+        for target in WIDTHS:
+            if target >= width:
+                break
+            resized = image.resize((target, max(1, round(height * target / width))), Image.LANCZOS, reducing_gap=3.0)
+            path = f"{stem}.w{target}.webp"
+            size = _write(resized, path, "WEBP", quality=quality, method=4)
+            rows.append({"name": f"w{target}", "path": path, "width": target, "height": resized.height, "size": size})
+    except _undecodable():
+        logger.exception("could not build media variants for %s", blob.path)
+        blob.media_status = "failed"
+        db.session.commit()
+        return 0
+
+    stmt = dialect_insert(MediaVariant.__table__)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["sha256", "name"],
+            set_={"path": stmt.excluded.path, "width": stmt.excluded.width,
+                  "height": stmt.excluded.height, "size": stmt.excluded.size},
+        ),
+        [dict(row, sha256=sha256) for row in rows],
+    )
+    blob.media_status = "ready"
+    db.session.commit()
+    _manifests.delete(sha256)
+    cache.invalidate(*MEDIA_NAMESPACES)
+    return len(rows)
+
+
+@task("media.variants", retries=2, backoff=30)
+def build_variants_task(sha256):
+    build_variants(sha256)
+
+
+# Queue variants for the blobs this transaction stored (website.storage notes them)
+def _queue_new_blobs(session):
+    new_blobs = session.info.pop("new_blobs", None)
+    if not new_blobs or not current_app.config.get("MEDIA_VARIANTS", True):
+        return
+    for sha256 in sorted(new_blobs):
+        enqueue("media.variants", sha256=sha256)
+
+
+def _forget_new_blobs(session):
+    session.info.pop("new_blobs", None)
+
+
+def pending_blobs(retry_failed=False):
+    """Stored images and PDFs whose variants were never built (or failed, with ``retry_failed``)."""
+    status = StoredFile.media_status.is_(None)
+    if retry_failed:
+        status = db.or_(status, StoredFile.media_status == "failed")
+    extensions = IMAGE_EXTENSIONS | PREVIEW_EXTENSIONS
+    return [
+        sha256 for sha256, path in db.session.execute(db.select(StoredFile.sha256, StoredFile.path).where(status))
+        if os.path.splitext(path)[1].lower() in extensions
+    ]
+
+
+# --- Reading ---
+
+def prefetch_media(urls):
+    """Load the variants behind ``urls`` in one query, so responsive_image needs none."""
+    wanted = {sha256 for sha256 in map(media_sha, urls) if sha256}
+    found = g.setdefault("media_manifests", {})
+    missing = []
+    for sha256 in wanted - found.keys():
+        manifest = _manifests.get(sha256)
+        if manifest is MISSING:
+            missing.append(sha256)
+        else:
+            found[sha256] = manifest
+    if not missing:
+        return
+    loaded = {sha256: [] for sha256 in missing}
+    rows = db.session.execute(
+        db.select(MediaVariant.sha256, MediaVariant.name, MediaVariant.path, MediaVariant.width, MediaVariant.height)
+        .where(MediaVariant.sha256.in_(missing))
+    )
+    for sha256, name, path, width, height in rows:
+        loaded[sha256].append((width, height, name, f"{url_prefix()}/{path}"))
+    for sha256, variants in loaded.items():
+        manifest = found[sha256] = tuple(sorted(variants))
+        _manifests.set(sha256, manifest, None if manifest else PENDING_TTL)
+
+
+def _manifest(url):
+    sha256 = media_sha(url)
+    if sha256 is None:
+        return None
+    manifest = g.get("media_manifests", {}).get(sha256)
+    if manifest is None:
+        manifest = _manifests.get(sha256)
+    return None if manifest is MISSING else manifest
+
+
+def responsive_image(url, alt="", sizes="100vw", **attrs):
+    """<img> for an uploaded image or a PDF's preview, with srcset once variants exist.
+
+    Returns an empty string for files that are not images and have no
+    preview (yet). Extra keyword arguments become attributes; use
+    ``class_`` for class.
+    """
+    if not url:
+        return Markup("")
+    url = public_url(url)
+    manifest = _manifest(url)
+    is_pdf = os.path.splitext(url)[1].lower() in PREVIEW_EXTENSIONS
+    attrs = {key.rstrip("_"): value for key, value in attrs.items()}
+    attrs.update(alt=alt, loading="lazy", decoding="async")
+    if manifest:
+        largest = manifest[-1]
+        attrs.update(
+            src=next((v[3] for v in manifest if v[0] >= 640), largest[3]),
+            srcset=", ".join(f"{v[3]} {v[0]}w" for v in manifest),
+            sizes=sizes,
+            width=largest[0],
+            height=largest[1],
+        )
+    elif is_pdf or os.path.splitext(url)[1].lower() not in IMAGE_EXTENSIONS | {".gif"}:
+        return Markup("")
+    else:
+        attrs["src"] = url
+    return Markup("<img {}>".format(" ".join(f'{key}="{escape(value)}"' for key, value in attrs.items())))
+
+
+def init_media(app):
+    for name, listener in (("before_commit", _queue_new_blobs), ("after_rollback", _forget_new_blobs)):
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
+    app.add_template_global(responsive_image)
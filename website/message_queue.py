@@ -0,0 +1,135 @@
+import json
+import queue
+import socket
+import socketserver
+import threading
+from urllib.parse import urlparse
+
+import socketio
+from flask_socketio import SocketIO
+
+# Pluggable Socket.IO message queue.
+#
+# With SOCKETIO_MESSAGE_QUEUE set, every worker publishes emits to a shared
+# queue and relays what it receives to its own connected clients, so a
+# broadcast from any process reaches every socket behind the load balancer.
+# redis://, kafka://, zmq+ and amqp:// URLs use python-socketio's managers.
+# local:// is a stand-in that needs no external service:
+#
+#   local://             in-process hub, for tests running several servers
+#   local://host:port    TCP fan-out broker, see ``flask socketio-broker``
+
+
+class _Hub:
+    """In-process channel -> subscriber queues."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = {}
+
+    def subscribe(self, channel):
+        q = queue.Queue()
+        with self.lock:
+            self.channels.setdefault(channel, []).append(q)
+        return q
+
+    def publish(self, channel, payload):
+        with self.lock:
+            subscribers = list(self.channels.get(channel, ()))
+        for q in subscribers:
+            q.put(payload)
+
+
+hub = _Hub()
+
+
+class LocalManager(socketio.PubSubManager):
+    name = "local"
+
+    def __init__(self, url="local://", channel="flask-socketio", write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        parsed = urlparse(url)
+        self.address = (parsed.hostname, parsed.port) if parsed.hostname else None
+        self._sock = None
+        self._send_lock = threading.Lock()
+        # A write-only emitter never reads, so a queue of its own would only grow
+        self._inbox = None if self.address or write_only else hub.subscribe(channel)
+
+    def _connect(self, role):
+        sock = socket.create_connection(self.address)
+        sock.sendall((json.dumps({role: self.channel}) + "\n").encode())
+        return sock
+
+    def _publish(self, data):
+        payload = json.dumps(data)
+        if self.address is None:
+            hub.publish(self.channel, payload)
+            return
+        with self._send_lock:
+            if self._sock is None:
+                self._sock = self._connect("publish")
+            self._sock.sendall((payload + "\n").encode())
+
+    def _listen(self):
+        if self.address is None:
+            while True:
+                yield self._inbox.get()
+        with self._connect("subscribe").makefile("r", encoding="utf-8") as stream:
+            for line in stream:
+                yield line
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        hello = json.loads(self.rfile.readline() or "{}")
+        broker = self.server
+        if "subscribe" in hello:
+            channel = hello["subscribe"]
+            with broker.lock:
+                broker.subscribers.setdefault(channel, []).append(self.wfile)
+            try:
+                # Subscribers never send; block until they hang up
+                while self.rfile.readline():
+                    pass
+            finally:
+                with broker.lock:
+                    broker.subscribers[channel].remove(self.wfile)
+        elif "publish" in hello:
+            channel = hello["publish"]
+            for line in self.rfile:
+                # Written under the lock so lines from concurrent publishers never interleave
+                with broker.lock:
+                    for wfile in broker.subscribers.get(channel, ()):
+                        try:
+                            wfile.write(line)
+                            wfile.flush()
+                        except OSError:
+                            pass
+
+
+class Broker(socketserver.ThreadingTCPServer):
+    """Line-oriented fan-out broker backing local://host:port."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, _BrokerHandler)
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+
+# SocketIO.init_app keyword arguments for a configured queue URL
+def queue_options(url, channel, write_only=False):
+    if not url:
+        return {}
+    if url.startswith("local://"):
+        return {"client_manager": LocalManager(url, channel=channel, write_only=write_only)}
+    return {"message_queue": url, "channel": channel}
+
+
+# Write-only emitter for processes that serve no sockets (jobs, scripts)
+def external_emitter(url, channel="flask-socketio"):
+    if url.startswith("local://"):
+        return LocalManager(url, channel=channel, write_only=True)
+    return SocketIO(message_queue=url, channel=channel)
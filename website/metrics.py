@@ -0,0 +1,288 @@
+import hmac
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from flask import (
+    g, has_request_context, request, current_app, make_response, before_render_template, template_rendered,
+)
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request instrumentation.
+#
+# Every request records its latency, SQL statement count and time, and
+# template render time into an in-process registry, labelled by endpoint;
+# Socket.IO emits are counted by event. ``/admin/metrics`` serves the registry
+# in Prometheus text format. Numbers are per worker process, as with any
+# Prometheus client that is not in multiprocess mode, so scrape each worker.
+#
+# Admins can append ``?_profile=1`` to any URL to get a sampling profile of
+# that request (collapsed stacks, flamegraph.pl-compatible) instead of the page.
+
+PREFIX = "nexus"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+DESCRIPTIONS = {
+    "http_request_duration_seconds": ("histogram", "Request latency by endpoint."),
+    "http_requests_total": ("counter", "Requests by endpoint and status."),
+    "sql_queries_per_request": ("histogram", "SQL statements per request by endpoint."),
+    "sql_queries_total": ("counter", "SQL statements executed by endpoint."),
+    "sql_duration_seconds_total": ("counter", "Time spent in SQL by endpoint."),
+    "template_renders_total": ("counter", "Templates rendered."),
+    "template_render_seconds_total": ("counter", "Time spent rendering templates."),
+    "socketio_emits_total": ("counter", "Socket.IO emits by event."),
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.counters[name, labels] += value
+
+    def observe(self, name, labels, value, buckets):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[name, labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render(self):
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                ((key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self.histograms.items()),
+                key=lambda item: item[0],
+            )
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, text = DESCRIPTIONS.get(name, ("untyped", ""))
+                lines.append(f"# HELP {PREFIX}_{name} {text}")
+                lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{PREFIX}_{name}{_labels(labels)} {value:g}")
+        for (name, labels), counts, total, count, buckets in histograms:
+            describe(name)
+            running = 0
+            for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                running += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{PREFIX}_{name}_bucket{_labels(labels + (('le', le),))} {running}")
+            lines.append(f"{PREFIX}_{name}_sum{_labels(labels)} {total:g}")
+            lines.append(f"{PREFIX}_{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+registry = Registry()
+
+
+class RequestStats:
+    __slots__ = ("started", "status", "queries", "sql_time", "statements", "profiler")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.status = 500
+        self.queries = 0
+        self.sql_time = 0.0
+        # Statement text -> executions; only collected when website.query_budget is on
+        self.statements = None
+        self.profiler = None
+
+
+def request_stats():
+    """Stats for the current request, or None outside one (CLI, background tasks)."""
+    return g.get("_request_stats") if has_request_context() else None
+
+
+# --- Sampling profiler ---
+
+class SamplingProfiler:
+    """Samples one thread's stack every ``interval`` seconds from a helper thread.
+
+    Works for threaded workers; under eventlet/gevent every green thread
+    shares one OS thread, so samples include whatever else was running.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self.thread_id = None
+        self.stopped = threading.Event()
+        self.sampler = None
+        self.started = self.elapsed = 0.0
+
+    def start(self):
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.sampler = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self.sampler.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.sampler.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def report(self, limit=200):
+        total = sum(self.samples.values())
+        lines = [
+            f"# {request.method} {request.full_path.rstrip('?')}",
+            f"# {self.elapsed * 1000:.1f} ms wall, {total} samples every {self.interval * 1000:g} ms",
+            "# collapsed stacks (pipe into flamegraph.pl), most frequent first",
+        ]
+        lines.extend(f"{stack} {count}" for stack, count in self.samples.most_common(limit))
+        return "\n".join(lines) + "\n"
+
+
+# --- Hooks ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = request_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_time += time.perf_counter() - conn.info.pop("query_started", time.perf_counter())
+        if stats.statements is not None:
+            stats.statements[statement] += 1
+
+
+def _before_render(app, template, context, **extra):
+    g.setdefault("_template_started", []).append(time.perf_counter())
+
+
+def _rendered(app, template, context, **extra):
+    started = g.get("_template_started")
+    if started:
+        name = template.name or "<string>"
+        registry.inc("template_renders_total", (("template", name),))
+        registry.inc("template_render_seconds_total", (("template", name),), time.perf_counter() - started.pop())
+
+
+def _count_emits(socketio):
+    emit = socketio.emit
+    if getattr(emit, "counted", False):
+        return
+
+    def counted_emit(event_name, *args, **kwargs):
+        registry.inc("socketio_emits_total", (("event", event_name),))
+        return emit(event_name, *args, **kwargs)
+
+    counted_emit.counted = True
+    socketio.emit = counted_emit
+
+
+def _start_request():
+    stats = g._request_stats = RequestStats()
+    if request.args.get("_profile") and current_user.is_authenticated and current_user.role == "admin":
+        stats.profiler = SamplingProfiler(current_app.config.get("PROFILE_INTERVAL_MS", 5) / 1000)
+        stats.profiler.start()
+
+
+def _finish_request(response):
+    stats = request_stats()
+    if stats is None:
+        return response
+    stats.status = response.status_code
+    if stats.profiler is not None:
+        stats.profiler.stop()
+        response = make_response(stats.profiler.report(), 200, {"Content-Type": "text/plain; charset=utf-8"})
+        response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+def _record_request(exc):
+    stats = request_stats()
+    if stats is None:
+        return
+    endpoint = request.endpoint or "<unmatched>"
+    labels = (("endpoint", endpoint), ("method", request.method))
+    registry.observe("http_request_duration_seconds", labels, time.perf_counter() - stats.started, LATENCY_BUCKETS)
+    registry.inc("http_requests_total", labels + (("status", stats.status),))
+    by_endpoint = (("endpoint", endpoint),)
+    registry.observe("sql_queries_per_request", by_endpoint, stats.queries, QUERY_BUCKETS)
+    registry.inc("sql_queries_total", by_endpoint, stats.queries)
+    registry.inc("sql_duration_seconds_total", by_endpoint, stats.sql_time)
+
+
+def init_metrics(app, socketio):
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    for name, listener in (
+        ("before_cursor_execute", _before_cursor_execute),
+        ("after_cursor_execute", _after_cursor_execute),
+    ):
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    _count_emits(socketio)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_record_request)
+
+
+def scrape_allowed():
+    """Admins, or a scraper presenting METRICS_TOKEN as a bearer token."""
+    token = current_app.config.get("METRICS_TOKEN")
+    auth = request.headers.get("Authorization", "")
+    if token and auth.startswith("Bearer ") and hmac.compare_digest(auth[7:], token):
+        return True
+    return current_user.is_authenticated and current_user.role == "admin"
@@ -0,0 +1,302 @@
+from datetime import datetime
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+
+from website.models import (
+    db, User, Post, Result, StoredFile, ChunkedUpload, StudentDashboard, Attendance, AttendanceSummary,
+    Section, SectionPeriod, TimetableEntry, MediaVariant, Job, EventWaitlist, Counter, AnnouncementChange,
+    AnnouncementRead,
+)
+from website.passwords import hasher
+from website.attendance import rebuild_summaries
+from website.cache import cache
+from website.timetable import NAMESPACE as TIMETABLE, parse_day
+from website.search import create_search_index, rebuild_index
+from website.rsvp import reconcile_counts
+from website.notifications import backfill_changes
+
+# Schema migrations.
+#
+# Each migration is a numbered function that moves the schema one step and
+# is recorded in schema_migrations once it commits. A brand-new database
+# skips the history: it is created from the current models and stamped at
+# the head. A database created before migrations existed (tables, but no
+# schema_migrations) is stamped at BASELINE, the original schema, and brought
+# forward from there, so migrations after it must tolerate either shape.
+# A migration sees the schema as of its version, not the current models: it
+# reads rows with Core selects of the columns it knows exist (never
+# Model.query), and the helpers it calls must not commit on their own.
+#
+#     flask db-upgrade            apply everything pending
+#     flask db-status             current vs head
+#
+# With DATABASE_AUTO_MIGRATE=1 (the default) create_app upgrades on start;
+# multi-worker deployments should turn that off and run db-upgrade once per
+# release instead.
+
+BASELINE = 1
+
+MIGRATIONS = {}
+
+_meta = db.MetaData()
+schema_migrations = db.Table(
+    "schema_migrations",
+    _meta,
+    db.Column("version", db.Integer, primary_key=True),
+    db.Column("name", db.String(255), nullable=False),
+    db.Column("applied_at", db.DateTime, nullable=False),
+)
+
+
+def migration(version, name):
+    def register(fn):
+        MIGRATIONS[version] = (name, fn)
+        return fn
+    return register
+
+
+def head():
+    return max(MIGRATIONS)
+
+
+def current_version():
+    if not inspect(db.engine).has_table("schema_migrations"):
+        return None
+    return db.session.scalar(db.select(db.func.max(schema_migrations.c.version)))
+
+
+def _record(*versions):
+    db.session.execute(schema_migrations.insert(), [
+        {"version": version, "name": MIGRATIONS[version][0], "applied_at": datetime.utcnow()}
+        for version in versions
+    ])
+
+
+# --- Helpers for migrations ---
+
+def add_column(table, column):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there."""
+    conn = db.session.connection()
+    if column.name in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return
+    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {ddl}")
+
+
+def create_table(model):
+    model.__table__.create(db.session.connection(), checkfirst=True)
+
+
+def create_index(name, table, *columns, **kw):
+    """CREATE INDEX unless it exists, spelled out rather than taken from the models.
+
+    ``kw`` is passed to db.Index (unique, sqlite_where, postgresql_where).
+    """
+    target = db.Table(table, db.MetaData(), *(db.Column(column) for column in columns))
+    db.Index(name, *target.c, **kw).create(db.session.connection(), checkfirst=True)
+
+
+# --- Runner ---
+
+def _bootstrap():
+    db.create_all()
+    schema_migrations.create(db.engine)
+    create_search_index(db.engine)
+    db.session.add(User(
+        name="Admin",
+        username="admin",
+        email="admin@teamnexus.com",
+        password_hash=hasher.hash("admin123"),
+        role="admin",
+    ))
+    _record(*sorted(MIGRATIONS))
+    db.session.commit()
+    print("Default Admin User Created : admin : admin123")
+
+
+def upgrade(target=None):
+    """Apply pending migrations up to ``target`` (default: head); returns the versions applied."""
+    target = head() if target is None else target
+    inspector = inspect(db.engine)
+    if not inspector.has_table("schema_migrations"):
+        if not inspector.has_table("users"):
+            _bootstrap()
+            return sorted(MIGRATIONS)
+        schema_migrations.create(db.engine)
+        _record(BASELINE)
+        db.session.commit()
+    current = current_version()
+    applied = []
+    for version in sorted(MIGRATIONS):
+        if current < version <= target:
+            name, fn = MIGRATIONS[version]
+            try:
+                fn()
+                _record(version)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            applied.append(version)
+    return applied
+
+
+# --- Migrations ---
+
+@migration(1, "initial schema")
+def initial_schema():
+    """Recorded, never run: databases arrive here via _bootstrap or the BASELINE stamp."""
+
+
+@migration(2, "denormalized post counters")
+def post_counters():
+    add_column("posts", db.Column("like_count", db.Integer, nullable=False, server_default="0"))
+    add_column("posts", db.Column("comment_count", db.Integer, nullable=False, server_default="0"))
+    db.session.flush()
+    Post.reconcile_counters(commit=False)
+
+
+@migration(3, "full-text search index")
+def search_index():
+    create_search_index(db.session.connection())
+    rebuild_index(commit=False)
+
+
+@migration(4, "content-addressed upload storage")
+def upload_storage():
+    create_table(StoredFile)
+    create_table(ChunkedUpload)
+
+
+@migration(5, "result totals and one result per student semester")
+def result_totals():
+    add_column("results", db.Column("total_credits", db.Float, nullable=True))
+    add_column("results", db.Column("credit_points", db.Float, nullable=True))
+    add_column("results", db.Column("details_digest", db.String(40), nullable=True))
+    # Keep the newest of any duplicate marksheets before enforcing uniqueness
+    newest = db.select(db.func.max(Result.id)).group_by(Result.student_id, Result.semester)
+    db.session.execute(db.delete(Result).where(Result.id.not_in(newest)))
+    db.session.connection().exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS _student_semester_uc ON results (student_id, semester)"
+    )
+
+
+@migration(6, "indexes for hot blueprint queries")
+def hot_query_indexes():
+    # The indexes the models declared at this version; later ones come with their own migration
+    create_index("ix_notes_semester_subject", "notes", "semester", "subject", "uploaded_at")
+    create_index("ix_notes_uploaded_at", "notes", "uploaded_at")
+    create_index("ix_announcement_tags_tag", "announcement_tags", "tag_id", "announcement_id")
+    create_index("ix_announcements_pinned_posted", "announcements", "is_pinned", "posted_at")
+    create_index("ix_announcements_category_pinned_posted", "announcements", "category", "is_pinned", "posted_at")
+    create_index("ix_events_start_time", "events", "start_time")
+    create_index("ix_event_rsvps_user", "event_rsvps", "user_id", "event_id")
+    create_index("ix_post_tags_tag", "post_tags", "tag_id", "post_id")
+    create_index(
+        "ix_posts_live_created", "posts", "created_at", "id",
+        sqlite_where=db.text("is_deleted = 0"), postgresql_where=db.text("is_deleted = false"),
+    )
+    create_index("ix_comments_post_created", "comments", "post_id", "created_at")
+    create_index("ix_likes_post", "likes", "post_id")
+    create_index("ix_reports_created_at", "reports", "created_at")
+    create_index("ix_attendance_student_date", "attendance", "student_id", "date")
+    create_index("ix_timetable_student_day", "timetable_entries", "student_id", "day")
+
+
+@migration(7, "materialized student dashboards")
+def student_dashboards():
+    # Rows are built on first view
+    create_table(StudentDashboard)
+
+
+@migration(8, "attendance subjects and running summaries")
+def attendance_summaries():
+    add_column("attendance", db.Column("subject", db.String(120), nullable=False, server_default=""))
+    # One mark per student, day and subject; keep the latest of any duplicates
+    newest = db.select(db.func.max(Attendance.id)).group_by(
+        Attendance.student_id, Attendance.date, Attendance.subject
+    )
+    db.session.execute(db.delete(Attendance).where(Attendance.id.not_in(newest)))
+    conn = db.session.connection()
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_attendance_student_date")
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS _student_date_subject_uc ON attendance (student_id, date, subject)"
+    )
+    create_table(AttendanceSummary)
+    rebuild_summaries(commit=False)
+
+
+@migration(9, "section timetables")
+def section_timetables():
+    create_table(Section)
+    create_table(SectionPeriod)
+    add_column("users", db.Column("section_id", db.Integer, db.ForeignKey("sections.id"), nullable=True))
+    create_index("ix_users_section_id", "users", "section_id")
+
+    # Students whose timetables are identical become one section; entries
+    # with an unreadable day, and timetables nobody shares, stay personal
+    timetables = {}
+    entries = TimetableEntry.__table__.c
+    for entry in db.session.execute(db.select(
+        entries.id, entries.student_id, entries.day, entries.period, entries.subject,
+        entries.start_time, entries.end_time, entries.location,
+    )):
+        weekday = parse_day(entry.day)
+        if weekday is not None:
+            period = (weekday, entry.period, entry.subject, entry.start_time, entry.end_time, entry.location)
+            timetables.setdefault(entry.student_id, {}).setdefault(period, []).append(entry.id)
+    groups = {}
+    for student_id, periods in timetables.items():
+        groups.setdefault(frozenset(periods), []).append(student_id)
+    shared = [(periods, students) for periods, students in groups.items() if len(students) > 1]
+    for number, (periods, students) in enumerate(sorted(shared, key=lambda group: min(group[1])), 1):
+        section = Section(name=f"Section {number}", periods=[
+            SectionPeriod(weekday=weekday, period=period, subject=subject, start_time=start,
+                          end_time=end, location=location)
+            for weekday, period, subject, start, end, location in periods
+        ])
+        db.session.add(section)
+        db.session.flush()
+        for start in range(0, len(students), 500):
+            batch = students[start:start + 500]
+            db.session.execute(db.update(User).where(User.id.in_(batch)).values(section_id=section.id))
+            moved = [entry_id for student_id in batch for ids in timetables[student_id].values() for entry_id in ids]
+            db.session.execute(db.delete(TimetableEntry).where(TimetableEntry.id.in_(moved)))
+    cache.invalidate(TIMETABLE)
+
+
+@migration(10, "responsive media variants")
+def media_variants():
+    # Existing uploads are picked up by `flask media-backfill`
+    add_column("stored_files", db.Column("media_status", db.String(10), nullable=True))
+    create_table(MediaVariant)
+
+
+@migration(11, "background job queue")
+def job_queue():
+    create_table(Job)
+
+
+@migration(12, "event capacity and waitlist")
+def event_capacity():
+    add_column("events", db.Column("capacity", db.Integer, nullable=True))
+    add_column("events", db.Column("rsvp_count", db.Integer, nullable=False, server_default="0"))
+    add_column("events", db.Column("waitlist_count", db.Integer, nullable=False, server_default="0"))
+    create_table(EventWaitlist)
+    reconcile_counts(commit=False)
+
+
+@migration(13, "announcement sync and unread counts")
+def announcement_sync():
+    # Read cursors are created on first read; until then everything is unread
+    create_table(Counter)
+    create_table(AnnouncementChange)
+    create_table(AnnouncementRead)
+    backfill_changes(commit=False)
+
+
+@migration(14, "revocable calendar feeds")
+def calendar_feeds():
+    # Tokens issued before this still verify as version 0, until the user resets them
+    add_column("users", db.Column("calendar_version", db.Integer, nullable=False, server_default="0"))
@@ -5,6 +5,19 @@ from datetime import datetime
 db = SQLAlchemy()
 
 
+# Helper: dialect-aware INSERT supporting ON CONFLICT clauses
+def dialect_insert(table):
+    if db.session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+# Roles that sit exams, take attendance and follow a section timetable ("cr": class representative)
+STUDENT_ROLES = ("student", "cr")
+
+
 class User(UserMixin, db.Model):
     __tablename__ = "users"
     id = db.Column(db.Integer, primary_key=True)
@@ -16,6 +29,10 @@ class User(UserMixin, db.Model):
 
     role = db.Column(db.String(20), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Students: the class section whose weekly timetable they follow
+    section_id = db.Column(db.Integer, db.ForeignKey("sections.id"), nullable=True, index=True)
+    # Calendar feeds (website.ical): feed tokens carry the version, so bumping it revokes them
+    calendar_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     posts = db.relationship("Post", backref="author", lazy=True)
     comments = db.relationship("Comment", backref="author", lazy=True)
@@ -55,6 +72,13 @@ class Result(db.Model):
     details = db.Column(db.JSON, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Maintained by website.results: credit-weighted totals and a digest of
+    # the details they were computed from, so unchanged rows are skipped
+    total_credits = db.Column(db.Float, nullable=True)
+    credit_points = db.Column(db.Float, nullable=True)
+    details_digest = db.Column(db.String(40), nullable=True)
+    __table_args__ = (db.UniqueConstraint("student_id", "semester", name="_student_semester_uc"),)
+
 
 class Note(db.Model):
     __tablename__ = "notes"
@@ -70,12 +94,17 @@ class Note(db.Model):
 
     uploaded_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index("ix_notes_semester_subject", "semester", "subject", "uploaded_at"),
+        db.Index("ix_notes_uploaded_at", "uploaded_at"),
+    )
 
 
 announcement_tags = db.Table(
     'announcement_tags',
     db.Column('announcement_id', db.Integer, db.ForeignKey('announcements.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True)
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True),
+    db.Index('ix_announcement_tags_tag', 'tag_id', 'announcement_id'),
 )
 
 class Tag(db.Model):
@@ -96,6 +125,44 @@ class Announcement(db.Model):
     is_pinned = db.Column(db.Boolean, default=False)
 
     tags = db.relationship('Tag', secondary=announcement_tags, backref=db.backref('announcements', lazy='dynamic'))
+    __table_args__ = (
+        db.Index("ix_announcements_pinned_posted", "is_pinned", "posted_at"),
+        db.Index("ix_announcements_category_pinned_posted", "category", "is_pinned", "posted_at"),
+    )
+
+
+# Named monotonic counters, advanced with one upsert (see website.notifications.next_value)
+class Counter(db.Model):
+    __tablename__ = "counters"
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Latest change to each announcement, kept after a delete as a tombstone so
+# delta syncs (website.notifications) can report it
+class AnnouncementChange(db.Model):
+    __tablename__ = "announcement_changes"
+
+    announcement_id = db.Column(db.Integer, primary_key=True)
+    seq = db.Column(db.Integer, nullable=False)
+    # Sequence number of its creation; readers whose cursor is below it have it unread
+    created_seq = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index("ix_announcement_changes_seq", "seq", unique=True),
+        db.Index("ix_announcement_changes_live", "deleted", "created_seq"),
+    )
+
+
+# Per-user announcement read cursor: the change number they last read up to
+class AnnouncementRead(db.Model):
+    __tablename__ = "announcement_reads"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    cursor = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 class Event(db.Model):
@@ -119,15 +186,32 @@ class Event(db.Model):
     posted_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     posted_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Seats: None means unlimited. The counters are kept in step by website.rsvp,
+    # so register attendees through it rather than through the relationship
+    capacity = db.Column(db.Integer, nullable=True)
+    rsvp_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    waitlist_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
     rsvps = db.relationship('User', secondary='event_rsvps', backref='events_rsvped', lazy='dynamic')
+    __table_args__ = (db.Index("ix_events_start_time", "start_time"),)
 
 # RSVP join table
 event_rsvps = db.Table(
     'event_rsvps',
     db.Column('event_id', db.Integer, db.ForeignKey('events.id'), primary_key=True),
-    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
+    db.Index('ix_event_rsvps_user', 'user_id', 'event_id'),
 )
 
+# Waitlist for a full event, promoted first come first served
+class EventWaitlist(db.Model):
+    __tablename__ = "event_waitlist"
+
+    event_id = db.Column(db.Integer, db.ForeignKey("events.id"), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    __table_args__ = (db.Index("ix_event_waitlist_queue", "event_id", "created_at", "user_id"),)
+
 
 class Feedback(db.Model):
     __tablename__ = "feedbacks"
@@ -146,7 +230,8 @@ class Feedback(db.Model):
 post_tags = db.Table(
     'post_tags',
     db.Column('post_id', db.Integer, db.ForeignKey('posts.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True)
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True),
+    db.Index('ix_post_tags_tag', 'tag_id', 'post_id'),
 )
 
 class Post(db.Model):
@@ -162,11 +247,56 @@ class Post(db.Model):
     is_deleted = db.Column(db.Boolean, default=False)
     is_reported = db.Column(db.Boolean, default=False)
 
+    # Denormalized counters, kept in step by Like.toggle / Post.bump_comment_count
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
     tags = db.relationship('Tag', secondary=post_tags, backref=db.backref('posts', lazy='dynamic'))
     comments = db.relationship("Comment", backref="post", lazy=True, cascade="all, delete-orphan")
     likes = db.relationship("Like", backref="post", lazy=True, cascade="all, delete-orphan")
     reports = db.relationship("Report", backref="post", lazy=True, cascade="all, delete-orphan")
 
+    # Partial: the feed only ever reads live posts, newest first
+    __table_args__ = (
+        db.Index(
+            "ix_posts_live_created", "created_at", "id",
+            sqlite_where=db.text("is_deleted = 0"),
+            postgresql_where=db.text("is_deleted = false"),
+        ),
+    )
+
+    @classmethod
+    def bump_comment_count(cls, post_id, delta):
+        db.session.execute(
+            db.update(cls).where(cls.id == post_id).values(comment_count=cls.comment_count + delta)
+        )
+
+    @classmethod
+    def reconcile_counters(cls, dry_run=False, commit=True):
+        """Recompute like/comment counters from the source rows; returns the number of drifted posts.
+
+        Migration 2 passes ``commit=False`` so the recount commits with it.
+        """
+        actual_likes = (
+            db.select(db.func.count(Like.id)).where(Like.post_id == cls.id).scalar_subquery()
+        )
+        actual_comments = (
+            db.select(db.func.count(Comment.id))
+            .where(Comment.post_id == cls.id, Comment.is_deleted == False)
+            .scalar_subquery()
+        )
+        drifted = db.session.scalar(
+            db.select(db.func.count(cls.id)).where(
+                (cls.like_count != actual_likes) | (cls.comment_count != actual_comments)
+            )
+        )
+        if not dry_run and drifted:
+            db.session.execute(
+                db.update(cls).values(like_count=actual_likes, comment_count=actual_comments)
+            )
+            if commit:
+                db.session.commit()
+        return drifted
 
 
 class Comment(db.Model):
@@ -181,6 +311,7 @@ class Comment(db.Model):
     is_deleted = db.Column(db.Boolean, default=False)
     is_reported = db.Column(db.Boolean, default=False)
     reports = db.relationship("Report", backref="comment", lazy=True, cascade="all, delete-orphan")
+    __table_args__ = (db.Index("ix_comments_post_created", "post_id", "created_at"),)
 
 # Like/Upvote system: one like per user per post
 class Like(db.Model):
@@ -189,7 +320,45 @@ class Like(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    __table_args__ = (db.UniqueConstraint('user_id', 'post_id', name='_user_post_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'post_id', name='_user_post_uc'),
+        db.Index('ix_likes_post', 'post_id'),
+    )
+
+    @classmethod
+    def toggle(cls, user_id, post_id, action=None):
+        """Like, unlike or toggle without a read-then-write race.
+
+        The insert leans on _user_post_uc: a conflict means the like already
+        exists. ``action`` pins the outcome ("like"/"unlike") so retries are
+        idempotent; ``None`` flips the current state. Returns ``(liked, count)``
+        or ``None`` if the post does not exist. The caller commits.
+        """
+        delta = 0
+        liked = True
+        if action != "unlike":
+            inserted = db.session.execute(
+                dialect_insert(cls.__table__)
+                .values(user_id=user_id, post_id=post_id, created_at=datetime.utcnow())
+                .on_conflict_do_nothing(index_elements=["user_id", "post_id"])
+            )
+            delta = inserted.rowcount
+        if delta == 0 and action != "like":
+            deleted = db.session.execute(
+                db.delete(cls).where(cls.user_id == user_id, cls.post_id == post_id)
+            )
+            delta = -deleted.rowcount
+            liked = False
+        count = db.session.execute(
+            db.update(Post)
+            .where(Post.id == post_id)
+            .values(like_count=Post.like_count + delta)
+            .returning(Post.like_count)
+        ).scalar()
+        if count is None:
+            db.session.rollback()
+            return None
+        return liked, count
 
 # Report system for moderation
 class Report(db.Model):
@@ -201,6 +370,7 @@ class Report(db.Model):
     reason = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_resolved = db.Column(db.Boolean, default=False)
+    __table_args__ = (db.Index("ix_reports_created_at", "created_at"),)
 
 
 class Attendance(db.Model):
@@ -209,12 +379,71 @@ class Attendance(db.Model):
     student_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
 
     date = db.Column(db.Date, nullable=False)
+    # "" for attendance marked before subjects were recorded
+    subject = db.Column(db.String(120), nullable=False, default="", server_default="")
     status = db.Column(db.String(20), nullable=False)
 
     marked_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     marked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Also serves per-student date range lookups
+    __table_args__ = (db.UniqueConstraint("student_id", "date", "subject", name="_student_date_subject_uc"),)
+
+
+# Running attendance totals per student and subject, maintained by website.attendance
+class AttendanceSummary(db.Model):
+    __tablename__ = "attendance_summaries"
+
+    student_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    subject = db.Column(db.String(120), primary_key=True)
+
+    total = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    attended = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index("ix_attendance_summaries_subject", "subject", "student_id"),)
+
+
+# A class group sharing one weekly timetable, compiled by website.timetable
+class Section(db.Model):
+    __tablename__ = "sections"
 
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(60), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    students = db.relationship("User", backref="section", lazy=True)
+    periods = db.relationship(
+        "SectionPeriod", backref="section", lazy=True, cascade="all, delete-orphan",
+        order_by="(SectionPeriod.weekday, SectionPeriod.start_time)",
+    )
+
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+class SectionPeriod(db.Model):
+    __tablename__ = "section_periods"
+
+    id = db.Column(db.Integer, primary_key=True)
 
+    section_id = db.Column(db.Integer, db.ForeignKey("sections.id"), nullable=False)
+    weekday = db.Column(db.Integer, nullable=False)  # 0 = Monday
+    period = db.Column(db.String(20), nullable=False)
+
+    subject = db.Column(db.String(120), nullable=False)
+    start_time = db.Column(db.Time, nullable=False)
+
+    end_time = db.Column(db.Time, nullable=False)
+    location = db.Column(db.String(120), nullable=True)
+
+    teacher_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    __table_args__ = (db.Index("ix_section_periods_section_day", "section_id", "weekday", "start_time"),)
+
+    @property
+    def day(self):
+        return WEEKDAYS[self.weekday]
+
+
+# Personal additions (electives, labs) on top of the student's section timetable
 class TimetableEntry(db.Model):
     __tablename__ = "timetable_entries"
 
@@ -231,3 +460,91 @@ class TimetableEntry(db.Model):
     location = db.Column(db.String(120), nullable=True)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index("ix_timetable_student_day", "student_id", "day"),)
+
+
+# Materialized student dashboard, maintained by website.dashboard
+class StudentDashboard(db.Model):
+    __tablename__ = "student_dashboards"
+
+    student_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    # Bumped whenever a section is marked stale; rebuilds only store against the version they read
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    # Running attendance totals, adjusted in place as rows are marked
+    attendance_total = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    attendance_attended = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    # Rebuilt on read when NULL (stale)
+    timetable = db.Column(db.JSON, nullable=True)
+    results = db.Column(db.JSON, nullable=True)
+    events = db.Column(db.JSON, nullable=True)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# Content-addressed upload storage: one row per distinct file body
+class StoredFile(db.Model):
+    __tablename__ = "stored_files"
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+
+    # Number of Post/Note/Announcement/Event rows pointing at this file
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Responsive variants, see website.media: None (not built, or not media), "ready" or "failed"
+    media_status = db.Column(db.String(10), nullable=True)
+
+    variants = db.relationship("MediaVariant", backref="blob", lazy=True, cascade="all, delete-orphan")
+
+
+# A resized copy of a stored image, or the rendered first page of a PDF
+class MediaVariant(db.Model):
+    __tablename__ = "media_variants"
+
+    sha256 = db.Column(db.String(64), db.ForeignKey("stored_files.sha256"), primary_key=True)
+    name = db.Column(db.String(20), primary_key=True)  # "w320", "w640", ..., "original", "preview"
+
+    path = db.Column(db.String(255), nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Resumable chunked upload in progress
+class ChunkedUpload(db.Model):
+    __tablename__ = "chunked_uploads"
+
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+
+    sha256 = db.Column(db.String(64), db.ForeignKey("stored_files.sha256"), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Background job queued by website.tasks; runs once the enqueuing transaction commits
+class Job(db.Model):
+    __tablename__ = "jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+
+    # "queued" (waiting for run_at), "running" (leased to locked_by) or "failed"; done jobs are deleted
+    status = db.Column(db.String(10), nullable=False, default="queued")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=4)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(64), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (db.Index("ix_jobs_status_run_at", "status", "run_at"),)
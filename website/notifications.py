@@ -0,0 +1,245 @@
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from website.models import db, dialect_insert, Announcement, AnnouncementChange, AnnouncementRead, Counter
+from website.socketio_events import ANNOUNCEMENTS_ROOM, emit_after_commit
+
+# Announcement notifications: delta sync, unread counts and live pushes.
+#
+# Every create, edit and delete of an announcement takes the next number of
+# the "announcements" counter and stores it as the announcement's seq in
+# announcement_changes (one row per announcement; a deleted one stays as a
+# tombstone). A client syncs with the last number it saw:
+#
+#     GET /announcements/since?cursor=41   changed and deleted since change 41
+#
+# which is one range read on the seq index however long the list is. The
+# counter row is advanced with an upsert that holds its row lock until the
+# writer commits, so numbers become visible in order and a cursor never
+# skips a change.
+#
+# Each user has a read cursor in announcement_reads (none yet means nothing
+# read). Their unread count is the live announcements created after it,
+# counted on the (deleted, created_seq) index: a range as long as the unread
+# tail, with no per-reader bookkeeping when an announcement is posted or
+# deleted. Reading moves the cursor, and only writes when it is behind.
+#
+# The ORM hooks below number changes in the writer's transaction and queue
+# an "announcement" broadcast to ANNOUNCEMENTS_ROOM for after the commit.
+# Core bulk inserts skip them; run backfill_changes() afterwards, as the
+# seeder does.
+
+SEQUENCE = "announcements"
+
+Delta = namedtuple("Delta", "changed deleted cursor more reset")
+
+# Columns whose change is pushed to clients as an edit
+SYNCED_FIELDS = ("title", "content", "category", "file_url", "is_pinned", "tags")
+
+
+def next_value(conn, name, step=1):
+    """Advance counter ``name`` by ``step`` and return its new value (the first use starts at ``step``)."""
+    stmt = dialect_insert(Counter.__table__).values(name=name, value=step)
+    return conn.execute(
+        stmt.on_conflict_do_update(index_elements=["name"], set_={"value": Counter.__table__.c.value + step})
+        .returning(Counter.__table__.c.value)
+    ).scalar()
+
+
+def head():
+    """The latest change number (0 before the first)."""
+    return db.session.scalar(db.select(_head()))
+
+
+def _head():
+    return db.func.coalesce(db.select(Counter.value).where(Counter.name == SEQUENCE).scalar_subquery(), 0)
+
+
+def _cursor(user_id):
+    return db.func.coalesce(
+        db.select(AnnouncementRead.cursor).where(AnnouncementRead.user_id == user_id).scalar_subquery(), 0
+    )
+
+
+# --- Reading ---
+
+def changes_query(cursor, limit):
+    return (
+        db.select(AnnouncementChange.announcement_id, AnnouncementChange.seq, AnnouncementChange.deleted)
+        .where(AnnouncementChange.seq > cursor)
+        .order_by(AnnouncementChange.seq)
+        .limit(limit)
+    )
+
+
+def unread_query(user_id):
+    return (
+        db.select(db.func.count()).select_from(AnnouncementChange)
+        .where(AnnouncementChange.deleted.is_(False), AnnouncementChange.created_seq > _cursor(user_id))
+    )
+
+
+def changes_since(cursor, limit):
+    """Announcement changes after ``cursor``, oldest first, at most ``limit`` of them.
+
+    From cursor 0 (a first sync) tombstones are left out. ``reset`` is set
+    when the cursor is ahead of every change, i.e. it came from another
+    database; the client should drop its copy and sync from 0.
+    """
+    rows = db.session.execute(changes_query(cursor, limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    live = [row.announcement_id for row in rows if not row.deleted]
+    loaded = {}
+    if live:
+        loaded = {
+            announcement.id: announcement
+            for announcement in Announcement.query.options(
+                joinedload(Announcement.poster), selectinload(Announcement.tags)
+            ).filter(Announcement.id.in_(live))
+        }
+    # A row deleted since the first read shows up as a tombstone on the next sync
+    changed = [loaded[announcement_id] for announcement_id in live if announcement_id in loaded]
+    deleted = [row.announcement_id for row in rows if row.deleted] if cursor else []
+    if rows:
+        return Delta(changed, deleted, rows[-1].seq, more, False)
+    return Delta([], [], cursor, False, bool(cursor) and cursor > head())
+
+
+def unread_count(user_id):
+    """Live announcements created after ``user_id``'s read cursor; one query, no writes."""
+    return db.session.scalar(unread_query(user_id))
+
+
+def is_behind(user_id):
+    """Whether anything changed since ``user_id`` last read the list; one query."""
+    return db.session.scalar(db.select(_cursor(user_id) < _head()))
+
+
+def mark_read(user_id, cursor=None):
+    """Mark announcements up to change ``cursor`` (default: all of them) read.
+
+    A cursor behind the stored one is ignored, so a stale device cannot
+    unread anything. The caller commits.
+    """
+    position = _head()
+    if cursor is not None:
+        position = db.case((position < cursor, position), else_=cursor)
+    table = AnnouncementRead.__table__
+    stmt = dialect_insert(table).values(user_id=user_id, cursor=position, updated_at=datetime.utcnow())
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={"cursor": stmt.excluded.cursor, "updated_at": stmt.excluded.updated_at},
+        where=table.c.cursor < stmt.excluded.cursor,
+    ))
+
+
+# --- Maintenance ---
+
+def backfill_changes(commit=True):
+    """Give announcements inserted without the ORM (or before this existed) a change row; returns how many.
+
+    Migration 13 passes ``commit=False`` so the backfill commits with it.
+    """
+    missing = db.session.scalars(
+        db.select(Announcement.id)
+        .where(~db.select(AnnouncementChange.announcement_id)
+               .where(AnnouncementChange.announcement_id == Announcement.id).exists())
+        .order_by(Announcement.posted_at, Announcement.id)
+    ).all()
+    if missing:
+        conn = db.session.connection()
+        last = next_value(conn, SEQUENCE, len(missing))
+        first = last - len(missing) + 1
+        now = datetime.utcnow()
+        conn.execute(db.insert(AnnouncementChange), [
+            {"announcement_id": announcement_id, "seq": seq, "created_seq": seq, "deleted": False, "changed_at": now}
+            for seq, announcement_id in enumerate(missing, first)
+        ])
+        if commit:
+            db.session.commit()
+    return len(missing)
+
+
+# --- Hooks: number changes in the writer's transaction, push after the commit ---
+
+def _synced_changes(obj):
+    attrs = inspect(obj).attrs
+    return [name for name in SYNCED_FIELDS if attrs[name].history.has_changes()]
+
+
+def _record_changes(session, flush_context):
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Announcement):
+            changes.append((obj, "created"))
+    for obj in session.dirty:
+        if isinstance(obj, Announcement):
+            changed = _synced_changes(obj)
+            if changed == ["is_pinned"]:
+                changes.append((obj, "pinned" if obj.is_pinned else "unpinned"))
+            elif changed:
+                changes.append((obj, "edited"))
+    for obj in session.deleted:
+        if isinstance(obj, Announcement):
+            changes.append((obj, "deleted"))
+    if not changes:
+        return
+
+    conn = session.connection()
+    table = AnnouncementChange.__table__
+    last = next_value(conn, SEQUENCE, len(changes))
+    now = datetime.utcnow()
+    pushes = session.info.setdefault("announcement_pushes", [])
+    for seq, (obj, kind) in enumerate(changes, last - len(changes) + 1):
+        if kind == "created":
+            conn.execute(db.insert(table).values(
+                announcement_id=obj.id, seq=seq, created_seq=seq, deleted=False, changed_at=now
+            ))
+        else:
+            updated = conn.execute(
+                db.update(table).where(table.c.announcement_id == obj.id)
+                .values(seq=seq, deleted=kind == "deleted", changed_at=now)
+            ).rowcount
+            if not updated:
+                # Inserted without the ORM and not backfilled yet
+                conn.execute(db.insert(table).values(
+                    announcement_id=obj.id, seq=seq, created_seq=seq, deleted=kind == "deleted", changed_at=now
+                ))
+        pushes.append({
+            "kind": kind, "id": obj.id, "seq": seq, "title": obj.title,
+            "category": obj.category, "pinned": bool(obj.is_pinned),
+        })
+
+
+def _queue_pushes(session, flush_context):
+    # Jobs cannot be added mid-flush; the commit flushes them after this
+    queued = session.info.setdefault("announcement_jobs", {})
+    for data in session.info.pop("announcement_pushes", ()):
+        job = queued.get(data["id"])
+        if job is None:
+            queued[data["id"]] = emit_after_commit("announcement", data, room=ANNOUNCEMENTS_ROOM)
+            continue
+        # Flushed again in the same transaction (an autoflush mid-edit): one push, latest state
+        if job.payload["data"]["kind"] == "created" and data["kind"] != "deleted":
+            data = dict(data, kind="created")
+        job.payload = dict(job.payload, data=data)
+
+
+def _forget_pushes(session):
+    session.info.pop("announcement_pushes", None)
+    session.info.pop("announcement_jobs", None)
+
+
+def init_notifications():
+    for name, listener in (
+        ("after_flush", _record_changes),
+        ("after_flush_postexec", _queue_pushes),
+        ("after_commit", _forget_pushes),
+        ("after_rollback", _forget_pushes),
+    ):
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
@@ -0,0 +1,58 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+# Helper: clamp a requested page size to the configured bounds
+def clamp_page_size(value, default, maximum):
+    try:
+        size = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+# Cursor is an opaque url-safe token wrapping "<iso timestamp>|<id>"
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+# Keyset filter for a (timestamp, id) ordering, newest first by default
+def keyset_filter(query, timestamp_col, id_col, cursor, descending=True):
+    if not cursor:
+        return query
+    timestamp, row_id = decode_cursor(cursor)
+    if descending:
+        return query.filter(
+            or_(
+                timestamp_col < timestamp,
+                and_(timestamp_col == timestamp, id_col < row_id),
+            )
+        )
+    return query.filter(
+        or_(
+            timestamp_col > timestamp,
+            and_(timestamp_col == timestamp, id_col > row_id),
+        )
+    )
+
+
+# Fetch one page plus a lookahead row to tell whether another page exists
+def fetch_page(query, page_size, cursor_of):
+    rows = query.limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = encode_cursor(*cursor_of(rows[-1])) if has_more and rows else None
+    return rows, next_cursor
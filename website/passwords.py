@@ -0,0 +1,74 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Password hashing off the request path.
+#
+# PASSWORD_HASH_METHOD is any werkzeug method string ("scrypt",
+# "scrypt:65536:8:1", "pbkdf2:sha256:600000", ...). Hashes made with other
+# parameters still verify and are upgraded on the user's next login.
+#
+# Hashing runs in a small pool: hashlib's scrypt/pbkdf2 release the GIL, so a
+# thread pool hashes in parallel with request handling, and under eventlet or
+# gevent the hub's native thread pool keeps the work off the event loop.
+# PASSWORD_HASH_QUEUE caps in-flight hashes per worker; past it callers get
+# HasherBusy straight away instead of queueing behind a login storm.
+
+
+class HasherBusy(RuntimeError):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self):
+        self.method = "scrypt"
+        self.signature = None
+        self.slots = None
+        self.submit = None
+
+    def init_app(self, app):
+        self.method = app.config.get("PASSWORD_HASH_METHOD", "scrypt")
+        # Fill in werkzeug's defaults ("scrypt" -> "scrypt:32768:8:1") once
+        self.signature = generate_password_hash("", self.method).split("$", 1)[0]
+        self.slots = threading.BoundedSemaphore(app.config.get("PASSWORD_HASH_QUEUE", 64))
+        self.submit = _executor(
+            app.config.get("SOCKETIO_ASYNC_MODE"),
+            app.config.get("PASSWORD_HASH_WORKERS") or os.cpu_count() or 1,
+        )
+        app.extensions["password_hasher"] = self
+
+    def _run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HasherBusy("Too many password checks in progress.")
+        try:
+            return self.submit(fn, *args)
+        finally:
+            self.slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split("$", 1)[0] != self.signature
+
+
+# Helper: blocking "run fn(*args) elsewhere and wait" for the worker's async mode
+def _executor(async_mode, workers):
+    if async_mode == "eventlet":
+        from eventlet import tpool
+
+        return tpool.execute
+    if async_mode == "gevent":
+        import gevent
+
+        return lambda fn, *args: gevent.get_hub().threadpool.apply(fn, args)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+    return lambda fn, *args: pool.submit(fn, *args).result()
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,95 @@
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from website.cache import LRUCache, MISSING
+from website.models import db, User
+
+# Flask-Login loads current_user on every request and Socket.IO handshake.
+# Instead of a full ORM User (with ten lazy relationships) it gets a Principal:
+# a few plain fields cached in-process for a short TTL, dropped as soon as a
+# change to that user commits. Anything else falls through to the ORM row,
+# loaded on first use within the request.
+
+_principals = LRUCache()
+
+
+class Principal:
+    __slots__ = ("id", "name", "username", "email", "role")
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, user):
+        self.id = user.id
+        self.name = user.name
+        self.username = user.username
+        self.email = user.email
+        self.role = user.role
+
+    def get_id(self):
+        return str(self.id)
+
+    @property
+    def user(self):
+        # Pinned on g: the session only holds it weakly, and collections such
+        # as events_rsvped need their parent alive until the request commits
+        user = g.get("_principal_user")
+        if user is None or user.id != self.id:
+            user = g._principal_user = db.session.get(User, self.id)
+        return user
+
+    def __getattr__(self, name):
+        return getattr(self.user, name)
+
+    def __eq__(self, other):
+        return isinstance(other, (Principal, User)) and self.get_id() == other.get_id()
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"<Principal {self.id} {self.username} ({self.role})>"
+
+
+def init_principals(app):
+    global _principals
+    _principals = LRUCache(
+        maxsize=app.config.get("SESSION_USER_CACHE_SIZE", 4096),
+        ttl=app.config.get("SESSION_USER_CACHE_TTL", 60),
+    )
+    for name, listener in (("after_flush", _collect_users), ("after_commit", _drop_users)):
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
+
+
+def load_principal(user_id):
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    principal = _principals.get(user_id)
+    if principal is MISSING:
+        user = db.session.get(User, user_id)
+        principal = Principal(user) if user else None
+        _principals.set(user_id, principal)
+    return principal
+
+
+def invalidate_principal(user_id):
+    _principals.delete(user_id)
+
+
+# --- Invalidation hooks: drop cached principals once a user change commits ---
+
+def _collect_users(session, flush_context):
+    changed = session.info.setdefault("principal_ids", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            changed.add(obj.id)
+
+
+def _drop_users(session):
+    for user_id in session.info.pop("principal_ids", ()):
+        invalidate_principal(user_id)
@@ -0,0 +1,100 @@
+import re
+import warnings
+from collections import Counter
+
+from flask import current_app, request
+
+from website.metrics import request_stats
+
+# N+1 detector for development and tests.
+#
+# Views declare how many SQL statements a request may take:
+#
+#     @feed_bp.route('/feed')
+#     @login_required
+#     @query_budget(6)
+#     def feed(): ...
+#
+# With QUERY_BUDGET_MODE set ("warn" by default under debug/testing, "off"
+# to disable), every request is checked against its view's budget
+# (QUERY_BUDGET_DEFAULT when undeclared), and statements of the same shape run
+# more than QUERY_REPEAT_LIMIT times are reported as a likely N+1 lazy load.
+# "warn" logs and issues a QueryBudgetWarning; "raise" raises
+# QueryBudgetExceeded so the test client fails the test.
+
+IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)|\(\s*__\[POSTCOMPILE_\w+\]\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+class QueryBudgetWarning(UserWarning):
+    pass
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit, repeat_limit=None):
+    """Declare the SQL statement budget of a view; put it directly above the def."""
+    def decorate(view):
+        view.query_budget = limit
+        if repeat_limit is not None:
+            view.query_repeat_limit = repeat_limit
+        return view
+    return decorate
+
+
+def statement_shape(statement):
+    """Statements that differ only in IN-list length or whitespace share a shape."""
+    return WHITESPACE.sub(" ", IN_LIST.sub("(?)", statement)).strip()
+
+
+def _mode(app):
+    mode = app.config.get("QUERY_BUDGET_MODE")
+    if mode is None and (app.debug or app.testing):
+        return "warn"
+    return mode
+
+
+def _start_counting():
+    stats = request_stats()
+    if stats is not None and _mode(current_app) in ("warn", "raise"):
+        stats.statements = Counter()
+
+
+def _check_budget(response):
+    stats = request_stats()
+    view = current_app.view_functions.get(request.endpoint)
+    if stats is None or stats.statements is None or view is None:
+        return response
+    config = current_app.config
+    budget = getattr(view, "query_budget", config.get("QUERY_BUDGET_DEFAULT", 20))
+    repeat_limit = getattr(view, "query_repeat_limit", config.get("QUERY_REPEAT_LIMIT", 5))
+
+    shapes = Counter()
+    for statement, count in stats.statements.items():
+        shapes[statement_shape(statement)] += count
+    repeated = [(shape, count) for shape, count in shapes.most_common() if count > repeat_limit]
+    if stats.queries <= budget and not repeated:
+        return response
+
+    lines = [f"{request.method} {request.path} ({request.endpoint}) ran {stats.queries} SQL statement(s), budget {budget}"]
+    lines.extend(f"  {count}x {shape[:300]}" for shape, count in repeated)
+    message = "\n".join(lines)
+    if _mode(current_app) == "raise":
+        raise QueryBudgetExceeded(message)
+    current_app.logger.warning(message)
+    warnings.warn(message, QueryBudgetWarning, stacklevel=2)
+    return response
+
+
+def init_query_budgets(app):
+    """Call after init_metrics, whose per-request stats this builds on.
+
+    The mode is read per request, since ``socketio.run(app, debug=True)``
+    only turns debug on after create_app returns.
+    """
+    if app.config.get("QUERY_BUDGET_MODE") == "off" or not app.config.get("METRICS_ENABLED", True):
+        return
+    app.before_request(_start_counting)
+    app.after_request(_check_budget)
@@ -0,0 +1,90 @@
+import re
+from datetime import date, datetime, timedelta
+
+from website import attendance, dashboard, notifications, rsvp
+from website.models import db
+from website.ical import calendar_query
+from website.pagination import encode_cursor
+from website.tasks import next_job_query
+from website.blueprints.announcements import announcements_query
+from website.blueprints.auth import login_query
+from website.blueprints.events import events_query
+from website.blueprints.feed import comments_query, feed_query, reports_query
+from website.blueprints.resources import notes_query
+
+# Query-plan regression check.
+#
+# HOT_QUERIES are the queries the blueprints run on every page view, built by
+# the same helpers the views call, with representative parameters. A view
+# that stops issuing a query takes it out of here too. check_plans() asks
+# SQLite for each plan and flags any full scan of a table, so dropping or
+# outgrowing an index shows up in ``flask query-plans`` before it shows up as
+# a slow page. Plans are only meaningful on a database with data in it and
+# ANALYZE run.
+
+NOW = datetime(2025, 1, 1)
+LEASE = timedelta(minutes=5)
+
+HOT_QUERIES = {
+    "feed: first page": lambda: feed_query().limit(21),
+    "feed: next page": lambda: feed_query(cursor=encode_cursor(datetime(2025, 1, 1), 1000)).limit(21),
+    "feed: by tag": lambda: feed_query(tag="exams").limit(21),
+    "feed: search": lambda: feed_query(search="exam").limit(21),
+    "post: comments": lambda: comments_query(1),
+    "moderation: reports": reports_query,
+    "notes: all": notes_query,
+    "notes: by semester": lambda: notes_query(semester=3),
+    "notes: by semester and subject": lambda: notes_query(semester=3, subject="Mathematics"),
+    "notes: search": lambda: notes_query(q="exam"),
+    "announcements: all": announcements_query,
+    "announcements: by category": lambda: announcements_query(category="exam"),
+    "announcements: search": lambda: announcements_query(q="exam"),
+    "announcements: changes since": lambda: notifications.changes_query(100, 51),
+    "announcements: unread count": lambda: notifications.unread_query(1),
+    "events: upcoming window": lambda: events_query(NOW, NOW + timedelta(days=60)).limit(50),
+    "events: past page": lambda: (
+        events_query(end=NOW, cursor=encode_cursor(datetime(2024, 6, 1), 10), descending=True).limit(13)
+    ),
+    "events: category window": lambda: events_query(NOW, NOW + timedelta(days=60), "workshop").limit(13),
+    "events: rsvp status": lambda: rsvp.status_query(1, 1),
+    "events: waitlist position": lambda: rsvp.waitlist_position_query(1, 1, NOW),
+    "events: waitlist head": lambda: rsvp.waitlist_head_query(1),
+    "calendar: category feed": lambda: calendar_query("workshop"),
+    "calendar: personal feed": lambda: calendar_query(user_id=1),
+    "attendance: class marks": lambda: attendance.previous_marks_query(date(2025, 1, 1), "Mathematics", [1, 2, 3]),
+    "attendance: student summary": lambda: attendance.student_summary_query(1),
+    "attendance: class summary": lambda: attendance.class_summary_query("Mathematics"),
+    "dashboard: snapshot": lambda: dashboard.snapshot_query(1),
+    "dashboard: section periods": lambda: dashboard.section_periods_query(1),
+    "dashboard: timetable entries": lambda: dashboard.timetable_entries_query(1),
+    "dashboard: latest results": lambda: dashboard.latest_results_query(1),
+    "dashboard: upcoming rsvps": lambda: dashboard.upcoming_events_query(1, NOW),
+    "dashboard: pinned announcements": dashboard.pinned_announcements_query,
+    "tasks: next due job": lambda: next_job_query(NOW, LEASE),
+    "auth: login lookup": lambda: login_query("admin"),
+}
+
+# "SCAN posts" / "SCAN users AS users_1" without "USING ... INDEX" is a full table scan
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+
+def explain(query):
+    """SQLite's EXPLAIN QUERY PLAN detail lines for a Query or select()."""
+    statement = getattr(query, "statement", query)
+    sql = statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True})
+    rows = db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")
+    return [row[-1] for row in rows]
+
+
+def check_plans(queries=None):
+    """Returns {name: (plan lines, full scans)} for every hot query."""
+    tables = set(db.metadata.tables)
+    report = {}
+    for name, build in (queries or HOT_QUERIES).items():
+        plan = explain(build())
+        scans = [
+            line for line in plan
+            if (match := FULL_SCAN.match(line)) and match.group(1) in tables
+        ]
+        report[name] = (plan, scans)
+    return report
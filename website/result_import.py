@@ -0,0 +1,256 @@
+import csv
+import io
+import zipfile
+from contextlib import contextmanager
+from xml.etree.ElementTree import ParseError
+
+from website.models import db, dialect_insert, User, Result, STUDENT_ROLES
+from website.results import ResultFormatError, parse_details, recompute_results
+from website.tasks import enqueue
+
+# Bulk result import.
+#
+# Input is one row per subject, streamed from CSV (or .xlsx with openpyxl):
+#
+#     username,semester,code,name,credits,grade
+#     bit2201,5,PCC-CS501,Compiler Design,3,A
+#
+# Rows are grouped into one marksheet per (student, semester). Every
+# BATCH_SIZE marksheets the usernames are resolved in one query, the sheets
+# are upserted with a single executemany, SGPA/CGPA are recomputed for those
+# students (or, with ``defer``, queued as a "results.recompute" job) and the
+# transaction commits, so a failure part-way keeps every finished batch.
+# Rows of one marksheet must not be split across batches; sorted publication
+# exports satisfy that. A file that turns out unreadable part-way (a bad byte,
+# a corrupt sheet) stops the import there: the report says so, and the batches
+# committed before it are kept.
+
+BATCH_SIZE = 1000
+MAX_ERRORS = 100
+
+COLUMN_ALIASES = {
+    "roll": "username",
+    "student": "username",
+    "sem": "semester",
+    "subject_code": "code",
+    "subject": "code",
+    "subject_name": "name",
+    "credit": "credits",
+    "points": "grade_point",
+}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.results = 0
+        self.skipped = 0
+        self.errors = []
+        # Why the file could not be read to the end, if it could not
+        self.stopped = None
+
+    def error(self, line, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "results": self.results,
+            "skipped": self.skipped,
+            "errors": [{"line": line, "message": message} for line, message in self.errors],
+            "stopped": self.stopped,
+        }
+
+
+# --- Readers: yield (line number, {column: value}) ---
+
+def _header(values):
+    columns = [str(value or "").strip().lower().replace(" ", "_") for value in values]
+    columns = [COLUMN_ALIASES.get(column, column) for column in columns]
+    missing = {"username", "semester", "credits"} - set(columns)
+    if missing or not {"grade", "grade_point"} & set(columns):
+        raise ImportFormatError(
+            "Expected columns: username, semester, code, credits and grade (or grade_point)."
+        )
+    return columns
+
+
+# The header is read straight away, so a file that is unreadable from the
+# start fails in read_rows(); later rows are read as the import consumes them
+
+@contextmanager
+def _csv_errors(reader):
+    try:
+        yield
+    except UnicodeDecodeError:
+        where = f" (after line {reader.line_num})" if reader.line_num else ""
+        raise ImportFormatError(f"The file is not UTF-8 text{where}.") from None
+    except csv.Error as e:
+        raise ImportFormatError(f"Line {reader.line_num}: {e}.") from None
+
+
+def read_csv(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+    with _csv_errors(reader):
+        columns = _header(next(reader, []))
+
+    def rows():
+        with _csv_errors(reader):
+            for values in reader:
+                if any(values):
+                    yield reader.line_num, dict(zip(columns, values))
+    return rows()
+
+
+@contextmanager
+def _xlsx_errors():
+    from openpyxl.utils.exceptions import InvalidFileException
+    try:
+        yield
+    except (zipfile.BadZipFile, InvalidFileException, KeyError, ParseError):
+        raise ImportFormatError("The file is not a readable .xlsx workbook.") from None
+
+
+def read_xlsx(stream):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError("Excel import needs openpyxl (pip install website[results]).")
+    with _xlsx_errors():
+        sheet = load_workbook(stream, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+        columns = _header(next(rows, []))
+
+    def values():
+        with _xlsx_errors():
+            for line, values in enumerate(rows, start=2):
+                if any(value is not None for value in values):
+                    yield line, dict(zip(columns, values))
+    return values()
+
+
+def read_rows(stream, filename):
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if ext == "csv":
+        return read_csv(stream)
+    if ext == "xlsx":
+        return read_xlsx(stream)
+    raise ImportFormatError("Upload a .csv or .xlsx file.")
+
+
+# --- Import ---
+
+def _sheet_key(row):
+    username = str(row.get("username") or "").strip()
+    if not username:
+        raise ResultFormatError("Missing username.")
+    try:
+        semester = int(float(row.get("semester")))
+    except (TypeError, ValueError):
+        raise ResultFormatError(f"Invalid semester {row.get('semester')!r}.")
+    if not 1 <= semester <= 12:
+        raise ResultFormatError(f"Semester {semester} is out of range.")
+    return username, semester
+
+
+def _subject(row):
+    subject = {"code": str(row.get("code") or "").strip(), "credits": row.get("credits")}
+    if row.get("name"):
+        subject["name"] = str(row["name"]).strip()
+    if row.get("grade_point") not in (None, ""):
+        subject["grade_point"] = row["grade_point"]
+    else:
+        subject["grade"] = str(row.get("grade") or "").strip().upper()
+    # Validates and normalizes credits / grade point
+    credits, points = parse_details([subject])
+    subject["credits"] = credits[0]
+    if "grade_point" in subject:
+        subject["grade_point"] = points[0]
+    return subject
+
+
+def _flush(sheets, rejected, report, defer):
+    usernames = {username for username, _ in sheets}
+    student_ids = dict(db.session.execute(
+        db.select(User.username, User.id)
+        .where(User.username.in_(usernames), User.role.in_(STUDENT_ROLES))
+    ).all())
+    values = []
+    for (username, semester), (line, subjects) in sheets.items():
+        if (username, semester) in rejected:
+            continue
+        student_id = student_ids.get(username)
+        if student_id is None:
+            report.error(line, f"Unknown student {username!r}.")
+            continue
+        values.append({"student_id": student_id, "semester": semester, "details": {"subjects": subjects}})
+    if values:
+        stmt = dialect_insert(Result.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["student_id", "semester"],
+            set_={"details": stmt.excluded.details},
+        )
+        db.session.execute(stmt, values)
+        student_ids = [value["student_id"] for value in values]
+        if defer:
+            enqueue("results.recompute", student_ids=student_ids)
+        else:
+            recompute_results(student_ids)
+    db.session.commit()
+    report.results += len(values)
+
+
+def import_results(rows, batch_size=BATCH_SIZE, progress=None, defer=False):
+    """Upsert marksheets from (line, row) pairs; returns an ImportReport.
+
+    ``progress`` is called with the report after every committed batch. With
+    ``defer`` SGPA/CGPA are left to a task worker, shortly after each batch.
+    If ``rows`` raises ImportFormatError part-way, the import stops with
+    ``report.stopped`` set; committed batches stay, the unfinished one does not.
+    """
+    report = ImportReport()
+    try:
+        _import(rows, batch_size, progress, defer, report)
+    except ImportFormatError as e:
+        db.session.rollback()
+        report.stopped = str(e)
+    if progress:
+        progress(report)
+    return report
+
+
+def _import(rows, batch_size, progress, defer, report):
+    sheets, rejected, flushed = {}, set(), set()
+    for line, row in rows:
+        report.rows += 1
+        try:
+            key = _sheet_key(row)
+        except ResultFormatError as e:
+            report.error(line, str(e))
+            continue
+        if key in flushed:
+            report.error(line, f"Rows for {key[0]} semester {key[1]} must be next to each other.")
+            continue
+        if key not in sheets and key not in rejected and len(sheets) >= batch_size:
+            _flush(sheets, rejected, report, defer)
+            flushed.update(sheets, rejected)
+            sheets, rejected = {}, set()
+            if progress:
+                progress(report)
+        try:
+            subject = _subject(row)
+        except ResultFormatError as e:
+            # One bad subject drops the whole marksheet rather than importing it short
+            report.error(line, str(e))
+            rejected.add(key)
+            continue
+        sheets.setdefault(key, (line, []))[1].append(subject)
+    if sheets:
+        _flush(sheets, rejected, report, defer)
@@ -0,0 +1,213 @@
+import hashlib
+import json
+from array import array
+
+from website.dashboard import mark_stale
+from website.models import db, Result
+from website.tasks import task
+
+try:
+    import numpy as np
+except ImportError:  # optional: pip install website[results]
+    np = None
+
+# SGPA/CGPA engine.
+#
+# Result.details holds the per-subject marksheet. Rows are parsed into flat
+# credit / grade-point arrays and totalled for a whole batch at once:
+#
+#     SGPA = sum(credits * points) / sum(credits)            one semester
+#     CGPA = running credit-weighted SGPA over semesters     1..n
+#
+# Totals are stored with a digest of the details they came from, so a rerun
+# only parses semesters whose marksheet changed; CGPA is then rebuilt from the
+# stored per-semester totals. With numpy installed the batch arithmetic is
+# vectorized, otherwise it runs as plain loops over the same arrays.
+
+GRADE_POINTS = {
+    "O": 10, "E": 9, "A": 8, "B": 7, "C": 6, "D": 5,
+    "F": 0, "I": 0, "AB": 0,
+}
+
+BATCH_SIZE = 2000
+
+
+class ResultFormatError(ValueError):
+    pass
+
+
+def digest(details):
+    return hashlib.sha1(json.dumps(details, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _subjects(details):
+    if isinstance(details, dict) and "subjects" in details:
+        details = details["subjects"]
+    if isinstance(details, dict):
+        # {"CS501": {"credits": 3, "grade": "A"}, ...}
+        return [dict(subject, code=code) for code, subject in details.items() if isinstance(subject, dict)]
+    if isinstance(details, list):
+        return details
+    raise ResultFormatError("Result details must be a list or mapping of subjects.")
+
+
+def _grade_point(subject):
+    for key in ("grade_point", "points"):
+        if subject.get(key) is not None:
+            return float(subject[key])
+    grade = str(subject.get("grade", "")).strip().upper()
+    if grade not in GRADE_POINTS:
+        raise ResultFormatError(f"Unknown grade {grade!r}.")
+    return float(GRADE_POINTS[grade])
+
+
+def parse_details(details):
+    """Per-subject (credits, grade points) arrays for one marksheet."""
+    credits, points = array("d"), array("d")
+    for subject in _subjects(details):
+        if not isinstance(subject, dict):
+            raise ResultFormatError("Each subject must be a mapping.")
+        try:
+            credit = float(subject.get("credits", subject.get("credit")))
+        except (TypeError, ValueError):
+            raise ResultFormatError(f"Subject {subject.get('code', '?')} has no credits.")
+        point = _grade_point(subject)
+        if credit < 0 or not 0 <= point <= 10:
+            raise ResultFormatError(f"Subject {subject.get('code', '?')} is out of range.")
+        credits.append(credit)
+        points.append(point)
+    return credits, points
+
+
+# Helper: per-row sum(credits) and sum(credits * points) over flattened subjects
+def _row_totals(credits, points, owners, rows):
+    if np is not None:
+        credits = np.frombuffer(credits, dtype=np.float64)
+        points = np.frombuffer(points, dtype=np.float64)
+        owners = np.frombuffer(owners, dtype=np.int64)
+        return (
+            np.bincount(owners, weights=credits, minlength=rows),
+            np.bincount(owners, weights=credits * points, minlength=rows),
+        )
+    total_credits, credit_points = [0.0] * rows, [0.0] * rows
+    for credit, point, owner in zip(credits, points, owners):
+        total_credits[owner] += credit
+        credit_points[owner] += credit * point
+    return total_credits, credit_points
+
+
+# Helper: running totals that restart whenever the student changes
+def _running_totals(students, total_credits, credit_points):
+    if np is not None:
+        students = np.asarray(students)
+        total_credits = np.asarray(total_credits, dtype=np.float64)
+        credit_points = np.asarray(credit_points, dtype=np.float64)
+        index = np.arange(len(students))
+        first = np.ones(len(students), dtype=bool)
+        first[1:] = students[1:] != students[:-1]
+        starts = np.maximum.accumulate(np.where(first, index, 0))
+        cum_credits, cum_points = np.cumsum(total_credits), np.cumsum(credit_points)
+        return (
+            cum_credits - (cum_credits - total_credits)[starts],
+            cum_points - (cum_points - credit_points)[starts],
+        )
+    cum_credits, cum_points = [], []
+    previous, running_credits, running_points = None, 0.0, 0.0
+    for student, credit, points in zip(students, total_credits, credit_points):
+        if student != previous:
+            previous, running_credits, running_points = student, 0.0, 0.0
+        running_credits += credit
+        running_points += points
+        cum_credits.append(running_credits)
+        cum_points.append(running_points)
+    return cum_credits, cum_points
+
+
+def _gpa(points, credits):
+    return round(float(points) / float(credits), 2) if credits > 0 else None
+
+
+def _recompute_students(student_ids, force):
+    rows = db.session.execute(
+        db.select(
+            Result.id, Result.student_id, Result.details, Result.details_digest,
+            Result.total_credits, Result.credit_points, Result.sgpa, Result.cgpa,
+        )
+        .where(Result.student_id.in_(student_ids))
+        .order_by(Result.student_id, Result.semester, Result.id)
+    ).all()
+
+    # Parse only marksheets that changed since their totals were stored
+    total_credits = [row.total_credits or 0.0 for row in rows]
+    credit_points = [row.credit_points or 0.0 for row in rows]
+    digests = [row.details_digest for row in rows]
+    invalid = set()
+    credits, points, owners = array("d"), array("d"), array("q")
+    for i, row in enumerate(rows):
+        current = digest(row.details)
+        if not force and current == row.details_digest and row.total_credits is not None:
+            continue
+        digests[i] = current
+        try:
+            row_credits, row_points = parse_details(row.details)
+        except ResultFormatError:
+            invalid.add(i)
+            row_credits, row_points = (), ()
+        credits.extend(row_credits)
+        points.extend(row_points)
+        owners.extend([i] * len(row_credits))
+        total_credits[i] = credit_points[i] = None
+
+    fresh_credits, fresh_points = _row_totals(credits, points, owners, len(rows))
+    for i in range(len(rows)):
+        if total_credits[i] is None:
+            total_credits[i] = float(fresh_credits[i])
+            credit_points[i] = float(fresh_points[i])
+
+    cum_credits, cum_points = _running_totals(
+        [row.student_id for row in rows], total_credits, credit_points
+    )
+    updates, changed = [], set()
+    for i, row in enumerate(rows):
+        values = {
+            "sgpa": None if i in invalid else _gpa(credit_points[i], total_credits[i]),
+            "cgpa": _gpa(cum_points[i], cum_credits[i]),
+            "total_credits": total_credits[i],
+            "credit_points": credit_points[i],
+            "details_digest": digests[i],
+        }
+        if any(getattr(row, key) != value for key, value in values.items()):
+            updates.append(dict(values, id=row.id))
+            changed.add(row.student_id)
+    if updates:
+        db.session.execute(db.update(Result), updates)
+        # Bulk updates skip the ORM flush hooks that keep dashboards in step
+        mark_stale(db.session.connection(), "results", changed)
+    return len(updates), len(invalid)
+
+
+def recompute_results(student_ids=None, semester=None, force=False, batch_size=BATCH_SIZE):
+    """Recompute SGPA/CGPA for the given students (default: everyone, or everyone with a
+    result in ``semester``). Returns (rows updated, rows with unreadable details).
+
+    CGPA depends on every earlier semester, so whole students are processed,
+    ``batch_size`` at a time. The caller commits.
+    """
+    if student_ids is None:
+        query = db.select(Result.student_id).distinct().order_by(Result.student_id)
+        if semester is not None:
+            query = query.where(Result.semester == semester)
+        student_ids = db.session.scalars(query).all()
+    student_ids = sorted(set(student_ids))
+    updated = invalid = 0
+    for start in range(0, len(student_ids), batch_size):
+        batch_updated, batch_invalid = _recompute_students(student_ids[start:start + batch_size], force)
+        updated += batch_updated
+        invalid += batch_invalid
+    return updated, invalid
+
+
+# Queued by imports that should not wait for the recompute (website.result_import)
+@task("results.recompute")
+def recompute_task(student_ids):
+    recompute_results(student_ids)
@@ -0,0 +1,247 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from website.dashboard import mark_stale
+from website.ical import touch_personal_feeds
+from website.models import db, dialect_insert, Event, EventWaitlist, event_rsvps
+from website.socketio_events import emit_after_commit, emit_task, user_room
+from website.tasks import enqueue, task
+
+# Event registration with a capacity and a waitlist.
+#
+# events.rsvp_count and waitlist_count are maintained counters. A seat is
+# taken with one conditional UPDATE (rsvp_count < capacity, or no capacity),
+# so concurrent registrations cannot oversell; when it matches nothing the
+# user joins event_waitlist instead. A cancellation frees its seat and
+# promotes the head of the waitlist in the same transaction. Membership is
+# read from the event_rsvps / event_waitlist primary keys, never by loading
+# anyone's RSVP list.
+#
+# Everything here writes with Core statements and the caller commits. The
+# counters only follow writes made through this module; ``flask
+# reconcile-counters`` recounts them. Registered (and promoted) attendees get
+# a reminder job EVENT_REMINDER_MINUTES before the start, and their calendar
+# feed (website.ical) is refreshed.
+
+REGISTERED = "registered"
+WAITLISTED = "waitlisted"
+
+
+def _take_seat(event_id):
+    """Claim a seat; returns the waitlist length, or None when the event is full."""
+    return db.session.execute(
+        db.update(Event)
+        .where(Event.id == event_id, db.or_(Event.capacity.is_(None), Event.rsvp_count < Event.capacity))
+        .values(rsvp_count=Event.rsvp_count + 1)
+        .returning(Event.waitlist_count)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+
+def _bump(event_id, **deltas):
+    db.session.execute(
+        db.update(Event)
+        .where(Event.id == event_id)
+        .values({name: getattr(Event, name) + delta for name, delta in deltas.items()})
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _add_attendee(event_id, user_id):
+    return db.session.execute(
+        dialect_insert(event_rsvps)
+        .values(event_id=event_id, user_id=user_id)
+        .on_conflict_do_nothing(index_elements=["event_id", "user_id"])
+    ).rowcount
+
+
+def _is_attendee(event_id, user_id):
+    return db.session.scalar(db.select(
+        db.select(event_rsvps.c.user_id)
+        .where(event_rsvps.c.event_id == event_id, event_rsvps.c.user_id == user_id)
+        .exists()
+    ))
+
+
+def _leave_waitlist(event_id, user_id):
+    left = db.session.execute(
+        db.delete(EventWaitlist).where(EventWaitlist.event_id == event_id, EventWaitlist.user_id == user_id)
+    ).rowcount
+    if left:
+        _bump(event_id, waitlist_count=-1)
+    return left
+
+
+def register(event, user_id):
+    """Register ``user_id``, or waitlist them if the event is full.
+
+    Returns ``(status, changed)``: REGISTERED or WAITLISTED, and False when
+    they already were. The caller commits.
+    """
+    waiting = _take_seat(event.id)
+    if waiting is None:
+        if _is_attendee(event.id, user_id):
+            return REGISTERED, False
+        joined = db.session.execute(
+            dialect_insert(EventWaitlist.__table__)
+            .values(event_id=event.id, user_id=user_id, created_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=["event_id", "user_id"])
+        ).rowcount
+        if joined:
+            _bump(event.id, waitlist_count=1)
+        return WAITLISTED, bool(joined)
+    if not _add_attendee(event.id, user_id):
+        # Already registered: hand back the seat just taken
+        _bump(event.id, rsvp_count=-1)
+        return REGISTERED, False
+    if waiting:
+        # Seats opened up (a larger capacity) while they were queued
+        _leave_waitlist(event.id, user_id)
+    mark_stale(db.session.connection(), "events", [user_id])
+    touch_personal_feeds([user_id])
+    schedule_event_reminder(event, user_id)
+    return REGISTERED, True
+
+
+def cancel(event, user_id):
+    """Give up a seat or a waitlist place; returns what they had (None for nothing).
+
+    A freed seat goes to the head of the waitlist. The caller commits.
+    """
+    left = db.session.execute(
+        db.delete(event_rsvps).where(event_rsvps.c.event_id == event.id, event_rsvps.c.user_id == user_id)
+    ).rowcount
+    if left:
+        _bump(event.id, rsvp_count=-1)
+        mark_stale(db.session.connection(), "events", [user_id])
+        touch_personal_feeds([user_id])
+        promote(event)
+        return REGISTERED
+    return WAITLISTED if _leave_waitlist(event.id, user_id) else None
+
+
+def waitlist_head_query(event_id):
+    return (
+        db.select(EventWaitlist.user_id)
+        .where(EventWaitlist.event_id == event_id)
+        .order_by(EventWaitlist.created_at, EventWaitlist.user_id)
+        .limit(1)
+    )
+
+
+def promote(event):
+    """Move waitlisted users into free seats, first come first served; returns their ids."""
+    promoted = []
+    while True:
+        head = db.session.scalar(waitlist_head_query(event.id))
+        if head is None or _take_seat(event.id) is None:
+            break
+        # A concurrent cancellation can promote the same user first; then hand the seat back
+        if not _leave_waitlist(event.id, head) or not _add_attendee(event.id, head):
+            _bump(event.id, rsvp_count=-1)
+            continue
+        promoted.append(head)
+        schedule_event_reminder(event, head)
+        emit_after_commit("event_promoted", {"event_id": event.id, "title": event.title}, room=user_room(head))
+    if promoted:
+        mark_stale(db.session.connection(), "events", promoted)
+        touch_personal_feeds(promoted)
+    return promoted
+
+
+# --- Reading ---
+
+def status_query(event_id, user_id):
+    """Whether ``user_id`` is registered, and when they joined the waitlist (None if not on it)."""
+    return db.select(
+        db.select(event_rsvps.c.user_id)
+        .where(event_rsvps.c.event_id == event_id, event_rsvps.c.user_id == user_id)
+        .exists(),
+        db.select(EventWaitlist.created_at)
+        .where(EventWaitlist.event_id == event_id, EventWaitlist.user_id == user_id)
+        .scalar_subquery(),
+    )
+
+
+def waitlist_position_query(event_id, user_id, queued_at):
+    return db.select(db.func.count()).select_from(EventWaitlist).where(
+        EventWaitlist.event_id == event_id,
+        db.tuple_(EventWaitlist.created_at, EventWaitlist.user_id) < db.tuple_(queued_at, user_id),
+    )
+
+
+def rsvp_status(event_id, user_id):
+    """``(REGISTERED | WAITLISTED | None, waitlist position)`` from the primary keys."""
+    registered, queued_at = db.session.execute(status_query(event_id, user_id)).one()
+    if registered:
+        return REGISTERED, None
+    if queued_at is None:
+        return None, None
+    ahead = db.session.scalar(waitlist_position_query(event_id, user_id, queued_at))
+    return WAITLISTED, ahead + 1
+
+
+def seats(event):
+    """Seat counts as broadcast to the event's room."""
+    left = None if event.capacity is None else max(0, event.capacity - event.rsvp_count)
+    return {
+        "capacity": event.capacity,
+        "registered": event.rsvp_count,
+        "left": left,
+        "waitlist": event.waitlist_count,
+    }
+
+
+# --- Maintenance ---
+
+def reconcile_counts(dry_run=False, commit=True):
+    """Recount rsvp_count / waitlist_count from the rows; returns the number of drifted events.
+
+    Migrations pass ``commit=False`` so the recount commits with them.
+    """
+    registered = db.select(db.func.count()).where(event_rsvps.c.event_id == Event.id).scalar_subquery()
+    waiting = (
+        db.select(db.func.count()).select_from(EventWaitlist)
+        .where(EventWaitlist.event_id == Event.id).scalar_subquery()
+    )
+    drifted = db.session.scalar(
+        db.select(db.func.count(Event.id)).where(
+            (Event.rsvp_count != registered) | (Event.waitlist_count != waiting)
+        )
+    )
+    if not dry_run and drifted:
+        db.session.execute(db.update(Event).values(rsvp_count=registered, waitlist_count=waiting))
+        if commit:
+            db.session.commit()
+    return drifted
+
+
+# --- Reminders ---
+
+def schedule_event_reminder(event, user_id):
+    """Queue a reminder to one attendee EVENT_REMINDER_MINUTES before the start."""
+    now = datetime.now()
+    if event.start_time <= now:
+        return
+    lead = timedelta(minutes=current_app.config.get("EVENT_REMINDER_MINUTES", 60))
+    enqueue("events.reminder", delay=max(timedelta(0), event.start_time - lead - now),
+            event_id=event.id, user_id=user_id, start=event.start_time.isoformat())
+
+
+@task("events.reminder")
+def send_event_reminder(event_id, user_id, start):
+    event = db.session.get(Event, event_id)
+    if event is None or rsvp_status(event_id, user_id)[0] != REGISTERED:
+        return
+    if event.start_time.isoformat() != start:
+        # Moved since the RSVP: remind against the new start instead
+        schedule_event_reminder(event, user_id)
+        return
+    emit_task("event_reminder", {
+        "event_id": event.id,
+        "title": event.title,
+        "start": start,
+        "location": event.location,
+        "url": f"/events/{event.id}",
+    }, room=user_room(user_id))
@@ -0,0 +1,325 @@
+import re
+from collections import namedtuple
+
+from flask import url_for
+from markupsafe import Markup, escape
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from website.models import db, Post, Comment, Announcement, Note, Event
+
+# Full-text search over posts, comments, announcements, notes and events.
+#
+# Every indexed row lives in one index keyed by doc_id = ref_id * 8 + kind code,
+# so maintenance is a primary-key delete/insert and the kind is recoverable from
+# the key. SQLite uses an FTS5 virtual table; Postgres uses a table with a
+# generated, GIN-indexed tsvector column.
+#
+# Comments are only findable while their post is: deleting (or restoring) a
+# post drops (or re-adds) its comments' documents in the same flush.
+
+SearchSpec = namedtuple("SearchSpec", "code model watch title body visible url")
+
+KINDS = {
+    "post": SearchSpec(
+        1, Post, ("title", "content", "is_deleted"),
+        lambda p: p.title, lambda p: p.content,
+        lambda p: not p.is_deleted,
+        lambda p: url_for("feed.post_detail", post_id=p.id),
+    ),
+    "comment": SearchSpec(
+        2, Comment, ("content", "is_deleted"),
+        lambda c: "", lambda c: c.content,
+        lambda c: not c.is_deleted,
+        lambda c: url_for("feed.post_detail", post_id=c.post_id),
+    ),
+    "announcement": SearchSpec(
+        3, Announcement, ("title", "content", "category"),
+        lambda a: a.title, lambda a: " ".join(filter(None, [a.content, a.category])),
+        lambda a: True,
+        lambda a: url_for("announcements.announcement_list") + f"#announcement-{a.id}",
+    ),
+    "note": SearchSpec(
+        4, Note, ("title", "description", "subject"),
+        lambda n: n.title, lambda n: " ".join(filter(None, [n.subject, n.description])),
+        lambda n: True,
+        lambda n: url_for("resources.note_download", note_id=n.id),
+    ),
+    "event": SearchSpec(
+        5, Event, ("title", "description", "location", "category"),
+        lambda e: e.title, lambda e: " ".join(filter(None, [e.description, e.location, e.category])),
+        lambda e: True,
+        lambda e: url_for("events.event_details", event_id=e.id),
+    ),
+}
+KIND_BY_CODE = {spec.code: kind for kind, spec in KINDS.items()}
+KIND_BY_MODEL = {spec.model: kind for kind, spec in KINDS.items()}
+
+# Snippet markers: control characters that survive HTML escaping untouched
+MARK_START, MARK_END = "\x02", "\x03"
+
+
+def doc_id(kind, ref_id):
+    return ref_id * 8 + KINDS[kind].code
+
+
+def _is_postgres(bind):
+    return bind.dialect.name == "postgresql"
+
+
+# Split free text into word terms; each becomes a prefix match, ANDed together
+def _terms(text):
+    return re.findall(r"\w+", text or "", re.UNICODE)[:12]
+
+
+def _fts5_query(terms):
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _tsquery(terms):
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+# --- Index DDL ---
+
+def create_search_index(bind):
+    """Create the index if missing; ``bind`` is an Engine or a Connection inside a transaction."""
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            return create_search_index(conn)
+    if _is_postgres(bind):
+        bind.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS search_documents ("
+            " doc_id BIGINT PRIMARY KEY,"
+            " title TEXT NOT NULL DEFAULT '',"
+            " body TEXT NOT NULL DEFAULT '',"
+            " tsv tsvector GENERATED ALWAYS AS ("
+            "  setweight(to_tsvector('english', title), 'A') ||"
+            "  setweight(to_tsvector('english', body), 'B')) STORED)"
+        )
+        bind.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_search_documents_tsv"
+            " ON search_documents USING GIN (tsv)"
+        )
+    else:
+        bind.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index"
+            " USING fts5(title, body, tokenize='porter unicode61')"
+        )
+
+
+# --- Index maintenance ---
+
+def _write(conn, upserts, removals):
+    if _is_postgres(conn):
+        if removals:
+            conn.execute(db.text("DELETE FROM search_documents WHERE doc_id = :doc_id"), removals)
+        if upserts:
+            conn.execute(
+                db.text(
+                    "INSERT INTO search_documents (doc_id, title, body)"
+                    " VALUES (:doc_id, :title, :body)"
+                    " ON CONFLICT (doc_id) DO UPDATE"
+                    " SET title = excluded.title, body = excluded.body"
+                ),
+                upserts,
+            )
+        return
+    stale = removals + [{"doc_id": row["doc_id"]} for row in upserts]
+    if stale:
+        conn.execute(db.text("DELETE FROM search_index WHERE rowid = :doc_id"), stale)
+    if upserts:
+        conn.execute(
+            db.text("INSERT INTO search_index (rowid, title, body) VALUES (:doc_id, :title, :body)"),
+            upserts,
+        )
+
+
+def _document(kind, obj):
+    spec = KINDS[kind]
+    return {"doc_id": doc_id(kind, obj.id), "title": spec.title(obj) or "", "body": spec.body(obj) or ""}
+
+
+def _changed(kind, obj):
+    attrs = inspect(obj).attrs
+    return any(attrs[name].history.has_changes() for name in KINDS[kind].watch)
+
+
+# Runs inside the flush's transaction, so the index commits or rolls back with the rows
+def _sync_index(session, flush_context):
+    upserts, removals = [], []
+    for obj in session.new:
+        kind = KIND_BY_MODEL.get(type(obj))
+        if kind and KINDS[kind].visible(obj):
+            upserts.append(_document(kind, obj))
+    for obj in session.dirty:
+        kind = KIND_BY_MODEL.get(type(obj))
+        if not kind or not _changed(kind, obj):
+            continue
+        if KINDS[kind].visible(obj):
+            upserts.append(_document(kind, obj))
+        else:
+            removals.append({"doc_id": doc_id(kind, obj.id)})
+    for obj in session.deleted:
+        kind = KIND_BY_MODEL.get(type(obj))
+        if kind:
+            removals.append({"doc_id": doc_id(kind, obj.id)})
+    toggled = [
+        obj for obj in session.dirty
+        if isinstance(obj, Post) and inspect(obj).attrs.is_deleted.history.has_changes()
+    ]
+    if toggled:
+        _post_comments(session.connection(), toggled, upserts, removals)
+    if upserts or removals:
+        # A comment edited in the same flush as its post's delete is written once, the delete winning
+        removed = {row["doc_id"] for row in removals}
+        upserts = list({row["doc_id"]: row for row in upserts if row["doc_id"] not in removed}.values())
+        _write(session.connection(), upserts, removals)
+
+
+def _post_comments(conn, posts, upserts, removals):
+    hidden = {post.id for post in posts if post.is_deleted}
+    table = Comment.__table__
+    rows = conn.execute(
+        db.select(table.c.id, table.c.post_id, table.c.content, table.c.is_deleted)
+        .where(table.c.post_id.in_([post.id for post in posts]))
+    )
+    for row in rows:
+        if row.post_id in hidden or row.is_deleted:
+            removals.append({"doc_id": doc_id("comment", row.id)})
+        else:
+            upserts.append(_document("comment", row))
+
+
+# Keep the index in step with writes; the index itself is created by migrations
+def init_search():
+    if not event.contains(Session, "after_flush", _sync_index):
+        event.listen(Session, "after_flush", _sync_index)
+
+
+def rebuild_index(batch_size=1000, commit=True):
+    """Drop and repopulate the whole index from the source tables; returns rows indexed.
+
+    Reads only the id and watched columns with Core selects, so a migration
+    can run it against an older schema; it passes ``commit=False`` to keep
+    the rebuild in its own transaction.
+    """
+    conn = db.session.connection()
+    if _is_postgres(conn):
+        conn.execute(db.text("DELETE FROM search_documents"))
+    else:
+        conn.execute(db.text("DELETE FROM search_index"))
+    total = 0
+    for kind, spec in KINDS.items():
+        batch = []
+        table = spec.model.__table__
+        query = db.select(table.c.id, *(table.c[name] for name in spec.watch))
+        if spec.model is Comment:
+            posts = Post.__table__
+            query = query.where(table.c.post_id.not_in(db.select(posts.c.id).where(posts.c.is_deleted == True)))
+        rows = conn.execute(query.execution_options(yield_per=batch_size))
+        for obj in rows:
+            if spec.visible(obj):
+                batch.append(_document(kind, obj))
+            if len(batch) >= batch_size:
+                _write(conn, batch, [])
+                total += len(batch)
+                batch = []
+        if batch:
+            _write(conn, batch, [])
+            total += len(batch)
+    if not _is_postgres(conn):
+        conn.execute(db.text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+    if commit:
+        db.session.commit()
+    return total
+
+
+# --- Querying ---
+
+def matching_ids(kind, text):
+    """Subquery of ``kind`` ids matching ``text``, for use in ``Model.id.in_(...)``."""
+    terms = _terms(text)
+    if not terms:
+        return db.select(db.literal(None)).where(db.false())
+    code = KINDS[kind].code
+    if _is_postgres(db.session.get_bind()):
+        return db.text(
+            "SELECT doc_id / 8 FROM search_documents"
+            " WHERE tsv @@ to_tsquery('english', :q) AND doc_id % 8 = :code"
+        ).bindparams(q=_tsquery(terms), code=code).columns(db.column("ref_id", db.Integer))
+    return db.text(
+        "SELECT rowid / 8 FROM search_index WHERE search_index MATCH :q AND rowid % 8 = :code"
+    ).bindparams(q=_fts5_query(terms), code=code).columns(db.column("ref_id", db.Integer))
+
+
+def _highlight(snippet):
+    return Markup(
+        str(escape(snippet or "")).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+    )
+
+
+def search(text, kinds=None, limit=20, offset=0):
+    """Ranked hits across the indexed models, best first."""
+    terms = _terms(text)
+    if not terms:
+        return []
+    codes = [KINDS[kind].code for kind in (kinds or KINDS)]
+    code_filter = ", ".join(str(code) for code in codes)
+    if _is_postgres(db.session.get_bind()):
+        sql = (
+            "SELECT doc_id, ts_rank_cd(tsv, q) AS rank,"
+            " ts_headline('english', title, q, :title_opts) AS title_hl,"
+            " ts_headline('english', body, q, :body_opts) AS body_hl"
+            " FROM search_documents, to_tsquery('english', :q) AS q"
+            f" WHERE tsv @@ q AND doc_id % 8 IN ({code_filter})"
+            " ORDER BY rank DESC LIMIT :limit OFFSET :offset"
+        )
+        params = {
+            "q": _tsquery(terms),
+            "title_opts": f"StartSel={MARK_START}, StopSel={MARK_END}, HighlightAll=true",
+            "body_opts": f"StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=30, MinWords=10",
+        }
+    else:
+        sql = (
+            "SELECT rowid AS doc_id, bm25(search_index, 10.0, 1.0) AS rank,"
+            " highlight(search_index, 0, :start, :end) AS title_hl,"
+            " snippet(search_index, 1, :start, :end, '…', 24) AS body_hl"
+            " FROM search_index"
+            f" WHERE search_index MATCH :q AND rowid % 8 IN ({code_filter})"
+            " ORDER BY rank LIMIT :limit OFFSET :offset"
+        )
+        params = {"q": _fts5_query(terms), "start": MARK_START, "end": MARK_END}
+    params.update(limit=limit, offset=offset)
+    hits = db.session.execute(db.text(sql), params).all()
+
+    # Load the matched rows per kind in one query each, then keep index order
+    wanted = {}
+    for hit in hits:
+        wanted.setdefault(KIND_BY_CODE[hit.doc_id % 8], []).append(hit.doc_id // 8)
+    loaded = {}
+    for kind, ids in wanted.items():
+        model = KINDS[kind].model
+        query = model.query.filter(model.id.in_(ids))
+        if model is Comment:
+            # The index can lag a post's delete (a bulk write, a restore from backup)
+            query = query.join(Post, Post.id == Comment.post_id).filter(Post.is_deleted == False)
+        for obj in query:
+            loaded[(kind, obj.id)] = obj
+
+    results = []
+    for hit in hits:
+        kind = KIND_BY_CODE[hit.doc_id % 8]
+        obj = loaded.get((kind, hit.doc_id // 8))
+        if obj is None or not KINDS[kind].visible(obj):
+            continue
+        results.append({
+            "kind": kind,
+            "id": obj.id,
+            "url": KINDS[kind].url(obj),
+            "title": _highlight(hit.title_hl) if hit.title_hl else Markup(escape(KINDS[kind].title(obj) or kind.title())),
+            "snippet": _highlight(hit.body_hl),
+            "rank": hit.rank,
+        })
+    return results
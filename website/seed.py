@@ -0,0 +1,264 @@
+import random
+from datetime import date, datetime, time, timedelta
+
+from website.models import (
+    db, User, Tag, Post, Comment, Like, Announcement, Event, Note, Result, Attendance, Section, SectionPeriod,
+    post_tags, announcement_tags, event_rsvps,
+)
+from website.attendance import rebuild_summaries
+from website.cache import cache
+from website.passwords import hasher
+from website.results import recompute_results
+from website.rsvp import reconcile_counts
+from website.notifications import backfill_changes
+from website.search import rebuild_index
+from website.timetable import NAMESPACE as TIMETABLE
+
+# Synthetic campus data for load tests and capacity sizing.
+#
+# Volumes scale with the student count; the defaults approximate one term of
+# activity on a campus (5,000 students in sections of 60: 125 teachers, 2,500
+# posts, 10k comments, 20k likes, 30 days of attendance). Rows go in with bulk inserts,
+# bypassing the ORM's per-object flush, then the derived data the app keeps
+# in step on writes (post counters, SGPA/CGPA, attendance summaries, the
+# search index) is rebuilt once at the end. Every seeded account has the same
+# password. The same seed and sizes produce the same rows, with timestamps
+# relative to today.
+#
+#     flask seed-campus --students 5000
+
+BATCH_SIZE = 5000
+SECTION_SIZE = 60
+PERIOD_STARTS = [time(9, 0), time(10, 0), time(11, 0), time(12, 0), time(14, 0), time(15, 0)]
+
+TAGS = [
+    "exams", "placements", "hackathon", "sports", "library", "hostel", "canteen", "clubs",
+    "internships", "lost-and-found", "notes", "fest", "research", "alumni", "scholarships",
+]
+SUBJECTS = [
+    "Mathematics", "Physics", "Chemistry", "Data Structures", "Algorithms", "Operating Systems",
+    "Databases", "Computer Networks", "Digital Logic", "Economics", "Communication Skills",
+    "Machine Learning",
+]
+ANNOUNCEMENT_CATEGORIES = ["academic", "exam", "placement", "event", "general", "holiday"]
+EVENT_CATEGORIES = ["workshop", "seminar", "sports", "cultural", "hackathon", "club"]
+GRADES = "OEABCDF"
+WORDS = (
+    "class lab exam notes assignment project deadline semester library campus hostel "
+    "canteen placement internship result syllabus lecture tutorial seminar workshop "
+    "club fest team question answer schedule room professor submission review quiz"
+).split()
+
+
+class SeedError(RuntimeError):
+    pass
+
+
+def _sentence(rng, low, high):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize()
+
+
+def _moment(rng, now, days):
+    # Skewed towards recent activity
+    return now - timedelta(days=days * rng.random() ** 2, seconds=rng.randrange(86400))
+
+
+def _insert_rows(table, rows, batch_size=BATCH_SIZE):
+    for i in range(0, len(rows), batch_size):
+        db.session.execute(table.insert(), rows[i:i + batch_size])
+    return len(rows)
+
+
+def _insert(model, rows):
+    """Bulk insert ``rows``; returns the new primary keys in insertion order."""
+    start = db.session.scalar(db.select(db.func.max(model.id))) or 0
+    _insert_rows(model.__table__, rows)
+    return db.session.scalars(db.select(model.id).where(model.id > start).order_by(model.id)).all()
+
+
+def seed_campus(
+    students=5000,
+    password="nexus123",
+    seed=1,
+    semesters=4,
+    attendance_days=30,
+    posts_per_student=0.5,
+    comments_per_post=4,
+    likes_per_post=8,
+    progress=None,
+):
+    """Fill the database with a synthetic campus; returns ``{table: rows added}``.
+
+    Accounts are ``student00000``, ``teacher000``, ``cr000`` and so on, all
+    with ``password``. Refuses to run twice against the same database.
+    """
+    if db.session.scalar(db.select(User.id).where(User.username == "student00000")):
+        raise SeedError("this database has already been seeded")
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    counts = {}
+
+    def added(name, count):
+        counts[name] = counts.get(name, 0) + count
+        if progress:
+            progress(name, count)
+
+    # Users: one hash shared by every account keeps seeding fast
+    password_hash = hasher.hash(password)
+    teachers_n = max(1, students // 40)
+    crs_n = max(1, students // 60)
+    accounts = (
+        [("student", f"student{i:05d}", f"Student {i}") for i in range(students)]
+        + [("teacher", f"teacher{i:03d}", f"Teacher {i}") for i in range(teachers_n)]
+        + [("cr", f"cr{i:03d}", f"Class Rep {i}") for i in range(crs_n)]
+    )
+    sections_n = max(1, students // SECTION_SIZE)
+    section_ids = _insert(Section, [{"name": f"Section {i + 1:03d}"} for i in range(sections_n)])
+    added("sections", len(section_ids))
+    user_ids = _insert(User, [
+        {"name": name, "username": username, "email": f"{username}@campus.example",
+         "password_hash": password_hash, "role": role, "created_at": _moment(rng, now, 365),
+         "section_id": section_ids[min(i // SECTION_SIZE, sections_n - 1)] if role == "student" else None}
+        for i, (role, username, name) in enumerate(accounts)
+    ])
+    student_ids = user_ids[:students]
+    teacher_ids = user_ids[students:students + teachers_n]
+    cr_ids = user_ids[students + teachers_n:]
+    posters = teacher_ids + cr_ids
+    added("users", len(user_ids))
+
+    # Timetables: six 50-minute periods a weekday, rotating over six subjects per section
+    periods = []
+    for section_id in section_ids:
+        subjects = rng.sample(SUBJECTS, 6)
+        teachers = {subject: rng.choice(teacher_ids) for subject in subjects}
+        for weekday in range(5):
+            for i, start in enumerate(PERIOD_STARTS):
+                subject = subjects[(weekday + i) % 6]
+                periods.append({
+                    "section_id": section_id, "weekday": weekday, "period": str(i + 1), "subject": subject,
+                    "start_time": start, "end_time": time(start.hour, 50),
+                    "location": f"Room {rng.randint(101, 420)}", "teacher_id": teachers[subject],
+                })
+    added("section_periods", _insert_rows(SectionPeriod.__table__, periods))
+
+    existing = set(db.session.scalars(db.select(Tag.name)))
+    added("tags", len(_insert(Tag, [{"name": name} for name in TAGS if name not in existing])))
+    tag_ids = db.session.scalars(db.select(Tag.id).where(Tag.name.in_(TAGS))).all()
+
+    # Feed: posts, then comments and likes whose counts are written into the counters
+    authors = student_ids + cr_ids
+    posts = []
+    for _ in range(int(students * posts_per_student)):
+        posts.append({
+            "author_id": rng.choice(authors),
+            "title": _sentence(rng, 3, 8),
+            "content": _sentence(rng, 10, 60),
+            "created_at": _moment(rng, now, 120),
+            "is_deleted": rng.random() < 0.01,
+            "is_reported": False,
+            "comment_count": min(len(authors), int(rng.expovariate(1 / comments_per_post))),
+            "like_count": min(len(user_ids), int(rng.expovariate(1 / likes_per_post))),
+        })
+    post_ids = _insert(Post, posts)
+    added("posts", len(post_ids))
+    _insert_rows(post_tags, [
+        {"post_id": post_id, "tag_id": tag_id}
+        for post_id in post_ids for tag_id in rng.sample(tag_ids, rng.randint(0, 3))
+    ])
+
+    comments, likes = [], []
+    for post_id, post in zip(post_ids, posts):
+        for _ in range(post["comment_count"]):
+            comments.append({
+                "post_id": post_id,
+                "author_id": rng.choice(authors),
+                "content": _sentence(rng, 3, 30),
+                "created_at": post["created_at"] + timedelta(minutes=rng.randrange(1, 4320)),
+                "is_deleted": False,
+                "is_reported": False,
+            })
+        for user_id in rng.sample(user_ids, post["like_count"]):
+            likes.append({"post_id": post_id, "user_id": user_id, "created_at": post["created_at"]})
+    added("comments", _insert_rows(Comment.__table__, comments))
+    added("likes", _insert_rows(Like.__table__, likes))
+    del comments, likes
+
+    # Announcements and events from teachers and class reps
+    announcements = [
+        {"title": _sentence(rng, 3, 8), "content": _sentence(rng, 20, 80), "posted_by": rng.choice(posters),
+         "posted_at": _moment(rng, now, 120), "category": rng.choice(ANNOUNCEMENT_CATEGORIES),
+         "is_pinned": rng.random() < 0.05}
+        for _ in range(max(1, students // 20))
+    ]
+    announcement_ids = _insert(Announcement, announcements)
+    added("announcements", len(announcement_ids))
+    _insert_rows(announcement_tags, [
+        {"announcement_id": announcement_id, "tag_id": tag_id}
+        for announcement_id in announcement_ids for tag_id in rng.sample(tag_ids, rng.randint(0, 2))
+    ])
+
+    events = []
+    for _ in range(max(1, students // 50)):
+        start = now + timedelta(days=rng.randint(-30, 60), hours=rng.randint(-6, 6))
+        events.append({
+            "title": _sentence(rng, 2, 6), "description": _sentence(rng, 15, 50),
+            "start_time": start, "end_time": start + timedelta(hours=rng.choice((1, 2, 3, 8))),
+            "location": f"Hall {rng.randint(1, 12)}", "category": rng.choice(EVENT_CATEGORIES),
+            "posted_by": rng.choice(posters), "posted_at": start - timedelta(days=rng.randint(1, 20)),
+            "capacity": rng.choice((None, None, 40, 80, 200)),
+        })
+    event_ids = _insert(Event, events)
+    added("events", len(event_ids))
+    _insert_rows(event_rsvps, [
+        {"event_id": event_id, "user_id": user_id}
+        for event_id, event in zip(event_ids, events)
+        for user_id in rng.sample(student_ids, min(len(student_ids), event["capacity"] or 80, rng.randint(0, 80)))
+    ])
+
+    added("notes", _insert_rows(Note.__table__, [
+        {"title": _sentence(rng, 2, 6), "description": _sentence(rng, 5, 20),
+         "file_url": f"/static/uploads/seed-{i}.pdf", "semester": rng.randint(1, 8),
+         "subject": rng.choice(SUBJECTS), "uploaded_by": rng.choice(posters),
+         "uploaded_at": _moment(rng, now, 365)}
+        for i in range(max(1, students // 10))
+    ]))
+
+    # Results: one marksheet per completed semester; SGPA/CGPA come from the engine
+    results = []
+    for student_id in student_ids:
+        subjects = rng.sample(SUBJECTS, 6)
+        for semester in range(1, semesters + 1):
+            results.append({"student_id": student_id, "semester": semester, "details": {"subjects": [
+                {"code": subject, "credits": rng.choice((2, 3, 4)), "grade": rng.choice(GRADES)}
+                for subject in subjects
+            ]}})
+    added("results", _insert_rows(Result.__table__, results))
+    del results
+
+    # Attendance: one class a day over the last ``attendance_days`` weekdays
+    days, day = [], date.today()
+    while len(days) < attendance_days:
+        day -= timedelta(days=1)
+        if day.weekday() < 5:
+            days.append(day)
+    marked_at = {day: datetime.combine(day, time(9, 30)) for day in days}
+    attendance = 0
+    for i in range(0, len(student_ids), 500):
+        attendance += _insert_rows(Attendance.__table__, [
+            {"student_id": student_id, "date": day, "subject": rng.choice(SUBJECTS[:6]),
+             "marked_by": rng.choice(teacher_ids), "marked_at": marked_at[day],
+             "status": "present" if rng.random() < 0.85 else rng.choice(("absent", "late"))}
+            for student_id in student_ids[i:i + 500] for day in days
+        ])
+    added("attendance", attendance)
+    db.session.commit()
+
+    recompute_results(student_ids=student_ids, force=True)
+    db.session.commit()
+    rebuild_summaries()
+    reconcile_counts()
+    backfill_changes()
+    rebuild_index()
+    cache.invalidate(TIMETABLE)
+    return counts
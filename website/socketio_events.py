@@ -1,14 +1,147 @@
-from flask_socketio import SocketIO, emit
+import threading
+import time
 
-socketio = SocketIO(cors_allowed_origins="*")
+from flask import current_app
+from flask_login import current_user
+from flask_socketio import SocketIO, emit, join_room
+
+from website.message_queue import queue_options
+from website.tasks import enqueue, task
+from website.timetable import timetable, reminders
+
+# Configured in register_socketio_events from app.config
+socketio = SocketIO()
+
+# Rooms: feed page viewers, one per post and per event page, and admins for
+# moderation reports; every user joins their own room and the announcements
+# room, students also their timetable room
+FEED_ROOM = "feed"
+MODERATORS_ROOM = "moderators"
+ANNOUNCEMENTS_ROOM = "announcements"
+MAX_WATCHED_POSTS = 200
+
+
+def post_room(post_id):
+    return f"post:{post_id}"
+
+
+def event_room(event_id):
+    return f"event:{event_id}"
+
+
+def user_room(user_id):
+    return f"user:{user_id}"
+
+
+# Broadcasts queued by write routes go out from a task worker after the commit.
+# A worker process serving no sockets sets app.extensions["socketio_emitter"]
+# to a message queue emitter (see ``flask tasks-worker``)
+@task("socket.emit", retries=2, backoff=2)
+def emit_task(event, data, room=None):
+    emitter = current_app.extensions.get("socketio_emitter", socketio)
+    emitter.emit(event, data, namespace="/", to=room)
+
+
+def emit_after_commit(event, data, room=None):
+    """Queue a broadcast that is sent once the current transaction commits; returns its job."""
+    return enqueue("socket.emit", event=event, data=data, room=room)
+
+
+class LikeCountBuffer:
+    """Coalesces like-count updates so each post gets at most one emit per interval.
+
+    Only the latest count per post is kept; a background task flushes the
+    buffer every ``interval`` seconds. An interval of 0 emits immediately.
+    """
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.task = None
+
+    def add(self, post_id, count):
+        if not self.interval:
+            self.emit(post_id, count, time.time())
+            return
+        with self.lock:
+            self.pending[post_id] = (count, time.time())
+            if self.task is None:
+                self.task = socketio.start_background_task(self._run)
+
+    def emit(self, post_id, count, ts):
+        # ts lets clients ignore an older count flushed late by another worker
+        socketio.emit('broadcast_like_post', {'post_id': post_id, 'count': count, 'ts': ts}, to=post_room(post_id))
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for post_id, (count, ts) in pending.items():
+            self.emit(post_id, count, ts)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.interval)
+            self.flush()
+
+
+like_counts = LikeCountBuffer()
+
+
+class SeatCountBuffer(LikeCountBuffer):
+    """The same coalescing for event seat counts, which move in bursts when registration opens."""
+
+    def emit(self, event_id, seats, ts):
+        socketio.emit('event_seats', dict(seats, event_id=event_id, ts=ts), to=event_room(event_id))
+
+
+seat_counts = SeatCountBuffer()
 
 # --- SocketIO event handlers ---
 
 def register_socketio_events(app):
+    like_counts.interval = app.config.get("SOCKETIO_LIKE_BATCH_MS", 500) / 1000
+    seat_counts.interval = like_counts.interval
+
     @socketio.on('connect')
     def handle_connect():
+        if current_user.is_authenticated and current_user.role == 'admin':
+            join_room(MODERATORS_ROOM)
+        if current_user.is_authenticated:
+            join_room(user_room(current_user.id))
+            join_room(ANNOUNCEMENTS_ROOM)
+            room = timetable.room(current_user.id)
+            if room:
+                join_room(room)
+                reminders.start(socketio, current_app._get_current_object())
         emit('connected', {'message': 'Connected to live feed!'})
 
+    # Subscribe to new posts and/or to the posts currently on screen
+    @socketio.on('watch_posts')
+    def handle_watch_posts(data):
+        if not current_user.is_authenticated or not isinstance(data, dict):
+            return
+        if data.get('feed'):
+            join_room(FEED_ROOM)
+        post_ids = data.get('post_ids')
+        if not isinstance(post_ids, list):
+            return
+        for post_id in post_ids[:MAX_WATCHED_POSTS]:
+            if isinstance(post_id, int):
+                join_room(post_room(post_id))
+
+    # Subscribe to live seat counts of the events on screen
+    @socketio.on('watch_events')
+    def handle_watch_events(data):
+        if not current_user.is_authenticated or not isinstance(data, dict):
+            return
+        event_ids = data.get('event_ids')
+        if not isinstance(event_ids, list):
+            return
+        for event_id in event_ids[:MAX_WATCHED_POSTS]:
+            if isinstance(event_id, int):
+                join_room(event_room(event_id))
+
     # Broadcast new post
     @socketio.on('new_post')
     def handle_new_post(data):
@@ -31,4 +164,12 @@ def register_socketio_events(app):
 
     # You can add more events as needed
 
-    socketio.init_app(app)
+    socketio.init_app(
+        app,
+        cors_allowed_origins=app.config.get("SOCKETIO_CORS_ALLOWED_ORIGINS", "*"),
+        async_mode=app.config.get("SOCKETIO_ASYNC_MODE"),
+        **queue_options(
+            app.config.get("SOCKETIO_MESSAGE_QUEUE"),
+            app.config.get("SOCKETIO_CHANNEL", "flask-socketio"),
+        ),
+    )
@@ -0,0 +1,330 @@
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from flask import abort, current_app, make_response, request
+from werkzeug.utils import secure_filename, send_file
+from flask_login import current_user
+
+from website.cache import LRUCache, MISSING
+from website.models import db, dialect_insert, StoredFile, ChunkedUpload, MediaVariant
+
+# Content-addressed upload storage.
+#
+# Uploads are copied to disk in CHUNK_SIZE pieces while being hashed, then
+# renamed to <root>/<sha[:2]>/<sha><ext>. A body that is already stored is
+# not written twice; StoredFile.ref_count tracks how many rows point at it and
+# ``flask storage-gc`` removes blobs nobody references any more, along with
+# their media variants. New blobs get a website.media job queued in the
+# transaction that stored them.
+
+CHUNK_SIZE = 64 * 1024
+
+ALLOWED_EXTENSIONS = {
+    "pdf", "doc", "docx", "ppt", "pptx", "xls", "xlsx", "txt", "csv", "zip",
+    "png", "jpg", "jpeg", "gif", "webp",
+}
+
+
+class UploadError(ValueError):
+    pass
+
+
+def storage_root():
+    return current_app.config.get("UPLOAD_ROOT") or os.path.join(current_app.static_folder, "blobs")
+
+
+def url_prefix():
+    return current_app.config.get("UPLOAD_URL_PREFIX", "/static/blobs")
+
+
+def blob_url(blob):
+    return f"{url_prefix()}/{blob.path}"
+
+
+def _extension(filename):
+    name = secure_filename(filename or "")
+    ext = name.rsplit(".", 1)[1].lower() if "." in name else ""
+    if ext not in current_app.config.get("UPLOAD_EXTENSIONS", ALLOWED_EXTENSIONS):
+        raise UploadError(f"Files of type '.{ext}' are not allowed.")
+    return "." + ext
+
+
+def _scratch_path(kind, name):
+    folder = os.path.join(storage_root(), kind)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, name)
+
+
+# Helper: copy a stream to an open file in chunks, returning (sha256, size)
+def _copy_hashed(stream, out, limit=None):
+    digest = hashlib.sha256()
+    size = 0
+    while limit is None or size < limit:
+        chunk = stream.read(CHUNK_SIZE if limit is None else min(CHUNK_SIZE, limit - size))
+        if not chunk:
+            break
+        out.write(chunk)
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Move a fully written scratch file into place, or drop it if the body is already stored
+def _commit_blob(tmp_path, sha256, size, ext):
+    blob = db.session.get(StoredFile, sha256)
+    if blob is not None:
+        dest = os.path.join(storage_root(), blob.path)
+        if os.path.exists(dest):
+            os.remove(tmp_path)
+        else:
+            # The row outlived its file (a restored database, a lost disk): put the body back where it points
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(tmp_path, dest)
+        return blob
+    path = f"{sha256[:2]}/{sha256}{ext}"
+    dest = os.path.join(storage_root(), path)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    os.replace(tmp_path, dest)
+    db.session.execute(
+        dialect_insert(StoredFile.__table__)
+        .values(sha256=sha256, path=path, size=size, ref_count=0, created_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["sha256"])
+    )
+    db.session.info.setdefault("new_blobs", set()).add(sha256)
+    return db.session.get(StoredFile, sha256)
+
+
+def _add_ref(sha256, delta):
+    db.session.execute(
+        db.update(StoredFile)
+        .where(StoredFile.sha256 == sha256)
+        .values(ref_count=StoredFile.ref_count + delta)
+    )
+
+
+def save_stream(stream, filename):
+    """Store a file body and take a reference on it; returns its URL. The caller commits."""
+    ext = _extension(filename)
+    tmp_path = _scratch_path("tmp", uuid.uuid4().hex)
+    try:
+        with open(tmp_path, "wb") as out:
+            sha256, size = _copy_hashed(stream, out)
+        blob = _commit_blob(tmp_path, sha256, size, ext)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _add_ref(blob.sha256, 1)
+    return blob_url(blob)
+
+
+def claim_upload(upload_id, user_id):
+    """Take a reference on a finished chunked upload; returns its URL."""
+    upload = ChunkedUpload.query.filter_by(id=upload_id, user_id=user_id).first()
+    if upload is None or upload.sha256 is None:
+        raise UploadError("That upload is missing or has not finished.")
+    _add_ref(upload.sha256, 1)
+    blob = db.session.get(StoredFile, upload.sha256)
+    db.session.delete(upload)
+    return blob_url(blob)
+
+
+def file_from_request(request):
+    """URL for the form's file, from either a finished chunked upload or a plain file field."""
+    upload_id = request.form.get("upload_id")
+    if upload_id:
+        return claim_upload(upload_id, current_user.id)
+    file = request.files.get("file")
+    if file and file.filename:
+        return save_stream(file.stream, file.filename)
+    return None
+
+
+def release(url):
+    """Drop a reference taken by save_stream/claim_upload; files from before the store are ignored."""
+    prefix = url_prefix() + "/"
+    if url and url.startswith(prefix):
+        sha256 = os.path.basename(url).split(".", 1)[0]
+        _add_ref(sha256, -1)
+
+
+def local_path(url):
+    """Filesystem path behind a stored file URL, including pre-store /static/ uploads."""
+    prefix = url_prefix() + "/"
+    if url.startswith(prefix):
+        return os.path.join(storage_root(), url[len(prefix):])
+    if url.startswith("/static/"):
+        return os.path.join(current_app.static_folder, url[len("/static/"):])
+    return os.path.join(current_app.static_folder, "uploads", url)
+
+
+def public_url(url):
+    """URL a browser can fetch for a stored file URL; posts from before the store kept a bare filename."""
+    if not url or url.startswith("/") or "://" in url:
+        return url
+    return f"/static/uploads/{url}"
+
+
+# --- Downloads ---
+
+# sha256 of pre-store files, keyed by (path, mtime, size) so edits on disk re-hash
+_legacy_etags = LRUCache(maxsize=4096, ttl=0)
+
+
+def content_etag(url, path):
+    """Strong ETag from the file body: free for stored blobs, hashed once for older files."""
+    prefix = url_prefix() + "/"
+    if url.startswith(prefix):
+        return os.path.basename(url).split(".", 1)[0]
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    etag = _legacy_etags.get(key)
+    if etag is MISSING:
+        etag = _hash_file(path)
+        _legacy_etags.set(key, etag)
+    return etag
+
+
+def _accel_path(url, path):
+    prefix = url_prefix() + "/"
+    if url.startswith(prefix):
+        base = current_app.config.get("X_ACCEL_BLOBS_PREFIX", "/_protected/blobs")
+        return f"{base}/{url[len(prefix):]}"
+    base = current_app.config.get("X_ACCEL_STATIC_PREFIX", "/_protected/static")
+    return f"{base}/{os.path.relpath(path, current_app.static_folder)}"
+
+
+def send_stored_file(url, download_name):
+    """Send a stored file as an attachment with Range, ETag and conditional GET support.
+
+    DOWNLOAD_OFFLOAD picks who streams the bytes:
+      None          the worker does, via send_file (Range/If-Range included)
+      "x-sendfile"  Apache/lighttpd, via an X-Sendfile header
+      "x-accel"     nginx, via X-Accel-Redirect to an internal location that
+                    aliases the storage root / static folder
+    In the offload modes the worker only answers 304s and writes headers.
+    """
+    path = local_path(url)
+    if not os.path.isfile(path):
+        abort(404)
+    etag = content_etag(url, path)
+    max_age = current_app.config.get("DOWNLOAD_MAX_AGE", 3600)
+    mode = current_app.config.get("DOWNLOAD_OFFLOAD")
+
+    if mode == "x-accel":
+        response = make_response("")
+        response.headers["X-Accel-Redirect"] = _accel_path(url, path)
+        response.headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.max_age = max_age
+        return response.make_conditional(request)
+
+    response = send_file(
+        path,
+        request.environ,
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        etag=etag,
+        max_age=max_age,
+        use_x_sendfile=mode == "x-sendfile",
+        response_class=current_app.response_class,
+    )
+    response.cache_control.private = True
+    response.cache_control.public = False
+    return response
+
+
+# --- Resumable chunked uploads ---
+
+def start_upload(user_id, filename, size):
+    _extension(filename)
+    limit = current_app.config.get("MAX_UPLOAD_SIZE", 512 * 1024 * 1024)
+    if size <= 0 or size > limit:
+        raise UploadError(f"Uploads must be between 1 byte and {limit} bytes.")
+    upload = ChunkedUpload(id=uuid.uuid4().hex, user_id=user_id, filename=filename, size=size, received=0)
+    open(_scratch_path("partial", upload.id), "wb").close()
+    db.session.add(upload)
+    return upload
+
+
+def append_chunk(upload, start, stream, length):
+    """Write bytes [start, start + length) of an upload; finishes it once every byte is in.
+
+    Chunks must arrive in order: ``start`` has to equal what was already
+    received, and the body must hold all ``length`` bytes. Otherwise
+    UploadError is raised and the client resumes from ``upload.received``.
+    The caller commits.
+    """
+    if upload.sha256 is not None or start != upload.received or start + length > upload.size:
+        raise UploadError("Chunk does not continue the upload.")
+    partial = _scratch_path("partial", upload.id)
+    with open(partial, "r+b") as out:
+        out.seek(start)
+        _, written = _copy_hashed(stream, out, limit=length)
+        # A short body (a dropped connection) is not kept; the client resends the whole chunk
+        out.truncate(start if written != length else None)
+    if written != length:
+        raise UploadError(f"Chunk ended after {written} of {length} bytes.")
+    # Conditional bump so two workers racing on the same chunk cannot both count it
+    bumped = db.session.execute(
+        db.update(ChunkedUpload)
+        .where(ChunkedUpload.id == upload.id, ChunkedUpload.received == start)
+        .values(received=start + written)
+    ).rowcount
+    if not bumped:
+        raise UploadError("Chunk does not continue the upload.")
+    db.session.refresh(upload)
+    if upload.received == upload.size:
+        blob = _commit_blob(partial, _hash_file(partial), upload.size, _extension(upload.filename))
+        upload.sha256 = blob.sha256
+    return upload
+
+
+def collect_garbage(grace=timedelta(days=1)):
+    """Delete unreferenced blobs and abandoned chunked uploads older than ``grace``; returns files removed."""
+    cutoff = datetime.utcnow() - grace
+    removed = 0
+    for upload in ChunkedUpload.query.filter(ChunkedUpload.created_at < cutoff):
+        partial = _scratch_path("partial", upload.id)
+        if os.path.exists(partial):
+            os.remove(partial)
+            removed += 1
+        db.session.delete(upload)
+    db.session.flush()
+    pending = db.select(ChunkedUpload.sha256).where(ChunkedUpload.sha256.is_not(None))
+    orphans = StoredFile.query.filter(
+        StoredFile.ref_count <= 0,
+        StoredFile.created_at < cutoff,
+        StoredFile.sha256.not_in(pending),
+    ).all()
+    for blob in orphans:
+        unreferenced = StoredFile.query.filter(
+            StoredFile.sha256 == blob.sha256, StoredFile.ref_count <= 0
+        ).exists()
+        variants = db.session.scalars(
+            db.select(MediaVariant.path).where(MediaVariant.sha256 == blob.sha256, MediaVariant.path != blob.path)
+        ).all()
+        db.session.execute(db.delete(MediaVariant).where(MediaVariant.sha256 == blob.sha256, unreferenced))
+        deleted = db.session.execute(
+            db.delete(StoredFile).where(StoredFile.sha256 == blob.sha256, StoredFile.ref_count <= 0)
+        ).rowcount
+        if not deleted:
+            continue
+        for path in [blob.path, *variants]:
+            path = os.path.join(storage_root(), path)
+            if os.path.exists(path):
+                os.remove(path)
+                removed += 1
+    db.session.commit()
+    return removed
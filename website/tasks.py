@@ -0,0 +1,288 @@
+import logging
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from website.models import db, Job
+
+# Background jobs for work that should not hold up a response.
+#
+# A side effect of a write (a Socket.IO broadcast, media variants for a new
+# upload, recomputing GPAs, a reminder) is queued as a jobs row in the writer's
+# own transaction:
+#
+#     db.session.add(post)
+#     enqueue("socket.emit", event="broadcast_new_post", data={...}, room=FEED_ROOM)
+#     db.session.commit()          # the post and its job commit together
+#
+# so a rolled-back write queues nothing and a committed one is never lost,
+# even if the process dies straight after. Once the commit lands the local
+# workers are woken; they claim jobs with a conditional UPDATE, so any number
+# of threads and processes can share the table. A failed job is retried with
+# exponential backoff up to its task's ``retries``, then left "failed" for
+# ``flask tasks-retry``. A claim is a lease: a job whose worker died is picked
+# up again once TASK_LEASE_SECONDS pass. Delivery is therefore at least once,
+# and tasks must tolerate running twice.
+#
+# Tasks are plain functions registered with @task(name); their payload is
+# keyword arguments and must be JSON. They run in an app context and may
+# commit; whatever they leave pending is committed after them.
+#
+#     TASK_WORKERS=n          threads per web process, started on first request
+#     TASK_EAGER=1            run jobs inline right after the commit (tests)
+#     flask tasks-worker      a dedicated worker process (TASK_WORKERS=0 on the web)
+#     flask tasks-status      queue depth by task and status
+#     flask tasks-retry       requeue failed jobs
+
+TaskSpec = namedtuple("TaskSpec", "fn retries backoff")
+
+TASKS = {}
+MAX_ERROR_LENGTH = 2000
+
+logger = logging.getLogger(__name__)
+
+
+def task(name, retries=3, backoff=10):
+    """Register ``fn`` as task ``name``: retried ``retries`` times, ``backoff`` seconds apart, doubling."""
+    def register(fn):
+        TASKS[name] = TaskSpec(fn, retries, backoff)
+        return fn
+    return register
+
+
+def enqueue(name, delay=None, **payload):
+    """Queue task ``name`` in the current transaction; it runs after the commit (``delay`` later).
+
+    ``delay`` is a timedelta, or the datetime (UTC) to run at.
+    """
+    spec = TASKS.get(name)
+    if spec is None:
+        raise LookupError(f"Unknown task {name!r}.")
+    run_at = datetime.utcnow()
+    if isinstance(delay, timedelta):
+        run_at += delay
+    elif delay is not None:
+        run_at = delay
+    job = Job(name=name, payload=payload, max_attempts=spec.retries + 1, run_at=run_at)
+    db.session.add(job)
+    db.session.info.setdefault("jobs_enqueued", []).append(job)
+    return job
+
+
+# --- Claiming and running ---
+
+def claimable(now, lease):
+    """Jobs due at ``now``: queued ones, and running ones whose lease ran out with attempts left."""
+    return db.or_(
+        db.and_(Job.status == "queued", Job.run_at <= now),
+        db.and_(Job.status == "running", Job.locked_at < now - lease, Job.attempts < Job.max_attempts),
+    )
+
+
+def next_job_query(now, lease):
+    return db.select(Job.id).where(claimable(now, lease)).order_by(Job.run_at, Job.id).limit(1)
+
+
+def claim(worker, lease, job_ids=None):
+    """Lease the next due job to ``worker`` and commit; None when nothing is due."""
+    while True:
+        now = datetime.utcnow()
+        query = next_job_query(now, lease)
+        if job_ids is not None:
+            query = query.where(Job.id.in_(job_ids))
+        job_id = db.session.scalar(query)
+        if job_id is None:
+            db.session.commit()
+            return None
+        # Another worker may have taken it between the two statements; then try the next one
+        claimed = db.session.execute(
+            db.update(Job)
+            .where(Job.id == job_id, claimable(now, lease))
+            .values(status="running", locked_by=worker, locked_at=now, attempts=Job.attempts + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+
+
+def run_job(job):
+    """Run one claimed job; deletes it on success, else schedules a retry or marks it failed."""
+    job_id, name, payload = job.id, job.name, job.payload
+    attempts, max_attempts, lease = job.attempts, job.max_attempts, (job.locked_by, job.locked_at)
+    spec = TASKS.get(name)
+    try:
+        if spec is None:
+            raise LookupError(f"Unknown task {name!r}.")
+        spec.fn(**payload)
+        db.session.commit()
+    except Exception as exc:
+        db.session.rollback()
+        logger.exception("job %s (%s) failed on attempt %s of %s", job_id, name, attempts, max_attempts)
+        now = datetime.utcnow()
+        failed = attempts >= max_attempts
+        backoff = timedelta(seconds=(spec.backoff if spec else 0) * 2 ** (attempts - 1))
+        outcome = {"status": "failed", "finished_at": now} if failed else {"status": "queued", "run_at": now + backoff}
+        error = f"{type(exc).__name__}: {exc}"[:MAX_ERROR_LENGTH]
+        db.session.execute(
+            db.update(Job)
+            .where(Job.id == job_id, Job.locked_by == lease[0], Job.locked_at == lease[1])
+            .values(locked_by=None, locked_at=None, last_error=error, **outcome)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return False
+    db.session.execute(
+        db.delete(Job)
+        .where(Job.id == job_id, Job.locked_by == lease[0], Job.locked_at == lease[1])
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return True
+
+
+def expire_abandoned(lease):
+    """Fail jobs whose worker died holding their last attempt; returns how many (commits only if any)."""
+    now = datetime.utcnow()
+    expired = db.session.execute(
+        db.update(Job)
+        .where(Job.status == "running", Job.locked_at < now - lease, Job.attempts >= Job.max_attempts)
+        .values(status="failed", finished_at=now, locked_by=None, locked_at=None,
+                last_error="Worker stopped before the job finished.")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if expired:
+        db.session.commit()
+    else:
+        db.session.rollback()
+    return expired
+
+
+def retry_failed(name=None):
+    """Requeue failed jobs (of task ``name``) with a fresh set of attempts; returns how many."""
+    query = db.update(Job).where(Job.status == "failed")
+    if name:
+        query = query.where(Job.name == name)
+    requeued = db.session.execute(
+        query.values(status="queued", attempts=0, run_at=datetime.utcnow(), finished_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return requeued
+
+
+def queue_stats():
+    """{(task name, status): (jobs, oldest run_at)}"""
+    rows = db.session.execute(
+        db.select(Job.name, Job.status, db.func.count(), db.func.min(Job.run_at)).group_by(Job.name, Job.status)
+    )
+    return {(name, status): (count, oldest) for name, status, count, oldest in rows}
+
+
+# --- Workers ---
+
+class TaskRunner:
+    """Worker loops that claim and run jobs until stopped, woken early by local commits."""
+
+    def __init__(self):
+        self.app = None
+        self.workers = 2
+        self.eager = False
+        self.poll = 2.0
+        self.lease = timedelta(minutes=5)
+        self.spawn = None
+        self.started = False
+        self.next_sweep = 0.0
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def worker(self):
+        # Read at use, so a worker forked after init_app still has its own pid
+        return f"{socket.gethostname()}:{os.getpid()}"[:56]
+
+    def init_app(self, app, spawn):
+        self.app = app
+        self.spawn = spawn
+        self.workers = app.config.get("TASK_WORKERS", 2)
+        self.eager = app.config.get("TASK_EAGER", False)
+        self.poll = app.config.get("TASK_POLL_SECONDS", 2.0)
+        self.lease = timedelta(seconds=app.config.get("TASK_LEASE_SECONDS", 300))
+        app.extensions["tasks"] = self
+
+    def start(self):
+        if self.started or self.eager or not self.workers:
+            return
+        with self.lock:
+            if not self.started:
+                for number in range(self.workers):
+                    self.spawn(self.work, f"{self.worker}:{number}")
+                self.started = True
+
+    def wake(self, job_ids):
+        if self.eager:
+            self.run_now(job_ids)
+        elif self.started:
+            self.wakeup.set()
+
+    def run_now(self, job_ids):
+        with self.app.app_context():
+            while (job := claim(f"{self.worker}:eager", self.lease, job_ids)) is not None:
+                run_job(job)
+
+    def work(self, worker, stop=None, burst=False):
+        """Claim and run jobs as ``worker`` until ``stop`` is set (or, with ``burst``, none are due)."""
+        while stop is None or not stop.is_set():
+            try:
+                with self.app.app_context():
+                    job = claim(worker, self.lease)
+                    if job is not None:
+                        run_job(job)
+                        continue
+                    self.sweep()
+            except Exception:
+                logger.exception("task worker %s failed; retrying", worker)
+                time.sleep(self.poll)
+                continue
+            if burst:
+                return
+            self.wakeup.wait(self.poll)
+            self.wakeup.clear()
+
+    def sweep(self):
+        # A lease only runs out once per lease period, so one idle worker per process looks that often
+        with self.lock:
+            if time.monotonic() < self.next_sweep:
+                return
+            self.next_sweep = time.monotonic() + self.lease.total_seconds()
+        expire_abandoned(self.lease)
+
+
+runner = TaskRunner()
+
+
+# --- Hooks: wake the workers once enqueued jobs are committed ---
+
+def _wake_workers(session):
+    jobs = session.info.pop("jobs_enqueued", None)
+    if jobs and runner.app is not None:
+        # Committed objects are expired; their identity does not need a query
+        runner.wake([inspect(job).identity[0] for job in jobs])
+
+
+def _forget_jobs(session):
+    session.info.pop("jobs_enqueued", None)
+
+
+def init_tasks(app, socketio):
+    runner.init_app(app, lambda fn, *args: socketio.start_background_task(fn, *args))
+    app.before_request(runner.start)
+    for name, listener in (("after_commit", _wake_workers), ("after_rollback", _forget_jobs)):
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
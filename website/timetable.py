@@ -0,0 +1,389 @@
+import heapq
+import itertools
+import logging
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from website.cache import cache
+from website.models import db, Section, SectionPeriod, TimetableEntry, User, STUDENT_ROLES, WEEKDAYS
+
+# Timetable engine and class reminders.
+#
+# Schedules are stored once per section (section_periods) plus any personal
+# timetable_entries a student has on top. compile_timetable() loads them all
+# in three queries into a compact in-memory form: one Schedule per section,
+# shared by every student in it, and a merged one only for students with
+# personal entries. Each Schedule keeps its periods sorted by minute of the
+# week with an hour-by-hour index, so "what's on now / next" for a student is
+# a dict lookup plus a step or two along the index.
+#
+# Writes to sections, periods, personal entries or a student's section bump
+# the "timetable" cache namespace on commit; the next lookup recompiles.
+# Without a shared cache backend other workers only notice after
+# TIMETABLE_MAX_AGE seconds.
+#
+# ReminderScheduler keeps a heap of the reminders due over the next day and
+# sleeps until the earliest one, pushing ``class_reminder`` to the section's
+# (or the student's) Socket.IO room. It re-reads the timetable only when the
+# namespace version moves, never by polling the tables.
+#
+#     flask timetable-reminders      run the scheduler as its own process
+
+NAMESPACE = "timetable"
+HOURS = 7 * 24
+MAX_PERIODS = 100
+# Reminders later than this (server asleep, clock jump) are dropped
+GRACE = timedelta(minutes=1)
+
+logger = logging.getLogger(__name__)
+
+
+class TimetableError(ValueError):
+    pass
+
+
+def parse_day(value):
+    """Weekday number (0 = Monday) of "Monday", "mon", "MON " and so on, or None."""
+    key = (value or "").strip()[:3].lower()
+    return WEEKDAYS.index(key) if key in WEEKDAYS else None
+
+
+def _minute(weekday, at):
+    return weekday * 24 * 60 + at.hour * 60 + at.minute
+
+
+def section_room(section_id):
+    return f"section:{section_id}"
+
+
+def student_room(student_id):
+    return f"timetable:{student_id}"
+
+
+class Schedule:
+    """One week of periods, sorted by start, as (start, end, subject, period, location) tuples.
+
+    ``index[h]`` is the first period still running or yet to start at hour
+    ``h`` of the week, so a lookup skips straight to the right place.
+    """
+
+    __slots__ = ("room", "periods", "index")
+
+    def __init__(self, room, periods):
+        self.room = room
+        self.periods = tuple(sorted(periods))
+        self.index = array("H")
+        i = 0
+        for hour in range(HOURS):
+            while i < len(self.periods) and self.periods[i][1] <= hour * 60:
+                i += 1
+            self.index.append(i)
+
+    def after(self, minute):
+        """Index of the first period ending after ``minute`` of the week, or len(periods)."""
+        i = self.index[minute // 60]
+        while i < len(self.periods) and self.periods[i][1] <= minute:
+            i += 1
+        return i
+
+    def occurrences(self, start, end):
+        """(start datetime, period) for every period starting in [start, end)."""
+        monday = datetime.combine(start.date() - timedelta(days=start.weekday()), datetime.min.time())
+        week = 0
+        while monday + timedelta(weeks=week) < end:
+            base = monday + timedelta(weeks=week)
+            for period in self.periods:
+                begins = base + timedelta(minutes=period[0])
+                if start <= begins < end:
+                    yield begins, period
+            week += 1
+
+
+class CompiledTimetable:
+    def __init__(self, schedules, students, version):
+        self.schedules = schedules  # room -> Schedule
+        self.students = students  # student id -> Schedule
+        self.version = version
+        self.compiled_at = time.monotonic()
+
+    def room(self, student_id):
+        schedule = self.students.get(student_id)
+        return schedule.room if schedule else None
+
+    def now_and_next(self, student_id, now):
+        """``{"current": ..., "next": ...}`` for one student; either may be None."""
+        schedule = self.students.get(student_id)
+        if schedule is None or not schedule.periods:
+            return {"current": None, "next": None}
+        monday = datetime.combine(now.date() - timedelta(days=now.weekday()), datetime.min.time())
+        minute = _minute(now.weekday(), now)
+        i = schedule.after(minute)
+        current = None
+        if i < len(schedule.periods) and schedule.periods[i][0] <= minute:
+            current = _describe(schedule.periods[i], monday)
+            i += 1
+        if i < len(schedule.periods):
+            upcoming = _describe(schedule.periods[i], monday)
+        else:
+            upcoming = _describe(schedule.periods[0], monday + timedelta(weeks=1))
+        return {"current": current, "next": upcoming}
+
+
+def _describe(period, monday):
+    start, end, subject, name, location = period
+    return {
+        "subject": subject,
+        "period": name,
+        "location": location,
+        "start": (monday + timedelta(minutes=start)).isoformat(),
+        "end": (monday + timedelta(minutes=end)).isoformat(),
+    }
+
+
+def _period(weekday, row):
+    # Strings shared by thousands of periods are stored once
+    return (
+        _minute(weekday, row.start_time),
+        _minute(weekday, row.end_time),
+        sys.intern(row.subject),
+        sys.intern(row.period),
+        sys.intern(row.location) if row.location else None,
+    )
+
+
+def compile_timetable(version=0):
+    sections = {}
+    for row in db.session.execute(db.select(SectionPeriod)).scalars():
+        sections.setdefault(row.section_id, []).append(_period(row.weekday, row))
+    personal = {}
+    for row in db.session.execute(db.select(TimetableEntry)).scalars():
+        weekday = parse_day(row.day)
+        if weekday is not None:
+            personal.setdefault(row.student_id, []).append(_period(weekday, row))
+
+    schedules = {
+        section_room(section_id): Schedule(section_room(section_id), periods)
+        for section_id, periods in sections.items()
+    }
+    students = {}
+    for student_id, section_id in db.session.execute(
+        db.select(User.id, User.section_id).where(User.section_id.is_not(None))
+    ):
+        if student_id not in personal:
+            students[student_id] = schedules.setdefault(
+                section_room(section_id), Schedule(section_room(section_id), ())
+            )
+        else:
+            shared = schedules.get(section_room(section_id))
+            personal[student_id] += shared.periods if shared else ()
+    for student_id, periods in personal.items():
+        schedules[student_room(student_id)] = students[student_id] = Schedule(student_room(student_id), periods)
+    return CompiledTimetable(schedules, students, version)
+
+
+class TimetableEngine:
+    """The compiled timetable for this process, recompiled when it goes out of date."""
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.compiled = None
+
+    def current(self):
+        version = cache.version(NAMESPACE)
+        compiled = self.compiled
+        if compiled is not None and compiled.version == version and (
+            cache.shared is not None or time.monotonic() - compiled.compiled_at < self.max_age
+        ):
+            return compiled
+        with self.lock:
+            if self.compiled is compiled:
+                self.compiled = compile_timetable(version)
+            return self.compiled
+
+    def room(self, student_id):
+        return self.current().room(student_id)
+
+    def now_and_next(self, student_id, now=None):
+        return self.current().now_and_next(student_id, now or datetime.now())
+
+
+timetable = TimetableEngine()
+
+
+# --- Editing ---
+
+def _clock(value):
+    try:
+        return datetime.strptime(str(value), "%H:%M").time()
+    except ValueError:
+        return None
+
+
+def _parse_periods(periods, errors):
+    parsed = []
+    for i, period in enumerate(periods):
+        if not isinstance(period, dict):
+            errors.append(f"Period {i}: must be an object.")
+            continue
+        weekday = parse_day(period.get("day"))
+        start, end = _clock(period.get("start")), _clock(period.get("end"))
+        subject = str(period.get("subject") or "").strip()
+        if weekday is None:
+            errors.append(f"Period {i}: day must be a weekday name.")
+        elif start is None or end is None:
+            errors.append(f"Period {i}: start and end must be HH:MM.")
+        elif end <= start:
+            errors.append(f"Period {i}: ends before it starts.")
+        elif not subject:
+            errors.append(f"Period {i}: a subject is required.")
+        else:
+            parsed.append(SectionPeriod(
+                weekday=weekday,
+                period=str(period.get("period") or len(parsed) + 1),
+                subject=subject,
+                start_time=start,
+                end_time=end,
+                location=period.get("location") or None,
+            ))
+    ordered = sorted(parsed, key=lambda p: (p.weekday, p.start_time))
+    for before, after in zip(ordered, ordered[1:]):
+        if before.weekday == after.weekday and after.start_time < before.end_time:
+            errors.append(f"{after.day.title()} {after.start_time:%H:%M}: overlaps {before.subject}.")
+    return parsed
+
+
+def set_section_timetable(name, periods=None, students=None):
+    """Create or update section ``name``, replacing its weekly periods and/or members.
+
+    ``periods`` is a list of ``{"day", "start", "end", "subject", "period",
+    "location"}``; ``students`` a list of student ids or usernames, which
+    become the whole membership. Either everything is valid and applied or
+    TimetableError carries the list of problems. The caller commits.
+    """
+    name = (name or "").strip()
+    errors = [] if name else ["A section name is required."]
+    new_periods = None
+    if periods is not None:
+        if len(periods) > MAX_PERIODS:
+            errors.append(f"At most {MAX_PERIODS} periods per section.")
+        else:
+            new_periods = _parse_periods(periods, errors)
+    members = None
+    if students is not None:
+        ids = {key for key in students if isinstance(key, int)}
+        names = {key for key in students if isinstance(key, str)}
+        members = User.query.filter(
+            User.role.in_(STUDENT_ROLES), db.or_(User.id.in_(ids), User.username.in_(names))
+        ).all()
+        found = {user.id for user in members} | {user.username for user in members}
+        errors += [f"Unknown student {key!r}." for key in students if key not in found]
+    if errors:
+        raise TimetableError(errors)
+
+    section = Section.query.filter_by(name=name).first()
+    if section is None:
+        section = Section(name=name)
+        db.session.add(section)
+    if new_periods is not None:
+        section.periods = new_periods
+    if members is not None:
+        section.students = members
+    return section
+
+
+# --- Reminders ---
+
+class ReminderScheduler:
+    """Heap of upcoming class reminders, emitted ``lead`` minutes before each period."""
+
+    def __init__(self, lead=10, horizon=timedelta(days=1), recheck=30):
+        self.lead = lead
+        self.horizon = horizon
+        self.recheck = recheck  # seconds between timetable version checks
+        self.enabled = True
+        self.heap = []
+        self.counter = itertools.count()
+        self.version = None
+        self.filled_until = None
+        self.sent_until = None
+        self.task = None
+        self.lock = threading.Lock()
+
+    def fill(self, compiled, start, end):
+        lead = timedelta(minutes=self.lead)
+        for room, schedule in compiled.schedules.items():
+            for begins, period in schedule.occurrences(start + lead, end + lead):
+                reminder = dict(_describe(period, begins - timedelta(minutes=period[0])), minutes=self.lead)
+                heapq.heappush(self.heap, (begins - lead, next(self.counter), room, reminder))
+        self.filled_until = end
+
+    def due(self, compiled, now):
+        """Pop the reminders due by ``now``, refilling the heap from ``compiled`` first if needed."""
+        if compiled.version != self.version or self.filled_until is None:
+            # Start after the last reminder sent, so a refill neither repeats nor skips one
+            start = now - GRACE
+            if self.sent_until is not None:
+                start = max(start, self.sent_until + timedelta(seconds=1))
+            self.heap = []
+            self.version = compiled.version
+            self.fill(compiled, start, now + self.horizon)
+        elif now + self.horizon / 2 > self.filled_until:
+            self.fill(compiled, self.filled_until, now + self.horizon)
+        ready = []
+        while self.heap and self.heap[0][0] <= now:
+            ready.append(heapq.heappop(self.heap))
+        if ready:
+            self.sent_until = ready[-1][0]
+        return ready
+
+    def start(self, socketio, app):
+        with self.lock:
+            if self.enabled and self.task is None:
+                self.task = socketio.start_background_task(self.run, app, socketio, socketio.sleep)
+
+    def run(self, app, emitter, sleep=time.sleep):
+        """Emit reminders through ``emitter`` (a SocketIO or a message queue emitter) forever."""
+        while True:
+            try:
+                with app.app_context():
+                    now = datetime.now()
+                    for at, _, room, reminder in self.due(timetable.current(), now):
+                        if now - at <= GRACE:
+                            emitter.emit("class_reminder", reminder, namespace="/", to=room)
+                    db.session.remove()
+            except Exception:
+                logger.exception("class reminder scheduler failed; retrying")
+            wait = self.recheck
+            if self.heap:
+                wait = min(wait, max(0.0, (self.heap[0][0] - datetime.now()).total_seconds()))
+            sleep(wait)
+
+
+reminders = ReminderScheduler()
+
+
+# --- Invalidation: any schedule change recompiles on commit ---
+
+def _collect_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Section, SectionPeriod, TimetableEntry)) or (
+            isinstance(obj, User) and inspect(obj).attrs.section_id.history.has_changes()
+        ):
+            # Picked up by website.cache's after_commit hook
+            session.info.setdefault("cache_namespaces", set()).add(NAMESPACE)
+            return
+
+
+def init_timetable(app):
+    timetable.max_age = app.config.get("TIMETABLE_MAX_AGE", 300)
+    reminders.lead = app.config.get("TIMETABLE_REMINDER_MINUTES", 10)
+    reminders.enabled = app.config.get("TIMETABLE_REMINDERS", True)
+    if not event.contains(Session, "after_flush", _collect_changes):
+        event.listen(Session, "after_flush", _collect_changes)
@@ -0,0 +1,27 @@
+import os
+
+# Production entry point. Async workers must patch the stdlib before anything
+# else imports it, so the patch happens here rather than in create_app:
+#
+#   SOCKETIO_ASYNC_MODE=eventlet gunicorn -k eventlet -w 1 -b :8001 wsgi:app
+#   SOCKETIO_ASYNC_MODE=gevent gunicorn -k geventwebsocket.gunicorn.workers.GeventWebSocketWorker -w 1 wsgi:app
+#
+# Socket.IO needs sticky sessions, so scale out with one worker per process
+# behind the load balancer and point every process at the same
+# SOCKETIO_MESSAGE_QUEUE.
+#
+# With several processes, set DATABASE_AUTO_MIGRATE=0 and run
+# `flask --app wsgi db-upgrade` once per release before starting them.
+async_mode = os.environ.get("SOCKETIO_ASYNC_MODE")
+if async_mode == "eventlet":
+    import eventlet
+
+    eventlet.monkey_patch()
+elif async_mode == "gevent":
+    from gevent import monkey
+
+    monkey.patch_all()
+
+from app import create_app  # noqa: E402
+
+app = create_app()